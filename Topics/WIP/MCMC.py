@@ -198,6 +198,48 @@ def log_probability(q, x, y, yerr):
 
 
 
+# -
+
+# These functions are called once per walker per step, so with 32 walkers and 5000
+# steps, the sampler spends most of its time in Python function calls.  Instead, we
+# write vectorized versions that take all of the walkers at once as a `(Nwalkers, Ndim)`
+# array `Q` and return the `Nwalkers` log-probabilities in a single NumPy pass.  The
+# prior is expressed as a boolean mask, and the likelihood is only evaluated for the
+# walkers inside the prior.  These can be passed to `emcee.EnsembleSampler` with
+# `vectorize=True`.
+
+# +
+def log_prior_mask(Q):
+    """Return a boolean mask of the walkers `Q` with non-zero prior."""
+    a0, a1, log_f = np.asarray(Q).T
+    return ((-5.0 < a1) & (a1 < 5.0) & (0.0 < a0) & (a0 < 10.0)
+            & (-10 < log_f) & (log_f < 1))
+
+def log_prior_v(Q):
+    """Return the log of the prior for all walkers `Q`."""
+    return np.where(log_prior_mask(Q), 0.0, -np.inf)
+
+def log_likelihood_v(Q, x, y, yerr):
+    """Return the log-likelihood for all walkers `Q` with shape `(Nwalkers, Ndim)`."""
+    Q = np.asarray(Q)
+    A, log_f = Q[:, :-1], Q[:, -1:]
+    f_x = np.polynomial.polynomial.polyval(x, A.T)   # (Nwalkers, N)
+    s2 = yerr**2 + np.exp(2*log_f) * f_x**2
+    return -0.5 * np.sum((y-f_x)**2 / s2 + np.log(2*np.pi * s2), axis=-1)
+
+def log_probability_v(Q, x, y, yerr):
+    Q = np.asarray(Q)
+    mask = log_prior_mask(Q)
+    lp = np.full(len(Q), -np.inf)
+    lp[mask] = log_likelihood_v(Q[mask], x, y, yerr)
+    return lp
+
+# Check against the scalar versions
+_Q = unp.nominal_values(q3) + np.random.normal(size=(10, 3))
+assert np.allclose(log_probability_v(_Q, x, y, yerr),
+                   [log_probability(_q, x, y, yerr) for _q in _Q])
+
+
 # +
 import emcee
 np.random.seed(123)
@@ -209,10 +251,27 @@ Nwalkers = 32
 Nsamples = 5000
 Ndim = len(q0)
 pos = q0 + 1e-4 * np.random.normal(size=(Nwalkers, Ndim))
-sampler = emcee.EnsembleSampler(Nwalkers, Ndim, log_probability, args=(x, y, yerr))
+sampler = emcee.EnsembleSampler(Nwalkers, Ndim, log_probability_v, args=(x, y, yerr),
+                                vectorize=True)
+random_state = sampler.random_state
 sampler.run_mcmc(pos, Nsamples, progress=True);
 # -
 
+# The same vectorized log-probability can be used with the ensemble sampler in
+# `phys_581_2021.mcmc`, which implements the same stretch move.  Starting from the
+# same state of a `RandomState` as emcee, it reproduces the emcee chain.
+
+# +
+from phys_581_2021.mcmc import EnsembleSampler
+rng = np.random.RandomState()
+rng.set_state(random_state)
+sampler_ = EnsembleSampler(Nwalkers, Ndim, log_probability_v, args=(x, y, yerr),
+                           vectorize=True, rng=rng)
+sampler_.run_mcmc(pos, Nsamples)
+print(f"acceptance fraction: {sampler_.acceptance_fraction.mean():.2f}")
+assert np.allclose(sampler_.get_chain(), sampler.get_chain())
+# -
+
 tau = sampler.get_autocorr_time()
 print(f"autocorrelation times: {tau}")
 discard = int(3*max(tau))
@@ -40,6 +40,7 @@ import logging; logging.getLogger('matplotlib').setLevel(logging.WARNING)
 # %pylab inline --no-import-all
 from scipy.integrate import solve_ivp
 import math
+from phys_581_2021.assignment_2 import solve_ivp_abm_adaptive
 
 w0 = 1.0
 h = 0.1
@@ -77,8 +78,23 @@ plt.semilogy(t, get_E(t, y))
 # -
 
 @np.vectorize
-def get_amp(wp, T=1600, y0=(0, 1), **kw):
-    sol = solve_ivp(lambda t, y: f(t, y, wp=wp), (0,T), y0=y0, **kw)
+def get_amp(wp, T=1600, y0=(0, 1), threshold=None, **kw):
+    """Return the maximum energy amplification.
+
+    If `threshold` is provided, then stop as soon as the amplification reaches it.
+    """
+    if threshold is None:
+        sol = solve_ivp(lambda t, y: f(t, y, wp=wp), (0,T), y0=y0, **kw)
+    else:
+        E0 = get_E(0, y0)
+
+        def amplified(t, y):
+            return get_E(t, y) / E0 - threshold
+
+        amplified.terminal = True
+        amplified.direction = 1
+        sol = solve_ivp_abm_adaptive(
+            lambda t, y: f(t, y, wp=wp), (0, T), y0=y0, events=amplified, **kw)
     t, y = sol.t, sol.y
     E = get_E(t, y)
     return max(E/E[0])
@@ -90,6 +106,16 @@ amps = get_amp(wps)
 
 plt.plot(wps, amps)
 plt.axvline([wp])
+# -
+
+# If we only need to know which frequencies are amplified by some factor, then we can
+# stop each run as soon as the threshold is crossed using a terminal event:
+
+# +
+amps_10 = get_amp(wps, threshold=10)
+
+plt.plot(wps, amps_10)
+plt.axvline([wp])
 
 # +
 
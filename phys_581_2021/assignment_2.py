@@ -1,18 +1,239 @@
 """Assignment 2
 """
 import math
+import os
 
 import numpy as np
 
-from scipy.optimize import OptimizeResult
+from scipy.optimize import OptimizeResult, brentq
 
 
 class OdeResult(OptimizeResult):
     """Bunch object for storing results of solve_ivp* methods."""
 
 
+def _working_dtype(y0, dtype):
+    """Return the working dtype for the state `y0`, or `None` to keep its own.
+
+    Complex states are promoted to the corresponding complex dtype (i.e. `complex64`
+    for ``dtype=np.float32``).
+    """
+    if dtype is None:
+        return None
+    dtype = np.dtype(dtype)
+    if np.iscomplexobj(y0) and dtype.kind != "c":
+        dtype = np.result_type(dtype, np.complex64)
+    return dtype
+
+
+def _real(dt, dtype):
+    """Return the scalar `dt` with the real type matching `dtype` (if not `None`).
+
+    This ensures that ``y + dt*dy`` is computed in the working precision.  The times
+    themselves are always accumulated in double precision.
+    """
+    return dt if dtype is None else np.finfo(dtype).dtype.type(dt)
+
+
+def _chunk_slices(n, chunks):
+    """Return a list of (at most) `chunks` contiguous slices covering ``range(n)``."""
+    edges = np.linspace(0, n, min(chunks, n) + 1).astype(int)
+    return [slice(_a, _b) for _a, _b in zip(edges[:-1], edges[1:])]
+
+
+def _map_chunks(executor, chunks, func, *args):
+    """Return ``func(*args)``, evaluated in contiguous chunks on the `executor`.
+
+    Each argument that is an array (or a list of arrays) is split into `chunks` pieces
+    along its first axis; other arguments are passed unchanged.  The result must have
+    the same shape as the first array, and each chunk of the result must depend only
+    on the corresponding chunks of the arguments.  The chunks are written directly
+    into the result, so no additional copies are made.  If `executor` is `None`, then
+    this simply returns ``func(*args)``.
+    """
+    if executor is None:
+        return func(*args)
+
+    def is_array(a):
+        return isinstance(a, np.ndarray) and a.ndim > 0
+
+    def get_chunk(a, sl):
+        if isinstance(a, list):
+            return [get_chunk(_a, sl) for _a in a]
+        return a[sl] if is_array(a) else a
+
+    arrays = [
+        _a for _arg in args for _a in (_arg if isinstance(_arg, list) else [_arg])
+    ]
+    arrays = [_a for _a in arrays if is_array(_a)]
+    out = np.empty(arrays[0].shape, dtype=np.result_type(*arrays, 1.0))
+
+    def work(sl):
+        out[sl] = func(*(get_chunk(_arg, sl) for _arg in args))
+
+    # Calling list() waits for the results and raises any exceptions.
+    list(executor.map(work, _chunk_slices(len(out), chunks or os.cpu_count())))
+    return out
+
+
+def _hermite(t0, y0, f0, t1, y1, f1):
+    """Return the cubic Hermite interpolant ``sol(t)`` on the step from `t0` to `t1`.
+
+    This matches the states `y0`, `y1` and derivatives `f0`, `f1` at both ends.
+    """
+    h = t1 - t0
+
+    def sol(t):
+        s = (t - t0) / h
+        return (
+            (1 + 2 * s) * (1 - s) ** 2 * y0
+            + s * (1 - s) ** 2 * h * f0
+            + s ** 2 * (3 - 2 * s) * y1
+            + s ** 2 * (s - 1) * h * f1
+        )
+
+    return sol
+
+
+class _Events:
+    """Event detection for the solve_ivp* methods.
+
+    Follows the conventions of :py:func:`scipy.integrate.solve_ivp`: each event function
+    ``event(t, y)`` may have attributes `terminal` and `direction`.  Events are located
+    by root-finding on the dense interpolant ``sol(t)`` of each step.
+
+    Arguments
+    ---------
+    events : callable, or list of callables
+        Event functions.
+    t0, y0 : float, array
+        Initial time and state.
+    """
+
+    def __init__(self, events, t0, y0):
+        if callable(events):
+            events = (events,)
+        self.events = events
+        self.terminal = [bool(getattr(_e, "terminal", False)) for _e in events]
+        self.direction = [np.sign(getattr(_e, "direction", 0)) for _e in events]
+        self.g = [_e(t0, y0) for _e in events]
+        self.t_events = [[] for _e in events]
+        self.y_events = [[] for _e in events]
+
+    def __call__(self, sol, t, t_new, y_new):
+        """Process the events in the step `(t, t_new]`.
+
+        Returns
+        -------
+        t_event, y_event : float, array
+            Time and state of the first terminal event, or `None` if there is none.
+        """
+        g_new = [_e(t_new, y_new) for _e in self.events]
+        found = []
+        for n, (g, g_, direction) in enumerate(zip(self.g, g_new, self.direction)):
+            up, down = g <= 0 <= g_, g >= 0 >= g_
+            if g == 0 or not ((up and direction >= 0) or (down and direction <= 0)):
+                continue
+            event = self.events[n]
+            t_event = brentq(
+                lambda _t: event(_t, sol(_t)), t, t_new, xtol=4 * np.finfo(float).eps
+            )
+            found.append((abs(t_event - t), n, t_event))
+        self.g = g_new
+
+        for _, n, t_event in sorted(found):
+            y_event = sol(t_event)
+            self.t_events[n].append(t_event)
+            self.y_events[n].append(y_event)
+            if self.terminal[n]:
+                return t_event, y_event
+        return None
+
+    def step(self, t, y, dy, t_new, y_new, dy_new):
+        """Process the events in the step `(t, t_new]` (see :meth:`__call__`).
+
+        The events are located using the cubic Hermite interpolant.
+        """
+        return self(_hermite(t, y, dy, t_new, y_new, dy_new), t, t_new, y_new)
+
+    def check_steps(self, ts, ys, dys):
+        """Process the events on each step between the states `ys` at times `ts`.
+
+        Returns the first terminal event (see :meth:`__call__`), after removing the
+        later states from the lists `ts`, `ys`, and `dys`.
+        """
+        for n in range(1, len(ys)):
+            event = self.step(ts[n - 1], ys[n - 1], dys[n - 1], ts[n], ys[n], dys[n])
+            if event is not None:
+                del ts[n + 1 :], ys[n + 1 :], dys[n + 1 :]
+                return event
+        return None
+
+    def update(self, res, terminated):
+        """Add the event information to the result `res`."""
+        res.t_events = [np.asarray(_t) for _t in self.t_events]
+        res.y_events = [np.asarray(_y) for _y in self.y_events]
+        res.status = 1 if terminated else 0
+
+
+def _abm_start(fun, t0, dt, y0, Nt, ys, dys, start_factor, dtype, executor, chunks):
+    """Return the lists `(ts, ys, dys)` of the steps used to start `solve_ivp_abm`.
+
+    If `ys` is `None`, then the first four steps are computed with
+    :func:`solve_ivp_rk4` using `start_factor` substeps per step.  If `dys` is `None`,
+    then the derivatives are computed.  At most ``Nt + 1`` steps are kept.
+    """
+    if ys is None:
+        # No initial steps provided.  Use solve_ivp_rk4
+        res0 = solve_ivp_rk4(
+            fun=fun,
+            t_span=(t0, t0 + 4 * dt),
+            y0=y0,
+            Nt=4 * start_factor,
+            dtype=dtype,
+            executor=executor,
+            chunks=chunks,
+        )
+
+        ys = res0.y.T[::start_factor]
+
+    # Keep only Nt previous values... allows code to work if Nt < 4.
+    ys = ys[: Nt + 1]
+
+    # Compute corresponding ts.
+    ts = t0 + np.arange(len(ys)) * dt
+
+    def rhs(t, y):
+        return _map_chunks(
+            executor, chunks, lambda _y: np.asarray(fun(t, _y), dtype=dtype), y
+        )
+
+    if dys is None:
+        dys = [rhs(_t, np.asarray(_y, dtype=dtype)) for (_t, _y) in zip(ts, ys)]
+
+    dys = dys[: Nt + 1]
+
+    # Convert ts, ys, and dys to lists so we can append etc.  This is a little
+    # convoluted but does not allocate more memory if the previous values were arrays.
+    ts = [np.asarray(_t) for _t in ts]
+    ys, dys = ([np.asarray(_y, dtype=dtype) for _y in _ys] for _ys in (ys, dys))
+    return ts, ys, dys
+
+
 def solve_ivp_abm(
-    fun, t_span, y0, Nt, ys=None, dys=None, dcp=None, save_memory=False, start_factor=2
+    fun,
+    t_span,
+    y0,
+    Nt,
+    ys=None,
+    dys=None,
+    dcp=None,
+    save_memory=False,
+    start_factor=2,
+    dtype=None,
+    events=None,
+    executor=None,
+    chunks=None,
 ):
     """Solve the specified IVP using a 5th order predictor-corrector method.
 
@@ -33,11 +254,28 @@ def solve_ivp_abm(
         Previous corrector-predictor difference (with a factor 161/170).
     save_memory : bool
         If `True`, then only keep the last four steps.
+    dtype : dtype, None
+        Working precision.  If provided (i.e. ``np.float32``), then the stepping
+        arithmetic is done and the trajectory is stored with this dtype (`complex64` for
+        complex states).  Times are always accumulated in double precision.
+    events : callable, or list of callables, None
+        Events to track as in :py:func:`scipy.integrate.solve_ivp`.  These are located
+        using the cubic Hermite interpolant on each step.  If a `terminal` event
+        occurs, the integration stops there and the final point is the event.
+    executor : concurrent.futures.Executor, None
+        If provided (i.e. a `ThreadPoolExecutor`), then the state is split into `chunks`
+        contiguous pieces along its first axis, and `fun` and the updates are evaluated
+        on these in parallel.  In this case, `fun` must be local: ``fun(t, y[chunk])``
+        must return the derivative for that chunk.  Since NumPy releases the GIL, threads
+        are effective for large states.
+    chunks : int, None
+        Number of chunks to use with `executor`.  Defaults to ``os.cpu_count()``.
 
     Returns
     -------
     res : OdeResult
-       Bunch object.
+       Bunch object.  If `events` are provided, this also includes `t_events`,
+       `y_events`, and `status` (``1`` if a terminal event occurred).
 
     The remaining arguments should match those of :py:func:`scipy.integrate.solve_ivp`.
     Don't worry about optimizations like allowing `fun` to be `vectorized` etc.
@@ -48,60 +286,73 @@ def solve_ivp_abm(
     """
     t0, t1 = t_span
     dt = (t1 - t0) / Nt
+    dtype = _working_dtype(y0, dtype)
+    dt_ = _real(dt, dtype)
 
-    if ys is None:
-        # No initial steps provided.  Use solve_ivp_rk4
-        res0 = solve_ivp_rk4(fun=fun, t_span=(0, 4 * dt), y0=y0, Nt=4 * start_factor)
+    def apply(func, *args):
+        return _map_chunks(executor, chunks, func, *args)
 
-        ys = res0.y.T[::start_factor]
+    def rhs(t, y):
+        return apply(lambda _y: np.asarray(fun(t, _y), dtype=dtype), y)
 
-    # Keep only Nt previous values... allows code to work if Nt < 4.
-    ys = ys[: Nt + 1]
+    ts, ys, dys = _abm_start(
+        fun, t0, dt, y0, Nt, ys, dys, start_factor, dtype, executor, chunks
+    )
 
-    # Compute corresponding ts.
-    ts = t0 + np.arange(len(ys)) * dt
+    # If not provided, assume dcp is zero.
+    dcp = 0 if dcp is None else np.asarray(dcp, dtype=dtype)
 
-    if dys is None:
-        dys = [fun(_t, _y) for (_t, _y) in zip(ts, ys)]
+    event = None
+    if events is not None:
+        # Check the starting steps too.
+        events = _Events(events, ts[0], ys[0])
+        event = events.check_steps(ts, ys, dys)
 
-    dys = dys[: Nt + 1]
+    # We do a little indexing trick here with n, so that y[n-i] is the same as
+    # y_{n-i} in the formula.  y[n] = y[-1] is the current step.  The formulas are
+    # written as functions so they can be applied to chunks of the state in parallel.
+    n = -1
 
-    # Convert ts, ys, and dys to lists so we can append etc.  This is a little
-    # convoluted but does not allocate more memory if the previous values were arrays.
-    ts, ys, dys = ([np.asarray(_y) for _y in _ys] for _ys in (ts, ys, dys))
+    def predictor(y, dy):
+        return (y[n] + y[n - 1]) / 2 + dt_ / 48 * (
+            119 * dy[n] - 99 * dy[n - 1] + 69 * dy[n - 2] - 17 * dy[n - 3]
+        )
+
+    def corrector(dm_new, dy):
+        # Predictor-corrector difference
+        return (dt_ / 48 * 161 / 170) * (
+            17 * dm_new - 68 * dy[n] + 102 * dy[n - 1] - 68 * dy[n - 2] + 17 * dy[n - 3]
+        )
 
-    if dcp is None:
-        # If not provided, assume it is zero.
-        dcp = 0
+    def add(a, b):
+        return a + b
 
     for nt in range(Nt - len(ys) + 1):
+        if event is not None:
+            break
+
         # While look allows this code to work if Nt < 4
         t = ts[-1]
-
-        # We do a little indexing trick here with n, so that y[n-i] is the same as
-        # y_{n-i} in the formula.  y[n] = y[-1] is the current step.
-        n = -1
         y = ys
         dy = dys
 
         # New predictor
-        p_new = (y[n] + y[n - 1]) / 2 + dt / 48 * (
-            119 * dy[n] - 99 * dy[n - 1] + 69 * dy[n - 2] - 17 * dy[n - 3]
-        )
+        p_new = apply(predictor, y[-2:], dy[-4:])
 
         # Compute "midpoint" and its derivative
         t_new = t + dt
-        m_new = p_new + dcp
-        dm_new = np.asarray(fun(t_new, m_new))
+        m_new = apply(add, p_new, dcp)
+        dm_new = rhs(t_new, m_new)
 
         # Compute new predictor-corrector difference
-        dcp = (dt / 48 * 161 / 170) * (
-            17 * dm_new - 68 * dy[n] + 102 * dy[n - 1] - 68 * dy[n - 2] + 17 * dy[n - 3]
-        )
+        dcp = apply(corrector, dm_new, dy[-4:])
 
         # Finally, compute the new step and it's derivative
-        y_new = p_new + dcp
-        dy_new = np.asarray(fun(t_new, y_new))
+        y_new = apply(add, p_new, dcp)
+        dy_new = rhs(t_new, y_new)
+
+        if events is not None:
+            event = events.step(t, y[n], dy[n], t_new, y_new, dy_new)
 
         if save_memory:
             ts.pop(0)
@@ -112,95 +363,555 @@ def solve_ivp_abm(
         ys.append(y_new)
         dys.append(dy_new)
 
-    assert np.allclose(ts[-1], t1)
+    if event is not None:
+        # Terminate at the event.
+        ts[-1], ys[-1] = event
+    else:
+        assert np.allclose(ts[-1], t1)
+
     # Note: we transpose the ys array to match solve_ivp
     res = OdeResult(t=np.asarray(ts), y=np.asarray(ys).T)
 
-    # Save args for starting again.
+    if events is not None:
+        events.update(res, terminated=event is not None)
+
+    # Save args for starting again.  (These are not valid after a terminal event.)
     res.abm_args = dict(ys=res.y[-4:], dys=np.asarray(dys[-4:]), dcp=dcp)
     return res
 
 
-def solve_ivp_euler(fun, t_span, y0, Nt):
+def _rms(x):
+    """Return the root-mean-square of `x` (computed in double precision)."""
+    x = np.asarray(x)
+    return math.sqrt(np.mean(abs(x.astype(np.result_type(x, float))) ** 2))
+
+
+def _am_error_constants(max_order):
+    """Return ``|gamma*_q|`` for ``q in range(max_order + 2)``.
+
+    These are the error constants of the Adams-Moulton methods: the local truncation
+    error of the order `q` method is ``gamma*_q * h**(q+1) * y^(q+1)``.  They satisfy
+    ``sum(gamma*_j/(k + 1 - j) for j in range(k+1)) == 0`` with ``gamma*_0 = 1``.
+    """
+    gs = [1.0]
+    for k in range(1, max_order + 2):
+        gs.append(-sum(gs[j] / (k + 1 - j) for j in range(k)))
+    return np.abs(gs)
+
+
+def _nordsieck_l(q):
+    """Return the Nordsieck correction vector `l` for the order `q` Adams-Moulton method.
+
+    This is the coefficient array of the polynomial ``l(x) = int_{-1}^{x} Lambda(u) du``
+    where ``Lambda(u) = prod((1 + u/i) for i in range(1, q))``, so that ``l[1] = 1``.
+    """
+    Lambda = np.polynomial.Polynomial([1.0])
+    for i in range(1, q):
+        Lambda *= np.polynomial.Polynomial([1.0, 1.0 / i])
+    return Lambda.integ(lbnd=-1).coef
+
+
+def _pascal(q, s=1):
+    """Return the ``(q+1, q+1)`` Pascal matrix ``P[j, k] = binom(k, j) * s**(k-j)``.
+
+    ``P @ z`` extrapolates the Nordsieck vector `z` forward by `s` steps.
+    """
+    return np.array(
+        [
+            [math.comb(k, j) * s ** (k - j) if k >= j else 0 for k in range(q + 1)]
+            for j in range(q + 1)
+        ],
+        dtype=float,
+    )
+
+
+def _rescale_nordsieck(z, r):
+    """Return the Nordsieck vector `z` for a step size changed by the factor `r`."""
+    rs = (r ** np.arange(len(z))).astype(z.real.dtype)
+    return z * rs.reshape((len(z),) + (1,) * (z.ndim - 1))
+
+
+def _start_nordsieck(f, t0, y0, first_step, max_step, direction, rtol, atol, dtype):
+    """Return `(z, h)`: the first-order Nordsieck vector and step size to start at `t0`.
+
+    If `first_step` is `None`, then the step size is estimated.
+    """
+    f0 = f(t0, y0)
+    if first_step is None:
+        h = _select_initial_step(f, t0, y0, f0, direction, rtol=rtol, atol=atol)
+    else:
+        h = abs(first_step)
+    h = direction * min(h, max_step)
+    z = np.array([y0, _real(h, dtype) * f0], dtype=dtype)
+    return z, h
+
+
+def _reject_step(f, t, z, h, err, n_fail):
+    """Return `(z, h)` to retry a step rejected with the error estimate `err`.
+
+    After `n_fail` >= 3 consecutive failures, the method restarts at first order: this
+    needs only one function evaluation.
+    """
+    q = len(z) - 1
+    if n_fail >= 3 and q > 1:
+        q = 1
+        z = np.array([z[0], z.real.dtype.type(h) * f(t, z[0])])
+    r = max(0.2, 0.9 * err ** (-1 / (q + 1)))
+    return _rescale_nordsieck(z, r), h * r
+
+
+def _limit_step(z, D_prev, h, h_abs):
+    """Return `(z, D_prev, h)` rescaled for the reduced step size `h_abs`."""
+    r = h_abs / abs(h)
+    if D_prev is not None:
+        D_prev = D_prev * r ** len(z)
+    return _rescale_nordsieck(z, r), D_prev, math.copysign(h_abs, h)
+
+
+def _pece(f, t_new, zp, h, ell):
+    """Return the correction `D` for the step to `t_new` from the prediction `zp`.
+
+    This is PECE: evaluate at the prediction, correct, then evaluate at the correction.
+    The corrected Nordsieck vector is ``zp + np.multiply.outer(ell, D)``.
+    """
+    D = h * f(t_new, zp[0]) - zp[1]
+    return h * f(t_new, zp[0] + ell[0] * D) - zp[1]
+
+
+def _choose_order(z, D, D_prev, err, scale, ell, gammas, max_order):
+    """Return `(r, q)`: the step-size factor and the order allowing the largest step.
+
+    The factors are estimated for orders ``q-1``, ``q``, and ``q+1`` (where ``q + 1 =
+    len(z)``) from the Nordsieck vector `z`, the correction `D` of the last step, and
+    the previous correction `D_prev`.  The biases favour keeping the order.
+    """
+    q = len(z) - 1
+    r_q = 1.0 / 1.2 / (err + 1e-16) ** (1 / (q + 1))
+    r_qm = r_qp = 0.0
+    if q > 1:
+        err_qm = gammas[q - 1] * math.factorial(q) * _rms(z[q] / scale)
+        r_qm = 1.0 / 1.3 / (err_qm + 1e-16) ** (1 / q)
+    if q < max_order and D_prev is not None:
+        err_qp = gammas[q + 1] * math.factorial(q) * ell[q]
+        err_qp *= _rms((D - D_prev) / scale)
+        r_qp = 1.0 / 1.4 / (err_qp + 1e-16) ** (1 / (q + 2))
+
+    r = max(r_q, r_qm, r_qp)
+    if r == r_qp:
+        return r, q + 1
+    if r == r_qm:
+        return r, q - 1
+    return r, q
+
+
+def _change_nordsieck(z, q_new, r, D, ell):
+    """Return the Nordsieck vector `z` changed to order `q_new` and rescaled by `r`.
+
+    Raising the order adds the component estimated from the last correction `D`.
+    """
+    q = len(z) - 1
+    if q_new > q:
+        z = np.concatenate([z, [ell[q] * D / (q + 1)]])
+    elif q_new < q:
+        z = z[:-1]
+    return _rescale_nordsieck(z, r)
+
+
+def _nordsieck_event(events, z, h, t_prev, t):
+    """Process the events on the step `(t_prev, t]` ending with Nordsieck vector `z`.
+
+    Returns
+    -------
+    event : (t_event, y_event), None
+        The first terminal event (see `_Events`).
+    z : array
+        The Nordsieck vector, moved to `t_event` if there is a terminal event.
+    """
+
+    def sol(_t):
+        return np.polynomial.polynomial.polyval((_t - t) / h, z, tensor=False)
+
+    event = events(sol, t_prev, t, z[0])
+    if event is not None:
+        P = _pascal(len(z) - 1, s=(event[0] - t) / h).astype(z.real.dtype)
+        z = np.tensordot(P, z, 1)
+    return event, z
+
+
+def solve_ivp_abm_adaptive(
+    fun,
+    t_span,
+    y0,
+    rtol=1e-6,
+    atol=1e-9,
+    first_step=None,
+    max_step=np.inf,
+    max_order=5,
+    nordsieck=None,
+    dtype=None,
+    events=None,
+):
+    """Solve the specified IVP using a variable-step, variable-order ABM method.
+
+    This is an Adams-Bashforth-Moulton predictor-corrector in Nordsieck form.  The
+    state is stored as the Nordsieck vector ``z[j] = h**j * y^(j)(t) / j!`` so that
+    changing the step size is simply a rescaling of `z`, and changing the order is
+    simply adding or removing a component.  The predictor-corrector difference (the
+    analog of `dcp` in :func:`solve_ivp_abm`) provides the local error estimate used to
+    adapt both.  The method is self-starting (it starts at first order), so no
+    auxiliary integrator is needed to get going, and a restart after repeated step
+    failures costs only a single function evaluation.
+
+    Arguments
+    ---------
+    rtol, atol : float
+        Relative and absolute tolerances.  The local error estimate is kept below
+        ``atol + rtol*abs(y)`` in the RMS norm, as in
+        :py:func:`scipy.integrate.solve_ivp`.
+    first_step : float, None
+        Initial step size.  If `None`, then this is estimated.
+    max_step : float
+        Maximum allowed step size.
+    max_order : int
+        Maximum order of the method.
+    nordsieck : dict, None
+        State ``dict(z=z, h=h, order=q)`` from a previous call (``res.nordsieck``)
+        allowing the integration to be continued without restarting.
+    dtype : dtype, None
+        Working precision.  If provided (i.e. ``np.float32``), then the stepping
+        arithmetic is done and the trajectory is stored with this dtype (`complex64` for
+        complex states).  Times, step sizes, and error estimates are always computed in
+        double precision.
+    events : callable, or list of callables, None
+        Events to track as in :py:func:`scipy.integrate.solve_ivp`.  These are located
+        using the Nordsieck interpolating polynomial on each step.  If a `terminal`
+        event occurs, the integration stops there and the final point is the event.
+
+    Returns
+    -------
+    res : OdeResult
+       Bunch object.  In addition to `t` and `y`, this includes `nfev`, the `order`
+       used for each step, and `nordsieck` for continuing the integration (from the
+       terminal event if one occurred).  If `events` are provided, this also includes
+       `t_events`, `y_events`, and `status` (``1`` if a terminal event occurred).
+
+    The remaining arguments should match those of :py:func:`scipy.integrate.solve_ivp`.
+    """
+    t0, t1 = t_span
+    direction = 1.0 if t1 >= t0 else -1.0
+    dtype = _working_dtype(y0 if nordsieck is None else nordsieck["z"], dtype)
+
+    nfev = 0
+
+    def f(t, y):
+        nonlocal nfev
+        nfev += 1
+        return np.asarray(fun(t, y), dtype=dtype)
+
+    if nordsieck is None:
+        y0 = np.asarray(y0, dtype=dtype)
+        z, h = _start_nordsieck(
+            f, t0, y0, first_step, max_step, direction, rtol, atol, dtype
+        )
+    else:
+        z, h = nordsieck["z"], nordsieck["h"]
+        z = np.array(z, dtype=dtype)  # Copy so we don't modify the previous result.
+    q = len(z) - 1
+
+    # Coefficients in the working precision so they do not promote the state.
+    rdtype = z.real.dtype
+    gammas = _am_error_constants(max_order)
+    ls = [None] + [_nordsieck_l(_q).astype(rdtype) for _q in range(1, max_order + 1)]
+    Ps = [None] + [_pascal(_q).astype(rdtype) for _q in range(1, max_order + 1)]
+
+    if events is not None:
+        events = _Events(events, t0, z[0])
+    event = None
+
+    t = t0
+    ts, ys, orders = [t], [z[0]], []
+    steps_at_order = 0  # Steps taken since the last change in step size or order
+    n_fail = 0  # Consecutive failures
+    D_prev = None  # Previous correction (used to estimate the error at order q+1)
+    success, message = True, "The solver successfully reached the end of the interval."
+
+    while direction * (t1 - t) > 0:
+        # Don't step past t1 or take steps larger than max_step.
+        h_abs = min(abs(h), max_step, abs(t1 - t))
+        if h_abs != abs(h):
+            z, D_prev, h = _limit_step(z, D_prev, h, h_abs)
+
+        if h_abs < 10 * np.spacing(t):
+            success, message = False, "Required step size is less than spacing."
+            break
+
+        t_new = t1 if h_abs == abs(t1 - t) else t + h
+        ell = ls[q]
+        zp = np.tensordot(Ps[q], z, axes=1)  # Predict
+        D = _pece(f, t_new, zp, rdtype.type(h), ell)
+
+        # Double precision scale so that the error estimates are too.
+        y_abs = np.maximum(abs(z[0]), abs(zp[0] + ell[0] * D)).astype(float)
+        scale = atol + rtol * y_abs
+        err = gammas[q] * math.factorial(q) * ell[q] * _rms(D / scale)
+
+        if err > 1:
+            n_fail += 1
+            z, h = _reject_step(f, t, z, h, err, n_fail)
+            q = len(z) - 1
+            steps_at_order, D_prev = 0, None
+            continue
+
+        n_fail = 0
+        z = zp + np.multiply.outer(ell, D)
+        t_prev, t = t, t_new
+        ts.append(t)
+        ys.append(z[0])
+        orders.append(q)
+        steps_at_order += 1
+
+        if events is not None:
+            event, z = _nordsieck_event(events, z, h, t_prev, t)
+            if event is not None:
+                # Terminate at the event.
+                ts[-1], ys[-1] = event
+                break
+
+        # Only consider changes after the history has settled at this order, and if
+        # the step can be increased significantly.
+        r, q_new = 0, q
+        if steps_at_order > q:
+            r, q_new = _choose_order(z, D, D_prev, err, scale, ell, gammas, max_order)
+        if r < 1.1:
+            D_prev = D
+            continue
+
+        r = min(r, 10.0)
+        z = _change_nordsieck(z, q_new, r, D, ell)
+        q = q_new
+        h *= r
+        steps_at_order, D_prev = 0, None
+
+    # Note: we transpose the ys array to match solve_ivp
+    res = OdeResult(
+        t=np.asarray(ts),
+        y=np.asarray(ys).T,
+        nfev=nfev,
+        order=np.asarray(orders),
+        success=success,
+        message=message,
+    )
+
+    if events is not None:
+        events.update(res, terminated=event is not None)
+
+    # Save state for continuing.
+    res.nordsieck = dict(z=z, h=h, order=q)
+    return res
+
+
+def _select_initial_step(fun, t0, y0, f0, direction, rtol, atol, order=1):
+    """Return an estimate of a good initial step size.
+
+    This follows Hairer, Norsett, and Wanner, "Solving Ordinary Differential Equations
+    I", Sec. II.4, as does :py:mod:`scipy.integrate`.
+    """
+    scale = atol + rtol * abs(y0)
+    d0, d1 = _rms(y0 / scale), _rms(f0 / scale)
+    h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+    y1 = y0 + direction * h0 * f0
+    f1 = fun(t0 + direction * h0, y1)
+    d2 = _rms((f1 - f0) / scale) / h0
+    if d1 <= 1e-15 and d2 <= 1e-15:
+        h1 = max(1e-6, h0 * 1e-3)
+    else:
+        h1 = (0.01 / max(d1, d2)) ** (1 / (order + 1))
+    return min(100 * h0, h1)
+
+
+def solve_ivp_euler(
+    fun, t_span, y0, Nt, dtype=None, events=None, executor=None, chunks=None
+):
     """Solve the specified IVP using Euler's method.
 
     Arguments
     ---------
     Nt : int
        Number of steps.  The time-step will be ``(t_span[1] - t_span[0])/Nt``.
+    dtype : dtype, None
+        Working precision.  If provided (i.e. ``np.float32``), then the stepping
+        arithmetic is done and the trajectory is stored with this dtype (`complex64` for
+        complex states).  Times are always accumulated in double precision.
+    events : callable, or list of callables, None
+        Events to track as in :py:func:`scipy.integrate.solve_ivp`.  These are located
+        using the cubic Hermite interpolant on each step.  If a `terminal` event
+        occurs, the integration stops there and the final point is the event.
+    executor : concurrent.futures.Executor, None
+        If provided (i.e. a `ThreadPoolExecutor`), then the state is split into `chunks`
+        contiguous pieces along its first axis, and `fun` and the updates are evaluated
+        on these in parallel.  In this case, `fun` must be local: ``fun(t, y[chunk])``
+        must return the derivative for that chunk.  Since NumPy releases the GIL, threads
+        are effective for large states.
+    chunks : int, None
+        Number of chunks to use with `executor`.  Defaults to ``os.cpu_count()``.
 
     Returns
     -------
     res : OdeResult
-       Bunch object.
+       Bunch object.  If `events` are provided, this also includes `t_events`,
+       `y_events`, and `status` (``1`` if a terminal event occurred).
 
     The remaining arguments should match those of :py:func:`scipy.integrate.solve_ivp`.  
     Don't worry about optimizations like allowing `fun` to be `vectorized` etc.
     """
     t0, t1 = t_span
     dt = (t1 - t0) / Nt
+    dtype = _working_dtype(y0, dtype)
+    dt_ = _real(dt, dtype)
+
+    def rhs(t, y):
+        # We explicitly call np.asarray here so that dy is an array.  This allows the
+        # user to return a list or a tuple, but allows us to work with dy as an array.
+        return _map_chunks(
+            executor, chunks, lambda _y: np.asarray(fun(t, _y), dtype=dtype), y
+        )
+
+    def update(y, dy):
+        return y + dt_ * dy
 
     ts = [t0]
-    ys = [np.asarray(y0)]  # Convert y0 to an array allowing user to pass in list
+    # Convert y0 to an array allowing user to pass in list
+    ys = [np.asarray(y0, dtype=dtype)]
+
+    event = dy = None
+    if events is not None:
+        events = _Events(events, ts[0], ys[0])
 
     for step in range(Nt):
         t = ts[-1]
         y = ys[-1]
-        dy = np.asarray(fun(t, y))
-        # We explicitly call np.asarray here so that dy_new is an array.  This allows
-        # the user to return a list or a tuple, but allows us to work with dy as an
-        # array.
+        if dy is None:
+            dy = rhs(t, y)
 
         t_new = t + dt
-        y_new = y + dt * dy
+        y_new = _map_chunks(executor, chunks, update, y, dy)
 
         ts.append(t_new)
         ys.append(y_new)
 
+        # The derivative at the end of the step is needed for the interpolant, but is
+        # then reused for the next step.
+        dy_new = None
+        if events is not None:
+            dy_new = rhs(t_new, y_new)
+            event = events.step(t, y, dy, t_new, y_new, dy_new)
+            if event is not None:
+                # Terminate at the event.
+                ts[-1], ys[-1] = event
+                break
+        dy = dy_new
+
     # Note: we transpose the ys array to match solve_ivp
     res = OdeResult(t=np.asarray(ts), y=np.asarray(ys).T)
+    if events is not None:
+        events.update(res, terminated=event is not None)
     return res
 
 
-def solve_ivp_rk4(fun, t_span, y0, Nt):
+def solve_ivp_rk4(
+    fun, t_span, y0, Nt, dtype=None, events=None, executor=None, chunks=None
+):
     """Solve the specified IVP using 4th order Runge-Kutta.
 
     Arguments
     ---------
     Nt : int
        Number of steps.  The time-step will be `(t_span[1] - t_span[0])/Nt`.
+    dtype : dtype, None
+        Working precision.  If provided (i.e. ``np.float32``), then the stepping
+        arithmetic is done and the trajectory is stored with this dtype (`complex64` for
+        complex states).  Times are always accumulated in double precision.
+    events : callable, or list of callables, None
+        Events to track as in :py:func:`scipy.integrate.solve_ivp`.  These are located
+        using the cubic Hermite interpolant on each step.  If a `terminal` event
+        occurs, the integration stops there and the final point is the event.
+    executor : concurrent.futures.Executor, None
+        If provided (i.e. a `ThreadPoolExecutor`), then the state is split into `chunks`
+        contiguous pieces along its first axis, and `fun` and the updates are evaluated
+        on these in parallel.  In this case, `fun` must be local: ``fun(t, y[chunk])``
+        must return the derivative for that chunk.  Since NumPy releases the GIL, threads
+        are effective for large states.
+    chunks : int, None
+        Number of chunks to use with `executor`.  Defaults to ``os.cpu_count()``.
 
     Returns
     -------
     res : OdeResult
-       Bunch object.
+       Bunch object.  If `events` are provided, this also includes `t_events`,
+       `y_events`, and `status` (``1`` if a terminal event occurred).
 
     The remaining arguments should match those of :py:func:`scipy.integrate.solve_ivp`.
     Don't worry about optimizations like allowing `fun` to be `vectorized` etc.
     """
     t0, t1 = t_span
     dt = (t1 - t0) / Nt
+    dtype = _working_dtype(y0, dtype)
+    dt_ = _real(dt, dtype)
+
+    def apply(func, *args):
+        return _map_chunks(executor, chunks, func, *args)
+
+    def rhs(t, y):
+        # We explicitly call np.asarray here so that dy is an array.  This allows the
+        # user to return a list or a tuple, but allows us to work with dy as an array.
+        return apply(lambda _y: np.asarray(fun(t, _y), dtype=dtype), y)
+
+    def update(y, dy, h):
+        return y + h * dy
+
+    def combine(y, k1, k2, k3, k4):
+        return y + dt_ / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
 
     ts = [t0]
-    ys = [np.asarray(y0)]  # Convert y0 to an array allowing user to pass in list
+    # Convert y0 to an array allowing user to pass in list
+    ys = [np.asarray(y0, dtype=dtype)]
+
+    event = dy = None
+    if events is not None:
+        events = _Events(events, ts[0], ys[0])
 
     for step in range(Nt):
         t = ts[-1]
         y = ys[-1]
-        dy = np.asarray(fun(t, y))
-        # We explicitly call np.asarray here so that dy_new is an array.  This allows
-        # the user to return a list or a tuple, but allows us to work with dy as an
-        # array.
+        if dy is None:
+            dy = rhs(t, y)
 
-        ##### This is incorrect!  Do your work here...
+        k1 = dy
+        k2 = rhs(t + dt / 2, apply(update, y, k1, dt_ / 2))
+        k3 = rhs(t + dt / 2, apply(update, y, k2, dt_ / 2))
+        k4 = rhs(t + dt, apply(update, y, k3, dt_))
         t_new = t + dt
-        y_new = y + dt * dy
+        y_new = apply(combine, y, k1, k2, k3, k4)
 
         ts.append(t_new)
         ys.append(y_new)
 
+        # The derivative at the end of the step is needed for the interpolant, but is
+        # then reused for the next step.
+        dy_new = None
+        if events is not None:
+            dy_new = rhs(t_new, y_new)
+            event = events.step(t, y, dy, t_new, y_new, dy_new)
+            if event is not None:
+                # Terminate at the event.
+                ts[-1], ys[-1] = event
+                break
+        dy = dy_new
+
     # Note: we transpose the ys array to match solve_ivp
     res = OdeResult(t=np.asarray(ts), y=np.asarray(ys).T)
+    if events is not None:
+        events.update(res, terminated=event is not None)
     return res
 
 
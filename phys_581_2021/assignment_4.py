@@ -1,12 +1,115 @@
-"""Assignment 4: Chaos
-"""
+"""Assignment 4: Chaos"""
+
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+import warnings
+
 import numpy as np
 
-from scipy.integrate import solve_ivp
+from scipy.integrate import solve_ivp, RK23, RK45, DOP853
 
 _DEFAULT_RNG = np.random.default_rng(0)
+_EPS = np.finfo(float).eps
+
+# Bounds on the number of samples used with `tol` for sequential stopping.
+_MIN_SAMPLES = 10
+_MAX_SAMPLES = 10000
+
+# Relative displacement of the starting states of independent chains.
+_CHAIN_SPREAD = 0.1
+
+# Number of segments fitted together (and between checks of `tol`).
+_BLOCK_SIZE = 10
+
+__all__ = [
+    "compute_lyapunov",
+    "compute_lyapunov_spectrum",
+    "compute_lyapunov_map",
+    "compute_ftle",
+    "RunningStats",
+]
+
+
+class RunningStats:
+    """Streaming mean, variance, and lag autocorrelations of a sequence of values.
+
+    The mean and variance are updated with Welford's algorithm.  The autocorrelations
+    for lags ``k = 1, ..., maxlag`` are computed from running sums of the lagged
+    products of the values (shifted by the first value to limit cancellation), keeping
+    only the first and last `maxlag` values.  The memory used is thus independent of
+    the number of values.
+
+    Attributes
+    ----------
+    n : int
+        Number of values added.
+    mean : float
+        Mean of the values.
+    """
+
+    def __init__(self, maxlag=1):
+        self.maxlag = maxlag
+        self.n = 0
+        self.mean = 0.0
+        self._M2 = 0.0
+        self._shift = None
+        self._sum = 0.0
+        self._lagged = np.zeros(maxlag)
+        self._head = []
+        self._tail = collections.deque(maxlen=maxlag)
+
+    def add(self, x):
+        """Add the value `x`."""
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._M2 += delta * (x - self.mean)
+
+        if self._shift is None:
+            self._shift = x
+        x = x - self._shift
+        for k, x_ in enumerate(reversed(self._tail)):
+            self._lagged[k] += x * x_
+        if len(self._head) < self.maxlag:
+            self._head.append(x)
+        self._tail.append(x)
+        self._sum += x
+
+    @property
+    def var(self):
+        """Unbiased estimate of the variance."""
+        return self._M2 / (self.n - 1) if self.n > 1 else np.nan
+
+    @property
+    def std(self):
+        """Unbiased estimate of the standard deviation."""
+        return np.sqrt(self.var)
 
-__all__ = ["compute_lyapunov"]
+    @property
+    def sem(self):
+        """Standard error of the mean assuming uncorrelated values."""
+        return np.sqrt(self.var / self.n) if self.n > 1 else np.nan
+
+    def autocorr(self, k=1):
+        """Return the lag-`k` autocorrelation ``r_k``.
+
+        This is the standard estimate::
+
+            sum((x[:-k] - mean) * (x[k:] - mean)) / sum((x - mean)**2)
+
+        which should be small if the values are uncorrelated.
+        """
+        if not 0 < k <= self.maxlag:
+            raise ValueError(f"Need 0 < k <= maxlag={self.maxlag} (got k={k})")
+        m = self.n - k
+        if m < 1 or self._M2 == 0:
+            return np.nan
+        mean = self._sum / self.n
+        sum_a = self._sum - sum(list(self._tail)[-k:])  # x[:-k].sum()
+        sum_b = self._sum - sum(self._head[:k])  # x[k:].sum()
+        return (self._lagged[k - 1] - mean * (sum_a + sum_b) + m * mean ** 2) / self._M2
 
 
 def compute_lyapunov(
@@ -21,6 +124,13 @@ def compute_lyapunov(
     rng=_DEFAULT_RNG,
     debug=False,
     solve_ivp_args=None,
+    mode="pair",
+    jac=None,
+    tol=None,
+    stats=None,
+    chain_args=None,
+    nonlinear_args=None,
+    debug_args=None,
 ):
     """Return a list of uncorrelated values `lams` estimating the maximal Lyapunov
     exponent for the ODE.
@@ -41,16 +151,20 @@ def compute_lyapunov(
         Initial time.
     dt : float, None
         Evolve for this length of time when computing the exponent.  If `None`, then
-        a reasonable value should be estimated by the code.  (The code may adaptively
-        update `dt`.)
+        this is estimated from a short pilot run of the tangent equation (see
+        `_pilot`) so that the separation stays in the linear-growth regime.  Sampling
+        then continues from the end of the pilot run.
     min_norm : float, None
         Minimum norm. Start with states separated by `min_norm`, then evolve by `dt`,
         extract the exponent, add this to the samples, then pull the state back along
-        the same direction to have length `min_norm` and repeat.  If `None`, then
-        reasonable values should be estimated by the code.
-    Nsamples : int
+        the same direction to have length `min_norm` and repeat.  If `None`, then we
+        use ``sqrt(eps)*norm(y0)``, which is large enough that round-off errors in
+        ``y + dy`` are small, but leaves plenty of room for growth before saturation.
+    Nsamples : int, None
         Number of samples to use when estimating the Lyapunov exponent.  The estimate
         should be the mean of this many samples with an error as the standard deviation.
+        If `tol` is provided, then this is the maximum number of samples.  If `None`,
+        then use 100 samples, or at most 10000 if `tol` is provided.
     norm : function
         Use this function to compute the norm of the difference between states.
         (Default is `np.linalg.norm`.)
@@ -58,57 +172,573 @@ def compute_lyapunov(
         Random number generator such as returned by `np.random.default_rng()`, which is
         used by default if one is not provided.
     debug : bool
-        If `True`, then return `(lams, ts, ys, dys)` with the sample evolution.
+        If `True`, then return `(lams, ts, ys, dys)` with the sample evolution (see
+        `debug_args`).
     solve_ivp_args : dict, None
         Additional arguments for `solve_ivp`.
 
+    mode : {"pair", "tangent", "continuous", "continuous-tangent"}
+        How the separation is evolved:
+
+        ``"pair"``
+            Evolve the two states `y` and ``y + dy`` with `solve_ivp`.
+        ``"tangent"``
+            Evolve the state together with the linearized (tangent) equation
+            ``d(dy)/dt = J(t, y) @ dy`` in a single augmented integration.  The growth
+            of `dy` is then exact (no finite-difference round-off) and `min_norm` only
+            sets the scale.
+        ``"continuous"``, ``"continuous-tangent"``
+            As ``"pair"`` or ``"tangent"``, but step a Runge-Kutta integrator directly
+            rather than calling `solve_ivp` for each sample.  The integrator is
+            restarted after each renormalization with the step size carried over, so
+            there is no repeated initial step-size estimate.  This requires one of the
+            explicit Runge-Kutta methods (``"RK23"``, ``"RK45"`` (default), or
+            ``"DOP853"``) as the `method` in `solve_ivp_args`.
+    jac : function, None
+        Jacobian ``J = jac(t, y)`` of `compute_dy_dt` used by the tangent modes (and the
+        pilot run).  If `None`, then the Jacobian-vector products ``J @ dy`` are
+        computed with finite differences.
+    tol : float, None
+        If provided, then stop sampling once the standard error of the mean of `lams` is
+        less than `tol` (but take at least 10 samples).  This is checked after each
+        block of 10 samples, which are fitted together.  With several chains, each
+        chain stops once its own standard error is less than ``tol*sqrt(Nchains)``.
+    stats : RunningStats, None
+        If provided, then the values of `lams` are also accumulated here, providing the
+        mean, standard error, and autocorrelation for monitoring long runs.
+    chain_args : dict, None
+        Options for splitting the samples between independent chains:
+
+        Nchains : int
+            Number of independent chains (default 1).  Each chain has its own generator
+            spawned from a `np.random.SeedSequence`, starts from `y0` displaced
+            randomly by ``0.1*norm(y0)``, and has its own random `dy0`.  The chains are
+            merged in order, so the results depend on `Nchains` but not on `n_jobs`.
+        n_jobs : int, None
+            If not `None`, then run the chains in a process pool with this many workers
+            (``-1`` means one per CPU).  In this case `compute_dy_dt`, `norm`, and `jac`
+            must be picklable (i.e. defined at module level).
+        seed : int, array-like, None
+            Entropy for the `np.random.SeedSequence` used if ``Nchains > 1``.  If
+            `None`, then this is drawn from `rng`.
+        Nburn : int, None
+            Number of initial samples discarded from each chain while the random initial
+            directions align with the most unstable direction (and, if ``Nchains > 1``,
+            the chains relax back to the attractor and decorrelate).  These should span
+            several Lyapunov times ``1/lam``.  If `None`, then this is 5, or 0 for a
+            single chain if `dy0` is provided or aligned by the pilot run (if `dt` is
+            `None`).
+    nonlinear_args : dict, None
+        Options for detecting segments where the separation did not grow exponentially:
+
+        action : {"keep", "flag", "discard"}
+            If ``"flag"``, then issue a warning with the number of such segments.  If
+            ``"discard"``, then drop these from `lams` (which may then have fewer than
+            `Nsamples` values).  The default ``"keep"`` does not check the segments.
+        saturation : float
+            A segment is nonlinear if the separation grows to more than
+            ``saturation*|y|`` (default 0.01).  Not used in the tangent modes, where
+            there is no saturation.
+        min_r2 : float, None
+            If provided, then a segment is also nonlinear if the coefficient of
+            determination ``r2`` of the fit to the log of the separation is less than
+            this.
+    debug_args : dict, None
+        Options for the sample evolution returned if `debug`:
+
+        every : int
+            Only keep every `every`-th sample (default 1).
+        file : str, None
+            If provided, then rather than keeping the full evolution in memory, write
+            the start and end of each kept segment to a structured ``.npy`` file with
+            fields ``t`` ``(2,)``, ``y`` ``(2, n)``, ``dy`` ``(2, n)``, ``lam``, and
+            ``r2`` (the coefficient of determination of the fit).  Records that were not
+            written (skipped by `every`, or not reached because of `tol`) have ``lam =
+            nan``.
+
     Returns
     -------
     lams : array of floats
         Array of maximal Lyapunov exponents such that the mean and standard deviations
-        give a good estimate.  These should be uncorrelated.
+        give a good estimate.  These should be uncorrelated.  This is the only value
+        returned unless `debug` is `True`.
     ts, ys, dys : array
-        Only provided if `debug` is `True`.  Times, states, and separations used in
-        sampling.
+        Only provided if `debug` is `True`, so that ``(lams, ts, ys, dys)`` is
+        returned.  Times, states, and separations used in sampling.
+    records : memmap
+        If `debug` is `True` and ``debug_args["file"]`` is provided, then ``(lams,
+        records)`` is returned instead, where `records` is a memory map of the file.
     """
-    if min_norm is None or dt is None:
-        ### To Do: Implement here code to estimate good values for min_norm and dt.
-        raise NotImplementedError(
-            "Automatic `min_norm` and `dt` determination not implemented"
-        )
+    if mode not in _MODES:
+        raise ValueError(f"Unknown mode={mode!r}")
+    tangent, continuous = _MODES[mode]
+    chain_args = _options("chain_args", chain_args, _CHAIN_DEFAULTS)
+    nonlinear_args = _options("nonlinear_args", nonlinear_args, _NONLINEAR_DEFAULTS)
+    debug_args = _options("debug_args", debug_args, _DEBUG_DEFAULTS)
+
+    if tangent and min_norm is None:
+        # The tangent equation is linear, so the scale does not matter.
+        min_norm = 1.0
 
-    t0 = 0
     y0 = np.asarray(y0)
+    if solve_ivp_args is None:
+        solve_ivp_args = {}
+
+    if Nsamples is None:
+        Nsamples = 100 if tol is None else _MAX_SAMPLES
+
+    if min_norm is None:
+        min_norm = np.sqrt(_EPS) * norm(y0)
+
+    Nchains, Nburn = chain_args["Nchains"], chain_args["Nburn"]
+    if Nburn is None:
+        Nburn = 0 if Nchains == 1 and (dy0 is not None or dt is None) else 5
 
     if dy0 is None:
-        # Get a random displacement with positive and negative values.  We use a trick
-        # here of converting y0 to a flat floating point array so that if it happens to
-        # be complex, we can generate random real and imaginary parts.
-        y0_real_flat = y0.view(dtype=float).ravel()
-        dy0 = (
-            (rng.random(len(y0_real_flat)) - 0.5).view(dtype=y0.dtype).reshape(y0.shape)
+        dy0 = _random_dy(y0, rng=rng)
+
+    if dt is None:
+        t0, y0, dy0, dt = _pilot(
+            compute_dy_dt,
+            t0=t0,
+            y0=y0,
+            dy0=dy0,
+            min_norm=min_norm,
+            norm=norm,
+            solve_ivp_args=solve_ivp_args,
+            tangent=tangent,
+            jac=jac,
         )
 
-    dy0 = np.asarray(dy0)
+    args = dict(
+        compute_dy_dt=compute_dy_dt,
+        t0=t0,
+        dt=dt,
+        min_norm=min_norm,
+        norm=norm,
+        debug=debug,
+        solve_ivp_args=solve_ivp_args,
+        tangent=tangent,
+        jac=jac,
+        continuous=continuous,
+        debug_every=debug_args["every"],
+        **_nonlinear_args(tangent=tangent, **nonlinear_args),
+    )
+
+    debug_file = debug_args["file"] if debug else None
+    records = None
+    if debug_file is not None:
+        records = _debug_records(debug_file, y0=y0, Nsamples=Nsamples)
+
+    if Nchains == 1:
+        res = _sample_lyapunov(
+            y0=y0,
+            dy0=dy0,
+            Nsamples=Nsamples,
+            Nburn=Nburn,
+            tol=tol,
+            stats=stats,
+            records=records,
+            **args,
+        )
+    else:
+        seed = chain_args["seed"]
+        res = _sample_chains(
+            args,
+            y0=y0,
+            Nsamples=Nsamples,
+            Nchains=Nchains,
+            n_jobs=chain_args["n_jobs"],
+            seed=int(rng.integers(2 ** 63)) if seed is None else seed,
+            Nburn=Nburn,
+            tol=tol,
+            stats=stats,
+            debug_file=debug_file,
+        )
+    return _debug_result(res, debug=debug, records=records)
+
+
+# Engines `(tangent, continuous)` for each `mode` of `compute_lyapunov`, and the
+# defaults of its option dictionaries.
+_MODES = {
+    "pair": (False, False),
+    "tangent": (True, False),
+    "continuous": (False, True),
+    "continuous-tangent": (True, True),
+}
+_CHAIN_DEFAULTS = dict(Nchains=1, n_jobs=None, seed=None, Nburn=None)
+_NONLINEAR_DEFAULTS = dict(action="keep", saturation=0.01, min_r2=None)
+_DEBUG_DEFAULTS = dict(every=1, file=None)
+
+
+def _options(name, args, defaults):
+    """Return the dictionary `args` with the `defaults` for missing keys.
+
+    Unknown keys raise a `ValueError` naming the argument `name`.
+    """
+    args = {} if args is None else dict(args)
+    unknown = set(args).difference(defaults)
+    if unknown:
+        raise ValueError(f"Unknown keys {sorted(unknown)} in {name}")
+    return dict(defaults, **args)
+
+
+def _nonlinear_args(action, saturation, min_r2, tangent):
+    """Return the arguments of `_sample_lyapunov` for the handling of nonlinear growth.
+
+    See `compute_lyapunov`.  There is no saturation in `tangent` mode.
+    """
+    if action not in {"keep", "flag", "discard"}:
+        raise ValueError(f"Unknown nonlinear action={action!r}")
+    if tangent:
+        saturation = None
+    return dict(nonlinear=action, saturation=saturation, min_r2=min_r2)
+
+
+def _sample_chains(
+    args, y0, Nsamples, Nchains, n_jobs, seed, Nburn, tol, stats, debug_file
+):
+    """Return ``(lams, ts, ys, dys, Nnonlinear)`` merged from `Nchains` chains.
+
+    The `Nsamples` samples are split between the chains, which are run with
+    `_lyapunov_chain` (in a process pool if `n_jobs` is not `None`).  If `debug_file`
+    is provided, then each chain writes its debug records to this file.  See
+    `compute_lyapunov` for the other arguments.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(Nchains)
+    Ns = [Nsamples // Nchains + (_n < Nsamples % Nchains) for _n in range(Nchains)]
+    offsets = np.cumsum([0] + Ns[:-1])
+    tol = None if tol is None else tol * np.sqrt(Nchains)
+    if debug_file is not None:
+        args = dict(args, debug_file=debug_file)
+    chain_args = [
+        dict(
+            args,
+            y0=y0,
+            Nsamples=_N,
+            Nburn=Nburn,
+            seed=_seed,
+            tol=tol,
+            offset=_o,
+        )
+        for _N, _seed, _o in zip(Ns, seeds, offsets)
+    ]
+
+    if n_jobs is None:
+        chains = [_lyapunov_chain(_args) for _args in chain_args]
+    else:
+        if n_jobs < 0:
+            n_jobs = os.cpu_count()
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chains = list(executor.map(_lyapunov_chain, chain_args))
+
+    # Merge the chains: lams, ts, ys, dys = [sum(_c, []) for _c in zip(*chains)]
+    res = tuple(sum(_res, []) for _res in list(zip(*chains))[:4])
+    res += (sum(_c[4] for _c in chains),)
+    if stats is not None:
+        for lam in res[0]:
+            stats.add(lam)
+    return res
+
+
+def _debug_records(filename, y0, Nsamples):
+    """Return a new memory-mapped ``.npy`` file for the debug records."""
+    n = len(y0)
+    dtype = np.result_type(y0, float)
+    dtype = np.dtype(
+        [
+            ("t", float, 2),
+            ("y", dtype, (2, n)),
+            ("dy", dtype, (2, n)),
+            ("lam", float),
+            ("r2", float),
+        ]
+    )
+    records = np.lib.format.open_memmap(
+        filename, mode="w+", dtype=dtype, shape=(Nsamples,)
+    )
+    records["lam"] = np.nan
+    # Flush so that chains in other processes see the initialized records.
+    records.flush()
+    return records
+
+
+def _debug_result(res, debug, records):
+    """Return the result of `compute_lyapunov` from `_sample_lyapunov`."""
+    lams, ts, ys, dys, Nnonlinear = res
+    if Nnonlinear:
+        warnings.warn(f"{Nnonlinear} segments did not grow exponentially")
+    if not debug:
+        return lams
+    if records is not None:
+        records.flush()
+        return (lams, records)
+    return (lams, ts, ys, dys)
 
-    # Here is rough code... you should improve this, especially if you want to
-    # dynamically determine dt.
-    t = t0
-    y = y0
-    dy = dy0
+
+def _random_dy(y0, rng):
+    """Return a random displacement with positive and negative values."""
+    # We use a trick here of converting y0 to a flat floating point array so that if it
+    # happens to be complex, we can generate random real and imaginary parts.
+    y0_real_flat = y0.view(dtype=float).ravel()
+    return (rng.random(len(y0_real_flat)) - 0.5).view(dtype=y0.dtype).reshape(y0.shape)
+
+
+def _lyapunov_chain(args):
+    """Return ``(lams, ts, ys, dys)`` for a single chain.
+
+    This is run in the process pool, so takes a single `dict` of arguments for
+    `_sample_lyapunov` including the `seed` for the chain and the number of samples
+    `Nburn` to discard.  If `debug_file` is provided, then the debug records are
+    written to this file starting at `offset`.  The chain starts from `y0` displaced
+    randomly by ``_CHAIN_SPREAD*norm(y0)``, so that after the burn-in the chains are
+    uncorrelated, and with its own random `dy0`.
+    """
+    args = dict(args)
+    rng = np.random.default_rng(args.pop("seed"))
+    y0, norm = args.pop("y0"), args["norm"]
+    dy = _random_dy(y0, rng=rng)
+    y0 = y0 + dy * _CHAIN_SPREAD * norm(y0) / norm(dy)
+    args["dy0"] = _random_dy(y0, rng=rng)
+    debug_file = args.pop("debug_file", None)
+    if debug_file is not None:
+        args["records"] = np.load(debug_file, mmap_mode="r+")
+    res = _sample_lyapunov(y0=y0, **args)
+    if debug_file is not None:
+        args["records"].flush()
+    return res
+
+
+def _sample_lyapunov(
+    compute_dy_dt,
+    y0,
+    dy0,
+    t0,
+    dt,
+    min_norm,
+    Nsamples,
+    norm,
+    debug,
+    solve_ivp_args,
+    tangent,
+    jac,
+    continuous,
+    tol=None,
+    Nburn=0,
+    stats=None,
+    debug_every=1,
+    records=None,
+    offset=0,
+    nonlinear="keep",
+    saturation=None,
+    min_r2=None,
+):
+    """Return ``(lams, ts, ys, dys, Nnonlinear)`` for up to `Nsamples` consecutive
+    samples.
+
+    The first `Nburn` samples are discarded.  The lists `ts`, `ys`, and `dys` are empty
+    unless `debug` is `True`, in which case only every `debug_every`-th sample is kept.
+    If `records` is provided, then these samples are written to ``records[offset + n]``
+    instead.  `Nnonlinear` is the number of flagged or discarded segments.  See
+    `compute_lyapunov` for the other arguments.
+    """
+    dy0 = np.asarray(dy0)
 
     lams = []
+    Nnonlinear = 0
+    if stats is None:
+        stats = RunningStats()
 
     # Only keep if debugging (to keep the memory footprint down)
-    if debug:
-        ts = []
-        ys = []
-        dys = []
+    ts = []
+    ys = []
+    dys = []
 
-    if solve_ivp_args is None:
-        solve_ivp_args = {}
+    args = dict(
+        compute_dy_dt=compute_dy_dt,
+        t=t0,
+        y=y0,
+        dy=dy0,
+        dt=dt,
+        min_norm=min_norm,
+        norm=norm,
+        solve_ivp_args=solve_ivp_args,
+    )
+    if continuous:
+        segments = _evolve_continuous(tangent=tangent, jac=jac, **args)
+    elif tangent:
+        segments = _evolve_tangent(jac=jac, **args)
+    else:
+        segments = _evolve_pair(**args)
+
+    segments = itertools.islice(segments, Nburn, Nburn + Nsamples)
+    n = 0
+    while True:
+        block = list(itertools.islice(segments, _BLOCK_SIZE))
+        if not block:
+            break
+        lams_, r2s, nonlinear_ = _fit_segments(
+            block, norm=norm, saturation=saturation, min_r2=min_r2
+        )
+        for (t_eval, y0s, dys_), lam, r2, _nonlinear in zip(
+            block, lams_, r2s, nonlinear_
+        ):
+            if debug and n % debug_every == 0:
+                if records is None:
+                    ts.append(t_eval)
+                    ys.append(y0s)
+                    dys.append(dys_)
+                else:
+                    inds = [0, -1]
+                    records[offset + n] = (
+                        t_eval[inds],
+                        y0s[:, inds].T,
+                        dys_[:, inds].T,
+                        lam,
+                        r2,
+                    )
+            n += 1
+
+            if nonlinear != "keep" and _nonlinear:
+                Nnonlinear += 1
+                if nonlinear == "discard":
+                    continue
+
+            lams.append(lam)
+            stats.add(lam)
+
+        if tol is not None and stats.n >= _MIN_SAMPLES and stats.sem < tol:
+            break
+
+    return (lams, ts, ys, dys, Nnonlinear)
+
+
+def _fit_segments(block, norm, saturation, min_r2):
+    """Return ``(lams, r2s, nonlinear)`` for a `block` of ``(t_eval, y0s, dys)``.
+
+    All segments are fitted together with `_fit_growth`.  `nonlinear` is a mask of the
+    segments that saturated or have ``r2 < min_r2`` (see `compute_lyapunov`).
+    """
+    t_evals, y0s, dys = zip(*block)
+    starts = np.cumsum([0] + [len(_t) for _t in t_evals[:-1]])
+    dy_norms = norm(np.concatenate(dys, axis=1), axis=0)
+    lams, r2s = _fit_growth(np.concatenate(t_evals), np.log(dy_norms), starts=starts)
+    nonlinear = np.zeros(len(block), dtype=bool)
+    if min_r2 is not None:
+        nonlinear |= r2s < min_r2
+    if saturation is not None:
+        y_norms = norm(np.transpose([_y[:, -1] for _y in y0s]), axis=0)
+        nonlinear |= np.maximum.reduceat(dy_norms, starts) > saturation * y_norms
+    return lams, r2s, nonlinear
+
+
+def _fit_growth(t, log_norms, starts=None):
+    """Return ``(lam, r2)`` from a weighted least-squares fit ``log_norms = a + lam*t``.
+
+    The fit is computed in closed form from weighted sums along the last axis, so
+    `log_norms` may hold a batch of segments sampled at the same times `t`.  If `starts`
+    is provided, then `t` and `log_norms` are instead the concatenation of segments
+    starting at these indices, and `lam` and `r2` have an additional last axis with one
+    value per segment.  The points are given trapezoidal weights so that regions with
+    many small adaptive steps do not dominate the fit.  The coefficient of
+    determination `r2` is close to 1 if the growth is exponential.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(log_norms, dtype=float)
+    batch = starts is not None
+    starts = np.asarray(starts if batch else [0])
+    segments = np.repeat(np.arange(len(starts)), np.diff(starts, append=len(t)))
+
+    # Shift each segment to limit cancellation in the sums.
+    t = t - t[starts][segments]
+    y = y - y[..., starts][..., segments]
+    dt = np.diff(t)
+    dt[starts[1:] - 1] = 0  # No weight between segments
+    w = np.zeros(t.shape)
+    w[1:] += dt / 2
+    w[:-1] += dt / 2
+
+    def sums(x):
+        return np.add.reduceat(x, starts, axis=-1)
 
-    for n in range(Nsamples):
+    S, St, Stt = sums(w), sums(w * t), sums(w * t ** 2)
+    Sy, Sty, Syy = sums(y * w), sums(y * (w * t)), sums(y ** 2 * w)
+    Dtt = Stt - St ** 2 / S
+    Dty = Sty - St * Sy / S
+    Dyy = Syy - Sy ** 2 / S
+    lam = Dty / Dtt
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(Dyy > 0, Dty ** 2 / (Dtt * Dyy), 1.0)
+    if not batch:
+        lam, r2 = lam[..., 0], r2[..., 0]
+    return lam, r2
+
+
+def _pilot(
+    compute_dy_dt,
+    t0,
+    y0,
+    dy0,
+    min_norm,
+    norm,
+    solve_ivp_args,
+    tangent,
+    jac,
+    Ntransient=10,
+    Npilot=20,
+):
+    """Return ``(t0, y0, dy0, dt)`` after a short pilot run.
+
+    The pilot evolves the tangent equation for ``Ntransient + Npilot`` segments of
+    length ``10*tau`` where ``tau = |y0|/|f(t0, y0)|`` is a characteristic timescale.
+    The first `Ntransient` segments let transients decay.  From the estimate `lam` of
+    the maximal exponent over the remaining `Npilot` segments, we choose `dt` so that a
+    separation `min_norm` grows by a factor of ``sqrt(|y|/min_norm)``, remaining well
+    inside the linear regime.  In `tangent` mode there is no saturation, so we use the
+    growth ``eps**(-1/4)`` for the default `min_norm` instead.  If `lam` is not
+    positive, then we use ``dt = 10*tau``.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tau = norm(y0) / norm(np.asarray(compute_dy_dt(t0, y0)))
+    if not (np.isfinite(tau) and tau > 0):
+        tau = 1.0
+
+    lams, ts, ys, dys, _ = _sample_lyapunov(
+        compute_dy_dt,
+        y0=y0,
+        dy0=dy0,
+        t0=t0,
+        dt=10 * tau,
+        min_norm=1.0,
+        Nsamples=Ntransient + Npilot,
+        norm=norm,
+        debug=True,
+        solve_ivp_args=solve_ivp_args,
+        tangent=True,
+        jac=jac,
+        continuous=False,
+    )
+    t0, y0, dy0 = ts[-1][-1], ys[-1][:, -1], dys[-1][:, -1]
+
+    lam = np.mean(lams[Ntransient:])
+    if lam > 0:
+        if tangent:
+            log_growth = -np.log(_EPS) / 4
+        else:
+            log_growth = np.log(norm(y0) / min_norm) / 2
+        dt = log_growth / lam
+    else:
+        dt = 10 * tau
+    return t0, y0, dy0, dt
+
+
+def _evolve_pair(compute_dy_dt, t, y, dy, dt, min_norm, norm, solve_ivp_args):
+    """Yield ``(t_eval, y0s, dys)`` for successive segments of length `dt`.
+
+    This evolves the two states `y` and ``y + dy`` separately, renormalizing the
+    separation `dy` to have length `min_norm` at the start of each segment.
+    """
+    while True:
         # Normalize dy to have length min_norm.
         dy = dy * min_norm / norm(dy)
 
@@ -122,25 +752,556 @@ def compute_lyapunov(
 
         t += dt
         y0s = res0.y
-        y1s = res1.y
-        dys_ = y1s - y0s
-        dy_norms = norm(dys_, axis=0)
+        dys = res1.y - y0s
+        y = y0s[:, -1]
+        dy = dys[:, -1]
+        yield t_eval, y0s, dys
+
 
-        # Here we use np.polyfit to fit a straight light to the log of the norms.  This
-        # could definitely be improved with some kind of check to see if the data is
-        # really well modeled by a straight line.
-        lam = np.polyfit(t_eval, np.log(dy_norms), deg=1)[0]
+def _get_tangent_dy_dt(compute_dy_dt, jac, n, vectorized=False):
+    """Return the RHS for the state ``Y = [y, dys.ravel()]`` augmented by tangent
+    vectors.
 
+    The tangent vectors ``dys`` (the columns of an ``(n, k)`` block, or a single vector
+    of shape ``(n,)``) evolve as ``d(dys)/dt = J(t, y) @ dys``.  If `jac` is `None`,
+    then ``J @ dys`` is computed with one-sided finite differences.  This requires one
+    additional call to `compute_dy_dt` per tangent vector, or a single call with an
+    ``(n, k)`` array if `vectorized` is `True` (as in `solve_ivp`).
+    """
+    sqrt_eps = np.sqrt(np.finfo(float).eps)
+
+    def dY_dt(t, Y):
+        y, dys = Y[:n], Y[n:].reshape((n, -1))
+        f = np.asarray(compute_dy_dt(t, y))
+        if jac is not None:
+            J_dys = np.asarray(jac(t, y)) @ dys
+        else:
+            # Choose the step for each column, leaving zero vectors alone.
+            dy_norms = np.linalg.norm(dys, axis=0)
+            hs = sqrt_eps * (1 + np.linalg.norm(y)) / np.where(dy_norms, dy_norms, 1)
+            ys = y[:, None] + hs * dys
+            if vectorized:
+                fs = np.asarray(compute_dy_dt(t, ys))
+            else:
+                fs = np.transpose([compute_dy_dt(t, _y) for _y in ys.T])
+            J_dys = (fs - f[:, None]) / hs
+        return np.concatenate([f, J_dys.ravel()])
+
+    return dY_dt
+
+
+def _evolve_tangent(compute_dy_dt, jac, t, y, dy, dt, min_norm, norm, solve_ivp_args):
+    """Yield ``(t_eval, y0s, dys)`` for successive segments of length `dt`.
+
+    This evolves the state together with the tangent vector `dy` in a single
+    integration, renormalizing `dy` to have length `min_norm` at the start of each
+    segment.
+    """
+    n = len(y)
+    dY_dt = _get_tangent_dy_dt(compute_dy_dt, jac=jac, n=n)
+    while True:
+        dy = dy * min_norm / norm(dy)
+        res = solve_ivp(
+            dY_dt, t_span=(t, t + dt), y0=np.concatenate([y, dy]), **solve_ivp_args
+        )
+        t += dt
+        y0s, dys = res.y[:n], res.y[n:]
         y = y0s[:, -1]
-        dy = dys_[:, -1]
+        dy = dys[:, -1]
+        yield res.t, y0s, dys
 
-        if debug:
-            ts.append(t_eval)
-            ys.append(y0s)
-            dys.append(dys_)
 
-        lams.append(lam)
+_RK_METHODS = {"RK23": RK23, "RK45": RK45, "DOP853": DOP853}
 
-    if debug:
-        return (lams, ts, ys, dys)
+
+def _evolve_continuous(
+    compute_dy_dt, t, y, dy, dt, min_norm, norm, solve_ivp_args, tangent, jac
+):
+    """Yield ``(t_eval, y0s, dys)`` for successive segments of length `dt`.
+
+    This steps a Runge-Kutta integrator directly rather than calling `solve_ivp`.  The
+    integrator evolves either ``Y = [y, y + dy]`` or (if `tangent`) ``Y = [y, dy]``.  At
+    the end of each segment, `dy` is rescaled to have length `min_norm`, and a new
+    integrator is started from the rescaled state with ``first_step`` set to the last
+    full step, so the step size carries over without the usual initial estimate.
+    """
+    options = dict(solve_ivp_args)
+    Method = options.pop("method", "RK45")
+    Method = _RK_METHODS.get(Method, Method)
+    if not (
+        isinstance(Method, type) and issubclass(Method, tuple(_RK_METHODS.values()))
+    ):
+        raise ValueError(
+            f"The continuous modes require one of {list(_RK_METHODS)} (got {Method})"
+        )
+    h = options.pop("first_step", None)
+
+    n = len(y)
+    if tangent:
+        fun = _get_tangent_dy_dt(compute_dy_dt, jac=jac, n=n)
+    else:
+
+        def fun(t, Y):
+            return np.concatenate([compute_dy_dt(t, Y[:n]), compute_dy_dt(t, Y[n:])])
+
+    t0 = t
+    for segment in itertools.count(1):
+        dy = dy * min_norm / norm(dy)
+        Y = np.concatenate([y, dy if tangent else y + dy])
+        t_bound = t0 + segment * dt
+        if h is not None:
+            h = min(h, t_bound - t)
+        solver = Method(fun, t, Y, t_bound=t_bound, first_step=h, **options)
+        ts, Ys = [t], [Y]
+        while solver.status == "running":
+            solver.step()
+            if solver.status == "failed":
+                raise RuntimeError(solver.message)
+            if solver.status == "running":
+                # The last step is cut short to end at t_bound: don't carry it over.
+                h = solver.step_size
+            ts.append(solver.t)
+            Ys.append(solver.y.copy())
+
+        Ys = np.transpose(Ys)
+        y0s = Ys[:n]
+        dys = Ys[n:] if tangent else Ys[n:] - y0s
+        t, y, dy = ts[-1], y0s[:, -1], dys[:, -1]
+        yield np.asarray(ts), y0s, dys
+
+
+def compute_lyapunov_spectrum(
+    compute_dy_dt,
+    y0,
+    k=None,
+    Q0=None,
+    t0=0,
+    dt=1.0,
+    Nsamples=100,
+    Nburn=5,
+    jac=None,
+    vectorized=False,
+    rng=_DEFAULT_RNG,
+    solve_ivp_args=None,
+):
+    """Return `(lams, dlams)`, the `k` largest Lyapunov exponents and their errors.
+
+    This uses the method of Benettin et al.: `k` tangent vectors are evolved together
+    with the state as an ``(n, k)`` block, and are reorthonormalized after each
+    interval `dt` with a QR decomposition.  The logs of the diagonal of `R` give the
+    growth along each direction.
+
+    Arguments
+    ---------
+    compute_dy_dt : function
+        Return ``dy_dt = compute_dy_dt(t, y)``.
+    y0 : array-like
+        Initial state.  This should be on the attractor.
+    k : int, None
+        Number of exponents to compute.  Defaults to ``len(y0)`` (the full spectrum).
+    Q0 : array-like, None
+        Initial ``(n, k)`` tangent vectors.  If `None`, then these are chosen randomly.
+    t0 : float
+        Initial time.
+    dt : float
+        Time between reorthonormalizations.
+    Nsamples : int
+        Number of intervals.
+    Nburn : int
+        Number of initial intervals discarded while the tangent vectors align with the
+        Lyapunov vectors.
+    jac : function, None
+        Jacobian ``J = jac(t, y)``.  If `None`, then finite differences are used.
+    vectorized : bool
+        If `True`, then `compute_dy_dt` accepts states of shape ``(n, k)`` (used for the
+        finite-difference Jacobian).
+    rng : random number generator
+        Random number generator used to choose `Q0`.
+    solve_ivp_args : dict, None
+        Additional arguments for `solve_ivp`.
+
+    Returns
+    -------
+    lams : array
+        The `k` largest Lyapunov exponents (in decreasing order).
+    dlams : array
+        Standard errors estimated from the fluctuations of the exponents over the
+        `Nsamples` intervals.
+    """
+    y = np.asarray(y0, dtype=float)
+    n = len(y)
+    if k is None:
+        k = n
+    if Q0 is None:
+        Q0 = rng.normal(size=(n, k))
+    Q = np.linalg.qr(np.asarray(Q0, dtype=float))[0]
+
+    if solve_ivp_args is None:
+        solve_ivp_args = {}
+
+    dY_dt = _get_tangent_dy_dt(compute_dy_dt, jac=jac, n=n, vectorized=vectorized)
+
+    t = t0
+    log_Rs = np.empty((Nsamples, k))  # Growth over each interval
+    log_R_burn = np.empty(k)
+    sum_log_R = np.zeros(k)
+    for sample in range(-Nburn, Nsamples):
+        res = solve_ivp(
+            dY_dt,
+            t_span=(t, t + dt),
+            y0=np.concatenate([y, Q.ravel()]),
+            t_eval=[t + dt],
+            **solve_ivp_args,
+        )
+        t += dt
+        Y = res.y[:, -1]
+        y = Y[:n]
+        log_R = log_Rs[sample] if sample >= 0 else log_R_burn
+        Q = _reorthonormalize(Y[n:].reshape((n, k)), log_R=log_R)
+        if sample >= 0:
+            sum_log_R += log_R
+
+    lams = sum_log_R / (Nsamples * dt)
+    dlams = log_Rs.std(axis=0, ddof=1) / dt / np.sqrt(Nsamples)
+    return lams, dlams
+
+
+def _reorthonormalize(A, log_R):
+    """Return the orthonormal factor `Q` of ``A = Q @ R``.
+
+    The logs of the growth ``abs(diag(R))`` along each direction are stored in `log_R`.
+    The columns of `Q` are oriented like those of `A`: this does not affect the
+    exponents but keeps `Q` continuous.  (Columns with ``R[i, i] == 0``, where `A` is
+    degenerate, are left as they are: they are still orthonormal, so the next interval
+    measures the growth along these directions.)
+    """
+    Q, R = np.linalg.qr(A)
+    diag_R = np.diagonal(R)
+    np.log(abs(diag_R), out=log_R)
+    Q *= np.where(diag_R < 0, -1, 1)
+    return Q
+
+
+def compute_lyapunov_map(
+    compute_dy_dt,
+    params,
+    y0,
+    dt=1.0,
+    min_norm=None,
+    Nsamples=100,
+    Nburn=1,
+    chunk_size=100,
+    n_jobs=None,
+    rng=_DEFAULT_RNG,
+    solve_ivp_args=None,
+):
+    """Return `(lams, dlams)`, the maximal Lyapunov exponents over a set of parameters.
+
+    All `M` members (parameter values) in a chunk are evolved together as a single
+    system: each member is paired with a nearby state, and the separations are
+    renormalized to `min_norm` after each interval `dt` as in `compute_lyapunov`.  The
+    exponent for each interval is obtained by fitting all members at once with
+    `_fit_growth`.  Since the members in a chunk share adaptive steps, the results
+    depend (slightly) on `chunk_size`, but not on `n_jobs`.
+
+    Arguments
+    ---------
+    compute_dy_dt : function
+        Return ``dy_dt = compute_dy_dt(t, y, p)`` for a batch of states `y` of shape
+        ``(n, M)`` with the corresponding parameters `p` of shape ``(M,)`` or ``(k,
+        M)``.  For example, ``sigma, rho, beta = p`` for the Lorenz system.  If
+        `n_jobs` is not `None`, then this must be picklable.
+    params : array-like
+        Parameters of shape ``(M,)`` or ``(k, M)``.  Use ``np.ravel()`` or
+        ``np.reshape()`` to sweep over grids.
+    y0 : array-like
+        Initial state of shape ``(n,)`` (for all members) or ``(n, M)``.
+    dt : float
+        Time between renormalizations.
+    min_norm : float, array-like, None
+        Separation of the pairs.  If `None`, then we use ``sqrt(eps)*norm(y0)`` for each
+        member.
+    Nsamples : int
+        Number of samples for each member.
+    Nburn : int
+        Number of initial samples discarded while the members approach their
+        attractors.
+    chunk_size : int
+        Number of members evolved together.
+    n_jobs : int, None
+        If not `None`, then evolve the chunks in a process pool with this many workers
+        (``-1`` means one per CPU).
+    rng : random number generator
+        Random number generator used to choose the initial separations.
+    solve_ivp_args : dict, None
+        Additional arguments for `solve_ivp`.
+
+    Returns
+    -------
+    lams : array
+        Maximal Lyapunov exponent of shape ``(M,)`` for each member.
+    dlams : array
+        Standard errors estimated from the fluctuations over the `Nsamples` intervals.
+    """
+    params = np.asarray(params)
+    M = params.shape[-1]
+    y0 = np.asarray(y0, dtype=float)
+    if y0.ndim == 1:
+        y0 = np.repeat(y0[:, np.newaxis], M, axis=1)
+    n = len(y0)
+    dy0 = rng.random((n, M)) - 0.5
+
+    if min_norm is None:
+        min_norm = np.sqrt(_EPS) * np.linalg.norm(y0, axis=0)
+    min_norm = np.broadcast_to(min_norm, (M,))
+
+    if solve_ivp_args is None:
+        solve_ivp_args = {}
+
+    chunk_args = [
+        dict(
+            compute_dy_dt=compute_dy_dt,
+            p=params[..., _s],
+            y=y0[:, _s],
+            dy=dy0[:, _s],
+            dt=dt,
+            min_norm=min_norm[_s],
+            Nsamples=Nsamples,
+            Nburn=Nburn,
+            solve_ivp_args=solve_ivp_args,
+        )
+        for _s in [slice(_n, _n + chunk_size) for _n in range(0, M, chunk_size)]
+    ]
+    if n_jobs is None:
+        lams = [_lyapunov_map_chunk(_args) for _args in chunk_args]
+    else:
+        if n_jobs < 0:
+            n_jobs = os.cpu_count()
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            lams = list(executor.map(_lyapunov_map_chunk, chunk_args))
+
+    lams = np.concatenate(lams, axis=1)  # (Nsamples, M)
+    return lams.mean(axis=0), lams.std(axis=0, ddof=1) / np.sqrt(Nsamples)
+
+
+def _lyapunov_map_chunk(args):
+    """Return the ``(Nsamples, M)`` samples of the exponents for one chunk.
+
+    This is run in the process pool, so takes a single `dict` of arguments.  See
+    `compute_lyapunov_map`.
+    """
+    compute_dy_dt = args["compute_dy_dt"]
+    p, y, dy = args["p"], args["y"], args["dy"]
+    dt, min_norm = args["dt"], args["min_norm"]
+    Nsamples, Nburn = args["Nsamples"], args["Nburn"]
+    n, M = y.shape
+
+    # Evolve all states Y = [y, y + dy] of shape (n, 2*M) together.
+    p2 = np.concatenate([p, p], axis=-1)
+
+    def fun(t, Y):
+        return np.ravel(compute_dy_dt(t, Y.reshape(n, 2 * M), p2))
+
+    t = 0.0
+    lams = np.empty((Nsamples, M))
+    for sample in range(-Nburn, Nsamples):
+        dy = dy * min_norm / np.linalg.norm(dy, axis=0)
+        res = solve_ivp(
+            fun,
+            t_span=(t, t + dt),
+            y0=np.concatenate([y, y + dy], axis=1).ravel(),
+            **args["solve_ivp_args"],
+        )
+        Ys = res.y.reshape(n, 2 * M, len(res.t))
+        dys = Ys[:, M:] - Ys[:, :M]
+        lam, r2 = _fit_growth(res.t, np.log(np.linalg.norm(dys, axis=0)))
+        if sample >= 0:
+            lams[sample] = lam
+        t += dt
+        y, dy = Ys[:, :M, -1], dys[..., -1]
     return lams
+
+
+def compute_ftle(
+    compute_dy_dt,
+    axes,
+    T,
+    t0=0.0,
+    method="fd",
+    delta=None,
+    jac=None,
+    chunk_size=10000,
+    n_jobs=None,
+    filename=None,
+    solve_ivp_args=None,
+):
+    """Return the finite-time Lyapunov exponent (FTLE) field over a grid.
+
+    The FTLE at each initial condition ``x`` on the grid is ``log(s)/|T|`` where `s` is
+    the largest singular value of the gradient ``F = dphi(x)/dx`` of the flow map
+    ``phi`` from `t0` to ``t0 + T``.  Ridges of the field mark transport barriers.
+    The grid points are generated and evolved together in chunks of `chunk_size` points,
+    so memory is independent of the size of the grid, and the field can be streamed to
+    disk.
+
+    Arguments
+    ---------
+    compute_dy_dt : function
+        Return ``dy_dt = compute_dy_dt(t, y)`` for a batch of states `y` of shape
+        ``(n, N)`` (as for ``solve_ivp(..., vectorized=True)``).  If `n_jobs` is not
+        `None`, then this must be picklable.
+    axes : [array-like]
+        The `n` 1D arrays of coordinates defining the grid (with ``"ij"`` indexing).
+    T : float
+        Integration time.  Use ``T < 0`` for the backward FTLE.
+    t0 : float
+        Initial time.
+    method : {"fd", "tangent"}
+        If ``"fd"``, then compute `F` with centered differences from ``2*n`` auxiliary
+        points ``x +- delta*e_j`` evolved with each grid point.  If ``"tangent"``, then
+        evolve `F` with the variational equation ``dF/dt = J @ F``.
+    delta : float, None
+        Displacement of the auxiliary points for ``method="fd"``.  If `None`, then use
+        1e-3 times the smallest grid spacing.  Larger values smooth the ridges.
+    jac : function, None
+        Jacobian ``J = jac(t, y)`` of shape ``(n, n, N)`` for a batch of states of shape
+        ``(n, N)``, used if ``method="tangent"``.  If `None`, then finite differences
+        are used.
+    chunk_size : int
+        Number of grid points evolved together.
+    n_jobs : int, None
+        If not `None`, then evolve the chunks in a process pool with this many workers
+        (``-1`` means one per CPU).
+    filename : str, None
+        If provided, then stream the field to this ``.npy`` file and return it as a
+        memory map.
+    solve_ivp_args : dict, None
+        Additional arguments for `solve_ivp`.
+
+    Returns
+    -------
+    ftle : array
+        FTLE field of shape ``tuple(map(len, axes))``.
+    """
+    axes = [np.asarray(_x, dtype=float) for _x in axes]
+    shape = tuple(map(len, axes))
+    N = np.prod(shape)
+    if method not in {"fd", "tangent"}:
+        raise ValueError(f"Unknown method={method!r}")
+    if method == "fd" and delta is None:
+        delta = 1e-3 * min(np.diff(_x).min() for _x in axes if len(_x) > 1)
+
+    if filename is None:
+        ftle = np.empty(shape)
+    else:
+        ftle = np.lib.format.open_memmap(filename, mode="w+", dtype=float, shape=shape)
+
+    if solve_ivp_args is None:
+        solve_ivp_args = {}
+
+    chunk_args = [
+        dict(
+            compute_dy_dt=compute_dy_dt,
+            axes=axes,
+            start=_n,
+            stop=min(_n + chunk_size, N),
+            T=T,
+            t0=t0,
+            method=method,
+            delta=delta,
+            jac=jac,
+            solve_ivp_args=solve_ivp_args,
+        )
+        for _n in range(0, N, chunk_size)
+    ]
+    if n_jobs is None:
+        _ftle_chunks = map(_ftle_chunk, chunk_args)
+        _write_chunks(ftle, chunk_args, _ftle_chunks)
+    else:
+        if n_jobs < 0:
+            n_jobs = os.cpu_count()
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            _ftle_chunks = executor.map(_ftle_chunk, chunk_args)
+            _write_chunks(ftle, chunk_args, _ftle_chunks)
+    if filename is not None:
+        ftle.flush()
+    return ftle
+
+
+def _write_chunks(ftle, chunk_args, ftle_chunks):
+    """Write each chunk into `ftle` as it is computed."""
+    for _args, _ftle in zip(chunk_args, ftle_chunks):
+        ftle.flat[_args["start"] : _args["stop"]] = _ftle
+
+
+def _ftle_chunk(args):
+    """Return the FTLE for the grid points ``start:stop`` of one chunk.
+
+    This is run in the process pool, so takes a single `dict` of arguments.  See
+    `compute_ftle`.
+    """
+    compute_dy_dt, axes = args["compute_dy_dt"], args["axes"]
+    T, t0, method = args["T"], args["t0"], args["method"]
+    shape = tuple(map(len, axes))
+    inds = np.unravel_index(np.arange(args["start"], args["stop"]), shape)
+    x = np.array([_x[_i] for _x, _i in zip(axes, inds)])
+    n, m = x.shape
+    eye = np.eye(n)[:, :, np.newaxis]  # (n, n, 1)
+
+    if method == "fd":
+        # Evolve the 2*n auxiliary points x +- delta*e_j for each grid point.
+        delta = args["delta"]
+        y0 = np.stack([x[:, np.newaxis] + delta * eye, x[:, np.newaxis] - delta * eye], 1)
+
+        def fun(t, Y):
+            return np.ravel(compute_dy_dt(t, Y.reshape(n, 2 * n * m)))
+
+    else:
+        # Evolve the state and F = dphi/dx with dF/dt = J @ F.
+        y0 = np.concatenate([x[:, np.newaxis], np.broadcast_to(eye, (n, n, m))], axis=1)
+        fun = _get_ftle_tangent_dy_dt(compute_dy_dt, jac=args["jac"], n=n, m=m)
+
+    t_span = (t0, t0 + T)
+    res = solve_ivp(
+        fun, t_span=t_span, y0=y0.ravel(), t_eval=t_span[1:], **args["solve_ivp_args"]
+    )
+    if method == "fd":
+        ys = res.y[:, -1].reshape(n, 2, n, m)
+        F = (ys[:, 0] - ys[:, 1]) / (2 * delta)
+    else:
+        F = res.y[:, -1].reshape(n, n + 1, m)[:, 1:]
+
+    s = np.linalg.svd(F.transpose(2, 0, 1), compute_uv=False)[:, 0]
+    return np.log(s) / abs(T)
+
+
+def _get_ftle_tangent_dy_dt(compute_dy_dt, jac, n, m):
+    """Return the RHS for ``Y = [y, F]`` of shape ``(n, n + 1, m)`` for `m` points.
+
+    If `jac` is `None`, then `J` is computed with centered differences using a single
+    call to `compute_dy_dt` with ``2*n*m`` states.  (Unlike the directional differences
+    ``J @ F`` used in `_get_tangent_dy_dt`, the errors here are smooth functions of `y`
+    that do not scale with ``|F|``: this matters since the columns of `F` grow
+    exponentially while some components stay small, and noise in these stalls the
+    step-size control.)
+    """
+    h = _EPS ** (1 / 3)
+    eye = np.eye(n)[:, np.newaxis, :, np.newaxis]  # (n, 1, n, 1)
+    signs = np.array([1, -1])[:, np.newaxis, np.newaxis]  # (2, 1, 1)
+
+    def dY_dt(t, Y):
+        Y = Y.reshape(n, n + 1, m)
+        y, F = Y[:, 0], Y[:, 1:]
+        dy_dt = np.asarray(compute_dy_dt(t, y))
+        if jac is None:
+            hs = h * (1 + abs(y))  # (n, m)
+            ys = y[:, np.newaxis, np.newaxis] + signs * hs[np.newaxis] * eye
+            dys = np.asarray(compute_dy_dt(t, ys.reshape(n, 2 * n * m)))
+            dys = dys.reshape(n, 2, n, m)
+            J = (dys[:, 0] - dys[:, 1]) / (2 * hs)
+        else:
+            J = jac(t, y)
+        dF_dt = np.einsum("ijm,jkm->ikm", J, F)
+        return np.concatenate([dy_dt[:, np.newaxis], dF_dt], axis=1).ravel()
+
+    return dY_dt
@@ -0,0 +1,197 @@
+"""Integrated autocorrelation times for MCMC chains.
+
+The autocorrelation functions are computed with FFTs in ``O(N log N)`` operations per
+dimension, and the integrated autocorrelation time `tau` is estimated with the
+automatic windowing procedure of Sokal (as used by emcee).
+
+While sampling, an `AutocorrMonitor` recomputes `tau` at logarithmically spaced
+checkpoints (so the total cost remains ``O(N log N)``) and reports convergence once the
+chain is longer than `factor` times `tau` and the estimate has stabilized::
+
+    monitor = AutocorrMonitor(factor=50)
+    sampler = EnsembleSampler(...)
+    for coords, log_prob in sampler.sample(pos, Nsteps=Nmax):
+        if monitor.update(sampler):
+            break
+    samples = sampler.get_chain(discard=monitor.discard, thin=monitor.thin, flat=True)
+
+or, equivalently, ``monitor = run_until_converged(sampler, pos, Nmax)``.
+"""
+import numpy as np
+
+__all__ = [
+    "autocorr_function",
+    "integrated_time",
+    "AutocorrMonitor",
+    "run_until_converged",
+]
+
+
+def autocorr_function(x, axis=0):
+    """Return the normalized autocorrelation function of `x` along `axis`.
+
+    The mean is removed, and the result is normalized so that the autocorrelation is
+    1 at zero lag.  The computation uses FFTs with zero padding to avoid wrapping.
+    """
+    x = np.asarray(x, dtype=float)
+    N = x.shape[axis]
+    n = 1 << int(np.ceil(np.log2(2 * N)))  # Zero pad to avoid circular correlation
+    dx = x - x.mean(axis=axis, keepdims=True)
+    f = np.fft.rfft(dx, n=n, axis=axis)
+    acf = np.fft.irfft(f * f.conj(), n=n, axis=axis)
+    acf = np.take(acf, np.arange(N), axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return acf / np.take(acf, [0], axis=axis)
+
+
+def _auto_window(taus, c):
+    """Return the index of the smallest window ``M`` with ``M >= c*tau(M)``."""
+    m = np.arange(len(taus))[:, None] < c * taus
+    return np.where(np.any(~m, axis=0), np.argmin(m, axis=0), len(taus) - 1)
+
+
+def integrated_time(chain, c=5):
+    """Return the integrated autocorrelation time for each dimension of `chain`.
+
+    Arguments
+    ---------
+    chain : array-like
+        Chain with shape ``(Nsteps,)``, ``(Nsteps, Nwalkers)``, or ``(Nsteps,
+        Nwalkers, Ndim)``.  The autocorrelation functions of the walkers are averaged
+        before estimating `tau`.
+    c : float
+        Window parameter: the sum is truncated at the smallest lag ``M >= c*tau(M)``.
+
+    Returns
+    -------
+    tau : array
+        Integrated autocorrelation time ``tau = 1 + 2*sum(rho(k))`` for each of the
+        `Ndim` dimensions.
+    """
+    chain = np.asarray(chain, dtype=float)
+    if chain.ndim == 1:
+        chain = chain[:, None, None]
+    elif chain.ndim == 2:
+        chain = chain[:, :, None]
+    f = autocorr_function(chain, axis=0).mean(axis=1)  # (Nsteps, Ndim)
+    taus = 2.0 * np.cumsum(f, axis=0) - 1.0
+    window = _auto_window(taus, c)
+    return taus[window, np.arange(taus.shape[1])]
+
+
+class AutocorrMonitor:
+    """Monitor the autocorrelation time of a growing chain to decide when to stop.
+
+    Call :meth:`update` after every step.  The estimate is not updated incrementally:
+    at each checkpoint, `tau` is recomputed from scratch with `integrated_time` on the
+    full chain.  The checkpoints grow geometrically by a factor of `growth`, however,
+    so the total cost is at most ``growth/(growth - 1)`` times the cost of the last
+    computation.
+
+    Arguments
+    ---------
+    factor : float
+        The chain is converged once it is longer than `factor` times `tau` for all
+        dimensions...
+    rtol : float
+        ... and `tau` changed by less than this relative amount since the last
+        checkpoint.
+    Nmin : int
+        First checkpoint.
+    growth : float
+        Ratio between successive checkpoints.
+    c : float
+        Window parameter for `integrated_time`.
+
+    Attributes
+    ----------
+    iterations, taus : list
+        Checkpoints and the corresponding estimates of `tau`.
+    converged : bool
+        Whether the convergence criterion has been met.
+    """
+
+    def __init__(self, factor=50, rtol=0.01, Nmin=100, growth=1.2, c=5):
+        self.factor = factor
+        self.rtol = rtol
+        self.growth = growth
+        self.c = c
+        self.next_checkpoint = Nmin
+        self.iterations = []
+        self.taus = []
+        self.converged = False
+
+    @property
+    def tau(self):
+        """Latest estimate of the autocorrelation times."""
+        return self.taus[-1] if self.taus else None
+
+    @property
+    def discard(self):
+        """Suggested number of initial steps to discard as burn-in.
+
+        This is 0 if no checkpoint has been reached (so `tau` is not known).
+        """
+        if self.tau is None:
+            return 0
+        return int(2 * np.max(self.tau))
+
+    @property
+    def thin(self):
+        """Suggested thinning to get (nearly) independent samples.
+
+        This is 1 if no checkpoint has been reached (so `tau` is not known).
+        """
+        if self.tau is None:
+            return 1
+        return max(1, int(np.min(self.tau) / 2))
+
+    def update(self, sampler):
+        """Update with the chain from `sampler` and return `True` if converged.
+
+        Arguments
+        ---------
+        sampler : EnsembleSampler
+            Sampler (or anything with `iteration` and `get_chain()`).
+        """
+        iteration = sampler.iteration
+        if iteration < self.next_checkpoint:
+            return self.converged
+        while self.next_checkpoint <= iteration:
+            next_checkpoint = int(np.ceil(self.growth * self.next_checkpoint))
+            self.next_checkpoint = max(self.next_checkpoint + 1, next_checkpoint)
+        tau = integrated_time(sampler.get_chain(), c=self.c)
+        self.converged = bool(
+            self.taus
+            and np.all(self.factor * tau < iteration)
+            and np.all(abs(self.taus[-1] - tau) < self.rtol * tau)
+        )
+        self.iterations.append(iteration)
+        self.taus.append(tau)
+        return self.converged
+
+
+def run_until_converged(sampler, coords, Nmax, monitor=None, **kw):
+    """Sample until converged or `Nmax` steps, and return the `AutocorrMonitor`.
+
+    Arguments
+    ---------
+    sampler : EnsembleSampler
+        Sampler to run.
+    coords : array-like, None
+        Initial positions (or `None` to continue).
+    Nmax : int
+        Maximum number of steps.
+    monitor : AutocorrMonitor, None
+        Monitor.  If `None`, then one is constructed with the arguments `kw`.
+    """
+    if monitor is None:
+        monitor = AutocorrMonitor(**kw)
+    steps = sampler.sample(coords, Nsteps=Nmax)
+    try:
+        for coords, log_prob in steps:
+            if monitor.update(sampler):
+                break
+    finally:
+        steps.close()  # Make sure the backend is flushed
+    return monitor
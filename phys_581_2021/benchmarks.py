@@ -0,0 +1,507 @@
+"""Work-precision benchmarks for the integrators.
+
+Here we measure the error, number of function evaluations `nfev`, and wall time for
+the solvers in :py:mod:`phys_581_2021.assignment_2` and for
+:py:func:`scipy.integrate.solve_ivp` on a few standard problems.  The results are
+stored as nested dictionaries ``results[problem][solver] = [record, ...]`` which can be
+saved as JSON and plotted::
+
+    results = work_precision()
+    save_results(results, "work_precision.json")
+    plot_work_precision(results)
+
+Similarly, :func:`chaos_benchmark` measures the accuracy and cost of the Lyapunov
+exponent methods in :py:mod:`phys_581_2021.assignment_4`, and
+:func:`find_regressions` compares these with a saved baseline::
+
+    results = chaos_benchmark()
+    find_regressions(results, load_results("chaos_baseline.json"))
+"""
+import json
+import time
+
+import numpy as np
+
+from scipy.integrate import solve_ivp
+
+from matplotlib import pyplot as plt
+
+from . import assignment_2, assignment_4
+
+__all__ = [
+    "PROBLEMS",
+    "SOLVERS",
+    "work_precision",
+    "save_results",
+    "load_results",
+    "plot_work_precision",
+    "CHAOS_PROBLEMS",
+    "CHAOS_METHODS",
+    "chaos_benchmark",
+    "find_regressions",
+]
+
+
+class Problem:
+    """Test problem with either an exact solution or a high-precision reference.
+
+    Attributes
+    ----------
+    name : str
+        Name of the problem.
+    t_span : (float, float)
+        Integration interval.
+    y0 : array
+        Initial state.
+    Nt0 : int
+        Smallest number of steps to use with the fixed-step solvers.
+    """
+
+    name = None
+    t_span = None
+    y0 = None
+    Nt0 = 8
+
+    def fun(self, t, y):
+        raise NotImplementedError
+
+    def y(self, t):
+        """Return the solution at time `t`.  Computed with DOP853 if not overloaded."""
+        res = solve_ivp(
+            self.fun,
+            self.t_span,
+            self.y0,
+            method="DOP853",
+            t_eval=[t],
+            rtol=1e-13,
+            atol=1e-13,
+        )
+        return res.y[:, -1]
+
+
+class Gaussian(Problem):
+    """Gaussian ``y = exp(-t**2/2)``.  This is `ODE1` from the official tests."""
+
+    name = "gaussian"
+    t_span = (0.0, 1.0)
+    y0 = np.array([1.0])
+
+    def fun(self, t, y):
+        return -t * y
+
+    def y(self, t):
+        return self.y0 * np.exp(-(t ** 2) / 2)
+
+
+class Lorenz(Problem):
+    """Lorenz system over a short enough time that the solution is well defined."""
+
+    name = "lorenz"
+    t_span = (0.0, 2.0)
+    y0 = np.array([1.0, 1.0, 1.0])
+    Nt0 = 64
+    sigma, beta, rho = 10.0, 8.0 / 3, 28.0
+
+    def fun(self, t, q):
+        x, y, z = q
+        return (self.sigma * (y - x), x * (self.rho - z) - y, x * y - self.beta * z)
+
+
+class ParametricOscillator(Problem):
+    """Parametric oscillator ``x'' = -w0**2*(1 + h*cos(wp*t))*x`` near resonance."""
+
+    name = "parametric"
+    t_span = (0.0, 20.0)
+    y0 = np.array([0.0, 1.0])
+    Nt0 = 32
+    w0, h, wp = 1.0, 0.1, 2.0
+
+    def fun(self, t, y):
+        x, dx = y
+        return (dx, -self.w0 ** 2 * (1 + self.h * np.cos(self.wp * t)) * x)
+
+
+PROBLEMS = {_p.name: _p for _p in [Gaussian(), Lorenz(), ParametricOscillator()]}
+
+
+def _fixed(solver):
+    """Return a benchmark runner for the fixed-step `solver`.  Parameter is ``Nt``."""
+
+    def run(fun, t_span, y0, param):
+        return solver(fun, t_span=t_span, y0=y0, Nt=int(param))
+
+    run.params = lambda problem: problem.Nt0 * 2 ** np.arange(8)
+    return run
+
+
+def _adaptive(solver, **kw):
+    """Return a benchmark runner for the adaptive `solver`.  Parameter is ``rtol``."""
+
+    def run(fun, t_span, y0, param):
+        return solver(fun, t_span=t_span, y0=y0, rtol=param, atol=param * 1e-3, **kw)
+
+    run.params = lambda problem: 10.0 ** -np.arange(3, 12)
+    return run
+
+
+SOLVERS = {
+    "euler": _fixed(assignment_2.solve_ivp_euler),
+    "rk4": _fixed(assignment_2.solve_ivp_rk4),
+    "abm": _fixed(assignment_2.solve_ivp_abm),
+    "abm_adaptive": _adaptive(assignment_2.solve_ivp_abm_adaptive),
+    "RK45": _adaptive(solve_ivp, method="RK45"),
+    "DOP853": _adaptive(solve_ivp, method="DOP853"),
+}
+
+
+def run_benchmark(problem, solver, param, repeat=1):
+    """Return a record ``dict(param, err, nfev, time)`` for one run.
+
+    Arguments
+    ---------
+    problem : Problem
+        Problem to solve.
+    solver : function
+        Runner from `SOLVERS`.
+    param : float
+        Parameter (``Nt`` or ``rtol``) for the solver.
+    repeat : int
+        Number of repetitions: the minimum wall time is reported.
+    """
+    nfev = 0
+
+    def fun(t, y):
+        nonlocal nfev
+        nfev += 1
+        return problem.fun(t, y)
+
+    times = []
+    for n in range(repeat):
+        nfev = 0
+        tic = time.perf_counter()
+        with np.errstate(all="ignore"):
+            # Low-order methods with large steps may overflow: err will be nan.
+            res = solver(fun, problem.t_span, problem.y0, param)
+        times.append(time.perf_counter() - tic)
+
+    y_exact = problem.y(problem.t_span[1])
+    err = np.linalg.norm(res.y[:, -1] - y_exact) / np.linalg.norm(y_exact)
+    return dict(param=float(param), err=float(err), nfev=nfev, time=min(times))
+
+
+def work_precision(problems=None, solvers=None, params=None, repeat=1):
+    """Return the work-precision data ``results[problem][solver] = [record, ...]``.
+
+    Arguments
+    ---------
+    problems : [str], None
+        Names of the problems in `PROBLEMS` to run.  Default is all.
+    solvers : [str], None
+        Names of the solvers in `SOLVERS` to run.  Default is all.
+    params : dict, None
+        Optional parameters ``{solver: [param, ...]}`` overriding the defaults.
+    repeat : int
+        Number of repetitions of each run for timing.
+    """
+    if problems is None:
+        problems = list(PROBLEMS)
+    if solvers is None:
+        solvers = list(SOLVERS)
+    if params is None:
+        params = {}
+
+    results = {}
+    for problem_name in problems:
+        problem = PROBLEMS[problem_name]
+        results[problem_name] = {}
+        for solver_name in solvers:
+            solver = SOLVERS[solver_name]
+            _params = params.get(solver_name, solver.params(problem))
+            results[problem_name][solver_name] = [
+                run_benchmark(problem, solver, _p, repeat=repeat) for _p in _params
+            ]
+    return results
+
+
+def save_results(results, filename):
+    """Save `results` as JSON."""
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(filename):
+    """Return results saved with :func:`save_results`."""
+    with open(filename) as f:
+        return json.load(f)
+
+
+def plot_work_precision(results, fig=None):  # pragma: no cover
+    """Plot the error against `nfev` and wall time for each problem."""
+    if fig is None:
+        fig = plt.figure(figsize=(10, 3 * len(results)))
+    axs = fig.subplots(len(results), 2, squeeze=False, sharey="row")
+    for (ax_nfev, ax_time), (problem_name, _results) in zip(axs, results.items()):
+        for solver_name, records in _results.items():
+            err = [_r["err"] for _r in records]
+            (l,) = ax_nfev.loglog([_r["nfev"] for _r in records], err, ".-")
+            ax_time.loglog(
+                [_r["time"] for _r in records], err, ".-", c=l.get_c(), label=solver_name
+            )
+        ax_nfev.set(xlabel="nfev", ylabel="relative error", title=problem_name)
+        ax_time.set(xlabel="wall time [s]", title=problem_name)
+        ax_time.legend()
+    return fig, axs
+
+
+class ChaosProblem:
+    """Chaotic system with a reference maximal Lyapunov exponent.
+
+    Attributes
+    ----------
+    name : str
+        Name of the problem.
+    y0 : array
+        Initial state.  This is evolved for `t_transient` to get onto the attractor.
+    lam : float
+        Reference maximal Lyapunov exponent.
+    methods : [str], None
+        Names of the applicable methods in `CHAOS_METHODS`.  Default is all.
+    """
+
+    name = None
+    y0 = None
+    lam = None
+    methods = None
+    t_transient = 100.0
+
+    def fun(self, t, y):
+        raise NotImplementedError
+
+    def y_attractor(self):
+        """Return a state on the attractor."""
+        res = solve_ivp(
+            self.fun, (0, self.t_transient), self.y0, method="DOP853", rtol=1e-10
+        )
+        return res.y[:, -1]
+
+    def error(self, lams):
+        """Return the error in the exponents `lams` (maximal first)."""
+        return abs(lams[0] - self.lam)
+
+
+class LorenzChaos(ChaosProblem):
+    """Lorenz system with the standard parameters."""
+
+    name = "lorenz"
+    y0 = np.array([1.0, 1.0, 1.0])
+    lam = 0.9056
+
+    def fun(self, t, q):
+        x, y, z = q
+        return (10.0 * (y - x), x * (28.0 - z) - y, x * y - 8.0 / 3 * z)
+
+
+class Rossler(ChaosProblem):
+    """Rössler system with ``a = b = 0.2`` and ``c = 5.7``."""
+
+    name = "rossler"
+    y0 = np.array([1.0, 1.0, 1.0])
+    lam = 0.0714
+    a, b, c = 0.2, 0.2, 5.7
+
+    def fun(self, t, q):
+        x, y, z = q
+        return (-y - z, x + self.a * y, self.b + z * (x - self.c))
+
+
+class HenonHeiles(ChaosProblem):
+    """Hénon-Heiles system in the chaotic sea at energy ``E = 1/6``.
+
+    There is no accepted reference for the maximal exponent, but since the system is
+    Hamiltonian, the spectrum comes in pairs ``+-lam`` and must sum to zero.  The error
+    is thus the magnitude of this sum, requiring the full spectrum.
+    """
+
+    name = "henon_heiles"
+    y0 = np.array([0.0, 0.0, np.sqrt(1 / 3), 0.0])
+    methods = ["spectrum"]
+
+    def fun(self, t, q):
+        x, y, px, py = q
+        return (px, py, -x - 2 * x * y, -y - x ** 2 + y ** 2)
+
+    def error(self, lams):
+        return abs(sum(lams))
+
+
+CHAOS_PROBLEMS = {_p.name: _p for _p in [LorenzChaos(), Rossler(), HenonHeiles()]}
+
+
+def _lyapunov(**kw):
+    """Return a runner for `compute_lyapunov`."""
+
+    def run(fun, y0, Nsamples, dt, rtol):
+        lams = assignment_4.compute_lyapunov(
+            fun,
+            y0,
+            dt=dt,
+            Nsamples=Nsamples,
+            rng=np.random.default_rng(0),
+            solve_ivp_args=dict(rtol=rtol, atol=rtol),
+            **kw,
+        )
+        return np.mean(lams, keepdims=True), np.std(lams, ddof=1) / np.sqrt(Nsamples)
+
+    return run
+
+
+def _spectrum(fun, y0, Nsamples, dt, rtol):
+    """Runner for `compute_lyapunov_spectrum` with the full spectrum."""
+    lams, dlams = assignment_4.compute_lyapunov_spectrum(
+        fun,
+        y0,
+        dt=dt,
+        Nsamples=Nsamples,
+        rng=np.random.default_rng(0),
+        solve_ivp_args=dict(rtol=rtol, atol=rtol),
+    )
+    return lams, dlams[0]
+
+
+CHAOS_METHODS = {
+    "pair": _lyapunov(),
+    "tangent": _lyapunov(mode="tangent"),
+    "continuous": _lyapunov(mode="continuous-tangent"),
+    "spectrum": _spectrum,
+}
+
+# Default configurations: the cost should scale with Nsamples*dt and the tolerance.
+CHAOS_CONFIGS = [
+    dict(Nsamples=Nsamples, dt=dt, rtol=rtol)
+    for Nsamples in [20, 80]
+    for dt in [1.0, 10.0]
+    for rtol in [1e-4, 1e-8]
+]
+
+
+def run_chaos_benchmark(problem, method, Nsamples, dt, rtol, repeat=1):
+    """Return a record ``dict(Nsamples, dt, rtol, lam, dlam, err, nfev, time)``.
+
+    Arguments
+    ---------
+    problem : ChaosProblem
+        Problem to solve.
+    method : function
+        Runner from `CHAOS_METHODS`.
+    Nsamples, dt, rtol : int, float, float
+        Number of samples, sampling interval, and tolerance.
+    repeat : int
+        Number of repetitions: the minimum wall time is reported.
+    """
+    nfev = 0
+
+    def fun(t, y):
+        nonlocal nfev
+        nfev += 1
+        return problem.fun(t, y)
+
+    y0 = problem.y_attractor()
+    times = []
+    for n in range(repeat):
+        nfev = 0
+        tic = time.perf_counter()
+        lams, dlam = method(fun, y0, Nsamples=Nsamples, dt=dt, rtol=rtol)
+        times.append(time.perf_counter() - tic)
+
+    return dict(
+        Nsamples=int(Nsamples),
+        dt=float(dt),
+        rtol=float(rtol),
+        lam=float(lams[0]),
+        dlam=float(dlam),
+        err=float(problem.error(lams)),
+        nfev=nfev,
+        time=min(times),
+    )
+
+
+def chaos_benchmark(problems=None, methods=None, configs=None, repeat=1):
+    """Return the chaos benchmark data ``results[problem][method] = [record, ...]``.
+
+    Arguments
+    ---------
+    problems : [str], None
+        Names of the problems in `CHAOS_PROBLEMS` to run.  Default is all.
+    methods : [str], None
+        Names of the methods in `CHAOS_METHODS` to run.  Default is all (that apply to
+        each problem).
+    configs : [dict], None
+        Configurations ``dict(Nsamples, dt, rtol)``.  Default is `CHAOS_CONFIGS`.
+    repeat : int
+        Number of repetitions of each run for timing.
+    """
+    if problems is None:
+        problems = list(CHAOS_PROBLEMS)
+    if methods is None:
+        methods = list(CHAOS_METHODS)
+    if configs is None:
+        configs = CHAOS_CONFIGS
+
+    results = {}
+    for problem_name in problems:
+        problem = CHAOS_PROBLEMS[problem_name]
+        results[problem_name] = {}
+        for method_name in methods:
+            if problem.methods is not None and method_name not in problem.methods:
+                continue
+            method = CHAOS_METHODS[method_name]
+            results[problem_name][method_name] = [
+                run_chaos_benchmark(problem, method, repeat=repeat, **_config)
+                for _config in configs
+            ]
+    return results
+
+
+def find_regressions(results, baseline, time_factor=1.5, nfev_factor=1.1, nsigma=3):
+    """Return a list of messages describing regressions of `results` from `baseline`.
+
+    Records are matched by problem, method, and configuration.  A record regresses if
+    its wall time or `nfev` grows by more than `time_factor` or `nfev_factor`, or if
+    its error grows by more than `nsigma` times the statistical error `dlam`.
+
+    Arguments
+    ---------
+    results, baseline : dict
+        Results from :func:`chaos_benchmark` (possibly loaded with
+        :func:`load_results`).
+    time_factor, nfev_factor : float
+        Allowed relative increases in the wall time and `nfev`.
+    nsigma : float
+        Allowed increase in the error in units of `dlam`.
+    """
+    keys = ("Nsamples", "dt", "rtol")
+    regressions = []
+    for problem_name, _results in results.items():
+        for method_name, records in _results.items():
+            base = baseline.get(problem_name, {}).get(method_name, [])
+            base = {tuple(_r[_k] for _k in keys): _r for _r in base}
+            for record in records:
+                config = tuple(record[_k] for _k in keys)
+                if config not in base:
+                    continue
+                _base = base[config]
+                label = f"{problem_name}/{method_name} {dict(zip(keys, config))}"
+                if record["time"] > time_factor * _base["time"]:
+                    regressions.append(
+                        f"{label}: time {_base['time']:.3g}s -> {record['time']:.3g}s"
+                    )
+                if record["nfev"] > nfev_factor * _base["nfev"]:
+                    regressions.append(
+                        f"{label}: nfev {_base['nfev']} -> {record['nfev']}"
+                    )
+                dlam = max(record["dlam"], _base["dlam"])
+                if record["err"] > _base["err"] + nsigma * dlam:
+                    regressions.append(
+                        f"{label}: err {_base['err']:.3g} -> {record['err']:.3g}"
+                    )
+    return regressions
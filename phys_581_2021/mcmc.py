@@ -0,0 +1,944 @@
+"""Markov Chain Monte Carlo (MCMC) sampling.
+
+This module provides an affine-invariant ensemble sampler using the "stretch move" of
+Goodman and Weare, following the algorithm used by :py:class:`emcee.EnsembleSampler`::
+
+    sampler = EnsembleSampler(Nwalkers, Ndim, log_prob, args=(x, y), vectorize=True)
+    sampler.run_mcmc(pos, Nsteps)
+    samples = sampler.get_chain(discard=100, flat=True)
+
+Each half of the ensemble is updated in a single vectorized step, so if `log_prob`
+accepts a ``(Nwalkers, Ndim)`` array of positions (``vectorize=True``), then there is
+no Python loop over walkers.  The random numbers are drawn in the same order as in
+emcee (including the draw emcee uses to choose a move on each step), so if `rng` is a
+:py:class:`numpy.random.RandomState` with the same state as ``emcee_sampler.random_state``
+then the chains agree with those from emcee.
+
+Long chains can be stored on disk with a `MemmapBackend`, which also allows a crashed
+run to be resumed::
+
+    backend = MemmapBackend("chain.dat")
+    sampler = EnsembleSampler(Nwalkers, Ndim, log_prob, backend=backend)
+    sampler.run_mcmc(None if backend.iteration else pos, Nsteps)
+
+For multimodal posteriors, `PTSampler` runs ensembles at several temperatures (in
+worker processes if `n_jobs` is given) and swaps walkers between them.  This also
+provides an estimate of the evidence by thermodynamic integration.
+"""
+import multiprocessing
+import os
+
+import numpy as np
+
+from .autocorr import integrated_time
+
+__all__ = [
+    "EnsembleSampler",
+    "PTSampler",
+    "Backend",
+    "MemmapBackend",
+    "stretch_move",
+]
+
+
+def stretch_move(
+    coords, log_prob, compute_log_prob, a=2.0, rng=None, nsplits=2, blobs=None
+):
+    """Return `(coords, log_prob, accepted)` after one stretch move of all walkers.
+
+    The walkers are randomly split into `nsplits` sets.  Each set is updated in turn
+    with proposals ``Y = X_c + z*(X - X_c)`` where `X_c` is a random walker from the
+    complementary sets, and `z` is drawn from ``g(z) ~ 1/sqrt(z)`` on ``[1/a, a]``.
+
+    Arguments
+    ---------
+    coords : array-like
+        Current ``(Nwalkers, Ndim)`` positions of the walkers.
+    log_prob : array-like
+        Current ``(Nwalkers,)`` log-probabilities of the walkers.
+    compute_log_prob : function
+        Function ``compute_log_prob(coords)`` returning the log-probabilities for an
+        array of positions.
+    a : float
+        Stretch scale parameter.
+    rng : np.random.Generator, np.random.RandomState
+        Source of random numbers.  These are drawn in the same order as in emcee's
+        ``StretchMove.propose`` (which does not include the move choice made by
+        ``emcee.EnsembleSampler`` before each step).
+    nsplits : int
+        Number of sets to split the walkers into.
+    blobs : array-like, None
+        Additional ``(Nwalkers, ...)`` data for each walker.  If provided, then
+        `compute_log_prob` must return `(log_prob, blobs)` for the proposals, and the
+        updated `blobs` are returned as a fourth value.
+
+    Returns
+    -------
+    coords, log_prob : array
+        New positions and log-probabilities (the inputs are not modified).
+    accepted : array of bool
+        Mask of the walkers whose proposals were accepted.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    integers = getattr(rng, "integers", None) or rng.randint
+    coords = np.array(coords, dtype=float)
+    log_prob = np.array(log_prob, dtype=float)
+    Nwalkers, Ndim = coords.shape
+    accepted = np.zeros(Nwalkers, dtype=bool)
+    if blobs is not None:
+        blobs = np.array(blobs)
+
+    inds = np.arange(Nwalkers) % nsplits
+    rng.shuffle(inds)
+    for split in range(nsplits):
+        S1 = np.flatnonzero(inds == split)
+        s = coords[S1]
+        c = np.concatenate([coords[inds == _j] for _j in range(nsplits) if _j != split])
+        Ns, Nc = len(s), len(c)
+        zz = ((a - 1.0) * rng.random(Ns) + 1) ** 2 / a
+        factors = (Ndim - 1.0) * np.log(zz)
+        c = c[integers(Nc, size=Ns)]
+        q = c - (c - s) * zz[:, None]
+        new_log_prob = compute_log_prob(q)
+        if blobs is not None:
+            new_log_prob, new_blobs = new_log_prob
+        lnpdiff = factors + new_log_prob - log_prob[S1]
+        acc = lnpdiff > np.log(rng.random(Ns))
+        coords[S1[acc]] = q[acc]
+        log_prob[S1[acc]] = new_log_prob[acc]
+        accepted[S1[acc]] = True
+        if blobs is not None:
+            blobs[S1[acc]] = new_blobs[acc]
+    if blobs is not None:
+        return coords, log_prob, accepted, blobs
+    return coords, log_prob, accepted
+
+
+class Backend:
+    """In-memory storage for the chain of an `EnsembleSampler`.
+
+    The steps are stored in preallocated arrays which :meth:`grow` extends as needed.
+    The capacity is at least doubled each time, so that many short runs (e.g. the
+    rounds between swaps in `PTSampler`) take a time linear in the total number of
+    steps.
+
+    Attributes
+    ----------
+    iteration : int
+        Number of steps stored.
+    naccepted : array of int
+        Number of accepted proposals for each walker.
+    """
+
+    initialized = False
+
+    def reset(self, Nwalkers, Ndim):
+        """Clear the chain and set the shape."""
+        self.Nwalkers, self.Ndim = Nwalkers, Ndim
+        self.iteration = 0
+        self.naccepted = np.zeros(Nwalkers, dtype=int)
+        self._chain = np.empty((0, Nwalkers, Ndim))
+        self._log_prob = np.empty((0, Nwalkers))
+        self.initialized = True
+
+    def grow(self, Nsteps):
+        """Make room for `Nsteps` more steps in the chain."""
+        Nsamples = self.iteration + Nsteps
+        if Nsamples > len(self._chain):
+            Nsamples = max(Nsamples, 2 * len(self._chain))
+            chain = np.empty((Nsamples, self.Nwalkers, self.Ndim))
+            log_prob = np.empty((Nsamples, self.Nwalkers))
+            chain[: self.iteration] = self._chain[: self.iteration]
+            log_prob[: self.iteration] = self._log_prob[: self.iteration]
+            self._chain, self._log_prob = chain, log_prob
+
+    def save_step(self, coords, log_prob, accepted):
+        """Store a step (after :meth:`grow` has made room for it)."""
+        self._chain[self.iteration] = coords
+        self._log_prob[self.iteration] = log_prob
+        self.naccepted += accepted
+        self.iteration += 1
+
+    def flush(self):
+        """Called at the end of each run."""
+
+    def get_last(self):
+        """Return `(coords, log_prob)` from the last step."""
+        if self.iteration == 0:
+            raise ValueError("No previous positions: provide initial coords.")
+        return np.array(self.get_chain()[-1]), np.array(self.get_log_prob()[-1])
+
+    def get_chain(self, discard=0, thin=1, flat=False):
+        """Return the ``(Nsteps, Nwalkers, Ndim)`` chain (see `EnsembleSampler`)."""
+        return self._get(self._chain, discard=discard, thin=thin, flat=flat)
+
+    def get_log_prob(self, discard=0, thin=1, flat=False):
+        """Return the ``(Nsteps, Nwalkers)`` log-probabilities."""
+        return self._get(self._log_prob, discard=discard, thin=thin, flat=flat)
+
+    def _get(self, data, discard, thin, flat):
+        data = data[discard + thin - 1 : self.iteration : thin]
+        if flat:
+            data = data.reshape((-1,) + data.shape[2:])
+        return data
+
+
+class MemmapBackend(Backend):
+    """On-disk storage for long chains, appended in chunks to a memory-mapped file.
+
+    The file starts with a small header of int64 values::
+
+        [MAGIC, VERSION, Nwalkers, Ndim, Nsteps, naccepted[0], ..., naccepted[-1]]
+
+    followed by `Nsteps` records of ``(Nwalkers, Ndim + 1)`` float64 values: the
+    positions of the walkers and their log-probabilities.  Steps are buffered in
+    memory and appended to the file every `chunk_size` steps (and at the end of each
+    run).  The header is only updated once the data has been written, so after a crash
+    the file is consistent up to the last complete chunk: opening it again resumes
+    from there (any partially written data is overwritten).
+
+    The chain returned by :meth:`get_chain` (and :meth:`get_log_prob`) is a view of
+    the memory-mapped file, so it is not loaded into memory (except if ``flat=True``,
+    which requires a copy).
+
+    Arguments
+    ---------
+    filename : str
+        File to store the chain.  If this exists, then the chain is resumed.
+    chunk_size : int
+        Number of steps to buffer in memory before writing to disk.
+    """
+
+    MAGIC = int.from_bytes(b"P581MCMC", "little")
+    VERSION = 1
+    _Nheader = 5
+
+    def __init__(self, filename, chunk_size=1000):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        if os.path.exists(filename):
+            self._read_header()
+
+    @property
+    def _header_bytes(self):
+        return 8 * (self._Nheader + self.Nwalkers)
+
+    @property
+    def _record_bytes(self):
+        return 8 * self.Nwalkers * (self.Ndim + 1)
+
+    def _read_header(self):
+        with open(self.filename, "rb") as f:
+            header = np.fromfile(f, dtype=np.int64, count=self._Nheader)
+            if len(header) < self._Nheader or header[0] != self.MAGIC:
+                raise ValueError(f"{self.filename} is not an MCMC chain file.")
+            if header[1] != self.VERSION:
+                raise ValueError(f"Unsupported version {header[1]} (need 1).")
+            self.Nwalkers, self.Ndim, self._Nstored = map(int, header[2:])
+            self.naccepted = np.fromfile(f, dtype=np.int64, count=self.Nwalkers)
+        self.iteration = self._Nstored
+        self._buffer = []
+        self.initialized = True
+
+    def _write_header(self, f):
+        header = [self.MAGIC, self.VERSION, self.Nwalkers, self.Ndim, self._Nstored]
+        f.seek(0)
+        f.write(np.asarray(header + list(self.naccepted), dtype=np.int64).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+    def reset(self, Nwalkers, Ndim):
+        """Clear the chain (truncating the file) and set the shape."""
+        self.Nwalkers, self.Ndim = Nwalkers, Ndim
+        self.iteration = self._Nstored = 0
+        self.naccepted = np.zeros(Nwalkers, dtype=np.int64)
+        self._buffer = []
+        with open(self.filename, "wb") as f:
+            self._write_header(f)
+        self.initialized = True
+
+    def grow(self, Nsteps):
+        """Nothing to do: the file grows as chunks are appended."""
+
+    def save_step(self, coords, log_prob, accepted):
+        """Buffer a step, writing a chunk to disk if the buffer is full."""
+        record = np.empty((self.Nwalkers, self.Ndim + 1))
+        record[:, :-1], record[:, -1] = coords, log_prob
+        self._buffer.append(record)
+        self.naccepted += accepted
+        self.iteration += 1
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered steps to the file and then update the header."""
+        if not self._buffer:
+            return
+        with open(self.filename, "r+b") as f:
+            f.seek(self._header_bytes + self._Nstored * self._record_bytes)
+            f.write(np.asarray(self._buffer).tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            self._Nstored += len(self._buffer)
+            self._write_header(f)
+        self._buffer = []
+
+    def _records(self):
+        """Return a read-only memory map of the stored steps."""
+        self.flush()
+        if self.iteration == 0:
+            return np.empty((0, self.Nwalkers, self.Ndim + 1))
+        return np.memmap(
+            self.filename,
+            dtype=float,
+            mode="r",
+            offset=self._header_bytes,
+            shape=(self.iteration, self.Nwalkers, self.Ndim + 1),
+        )
+
+    def get_last(self):
+        """Return `(coords, log_prob)` from the last step."""
+        if self._buffer:
+            record = self._buffer[-1]
+            return record[:, :-1].copy(), record[:, -1].copy()
+        return super().get_last()
+
+    def get_chain(self, discard=0, thin=1, flat=False):
+        """Return a view of the ``(Nsteps, Nwalkers, Ndim)`` chain on disk."""
+        chain = self._records()[..., :-1]
+        return self._get(chain, discard=discard, thin=thin, flat=flat)
+
+    def get_log_prob(self, discard=0, thin=1, flat=False):
+        """Return a view of the ``(Nsteps, Nwalkers)`` log-probabilities on disk."""
+        log_prob = self._records()[..., -1]
+        return self._get(log_prob, discard=discard, thin=thin, flat=flat)
+
+
+class EnsembleSampler:
+    """Affine-invariant ensemble sampler with the stretch move.
+
+    The chain is stored in a `backend`.  The default `Backend` keeps it in
+    preallocated arrays in memory which :meth:`run_mcmc` (or :meth:`sample`) grows
+    once per call by the number of requested steps.  For long runs, use a
+    `MemmapBackend` to store the chain on disk.
+
+    Arguments
+    ---------
+    Nwalkers, Ndim : int
+        Number of walkers and dimension of the parameter space.
+    log_prob_fn : function
+        Log-probability ``log_prob_fn(q, *args, **kwargs)``.  If `vectorize` is `True`,
+        then `q` is a ``(N, Ndim)`` array and this must return an array of the `N`
+        log-probabilities.  Return ``-np.inf`` for points outside of the prior.
+    args, kwargs : tuple, dict
+        Additional arguments for `log_prob_fn`.
+    a : float
+        Stretch scale parameter.
+    vectorize : bool
+        If `True`, then call `log_prob_fn` once with all proposals.
+    rng : np.random.Generator, np.random.RandomState, int, None
+        Source of random numbers, or a seed for `np.random.default_rng`.
+    backend : Backend, None
+        Storage for the chain.  If this already contains steps (e.g. a `MemmapBackend`
+        opened on an existing file), then the sampler resumes from the last of these
+        with ``run_mcmc(None, Nsteps)``.  (The state of `rng` is not stored, so the
+        resumed chain is statistically, but not bitwise, equivalent to an uninterrupted
+        one.)
+
+    Attributes
+    ----------
+    coords, log_prob : array
+        Current positions and log-probabilities of the walkers.
+    """
+
+    def __init__(
+        self,
+        Nwalkers,
+        Ndim,
+        log_prob_fn,
+        args=(),
+        kwargs=None,
+        a=2.0,
+        vectorize=False,
+        rng=None,
+        backend=None,
+    ):
+        if Nwalkers < 2 * Ndim:
+            raise ValueError(f"Need at least 2*Ndim walkers, got {Nwalkers=}.")
+        self.Nwalkers = Nwalkers
+        self.Ndim = Ndim
+        self.log_prob_fn = log_prob_fn
+        self.args = args
+        self.kwargs = {} if kwargs is None else kwargs
+        self.a = a
+        self.vectorize = vectorize
+        if not isinstance(rng, (np.random.Generator, np.random.RandomState)):
+            rng = np.random.default_rng(rng)
+        self.rng = rng
+        self.backend = Backend() if backend is None else backend
+        self.coords = self.log_prob = None
+        if not self.backend.initialized:
+            self.reset()
+        elif (self.backend.Nwalkers, self.backend.Ndim) != (Nwalkers, Ndim):
+            shape = (self.backend.Nwalkers, self.backend.Ndim)
+            raise ValueError(f"Backend has (Nwalkers, Ndim)={shape}.")
+
+    def reset(self):
+        """Clear the chain and acceptance counts."""
+        self.backend.reset(self.Nwalkers, self.Ndim)
+        self.coords = self.log_prob = None
+
+    @property
+    def iteration(self):
+        """Number of steps taken."""
+        return self.backend.iteration
+
+    @property
+    def naccepted(self):
+        """Number of accepted proposals for each walker."""
+        return self.backend.naccepted
+
+    def compute_log_prob(self, coords):
+        """Return the log-probabilities for the ``(N, Ndim)`` positions `coords`."""
+        if self.vectorize:
+            log_prob = self.log_prob_fn(coords, *self.args, **self.kwargs)
+        else:
+            log_prob = [
+                self.log_prob_fn(_q, *self.args, **self.kwargs) for _q in coords
+            ]
+        log_prob = np.asarray(log_prob, dtype=float)
+        if np.any(np.isnan(log_prob)):
+            raise ValueError("Probability function returned NaN")
+        return log_prob
+
+    def sample(self, coords=None, Nsteps=1):
+        """Generator taking `Nsteps` steps and yielding `(coords, log_prob)` after each.
+
+        Arguments
+        ---------
+        coords : array-like, None
+            Initial ``(Nwalkers, Ndim)`` positions.  If `None`, then continue from the
+            last positions (possibly those stored in the backend).
+        Nsteps : int
+            Number of steps to take.
+        """
+        if coords is not None:
+            coords = np.array(coords, dtype=float)
+            if coords.shape != (self.Nwalkers, self.Ndim):
+                raise ValueError(f"Expected coords.shape={(self.Nwalkers, self.Ndim)}.")
+            self.coords, self.log_prob = coords, self.compute_log_prob(coords)
+        elif self.coords is None:
+            self.coords, self.log_prob = self.backend.get_last()
+
+        self.backend.grow(Nsteps)
+        try:
+            for n in range(Nsteps):
+                # emcee chooses a move with ``random.choice(moves, p=weights)`` on
+                # every step, consuming one uniform deviate: do the same so that the
+                # same `RandomState` gives the same chains.
+                self.rng.random()
+                self.coords, self.log_prob, accepted = stretch_move(
+                    self.coords,
+                    self.log_prob,
+                    self.compute_log_prob,
+                    a=self.a,
+                    rng=self.rng,
+                )
+                self.backend.save_step(self.coords, self.log_prob, accepted)
+                yield self.coords, self.log_prob
+        finally:
+            self.backend.flush()
+
+    def run_mcmc(self, coords, Nsteps):
+        """Take `Nsteps` steps starting from `coords` and return the final positions.
+
+        If `coords` is `None`, then continue from the last positions.
+        """
+        for coords, log_prob in self.sample(coords, Nsteps=Nsteps):
+            pass
+        return self.coords
+
+    @property
+    def acceptance_fraction(self):
+        """Fraction of accepted proposals for each walker."""
+        return self.naccepted / max(1, self.iteration)
+
+    def get_chain(self, discard=0, thin=1, flat=False):
+        """Return the ``(Nsteps, Nwalkers, Ndim)`` chain.
+
+        Arguments
+        ---------
+        discard : int
+            Number of initial steps to discard.
+        thin : int
+            Only return every `thin` steps.
+        flat : bool
+            If `True`, then flatten the walkers into a ``(Nsamples, Ndim)`` array.
+        """
+        return self.backend.get_chain(discard=discard, thin=thin, flat=flat)
+
+    def get_log_prob(self, discard=0, thin=1, flat=False):
+        """Return the ``(Nsteps, Nwalkers)`` log-probabilities (see `get_chain`)."""
+        return self.backend.get_log_prob(discard=discard, thin=thin, flat=flat)
+
+    def get_autocorr_time(self, discard=0, thin=1, c=5):
+        """Return the integrated autocorrelation time for each dimension.
+
+        See :py:func:`phys_581_2021.autocorr.integrated_time`.  The result is in units
+        of steps (i.e. multiplied by `thin`).
+        """
+        return thin * integrated_time(self.get_chain(discard=discard, thin=thin), c=c)
+
+
+class _Rung:
+    """Ensemble of walkers at inverse temperature `beta` for `PTSampler`.
+
+    The walkers sample ``log_prior + beta*log_like``.  The chain of positions and
+    log-likelihoods (stored as the `log_prob` of the backend) is kept here, so in a
+    worker process it never has to be sent to the main process during the run.
+    """
+
+    def __init__(self, beta, coords, fns, a, seed):
+        self.beta = beta
+        (
+            self.log_like_fn,
+            self.log_prior_fn,
+            self.args,
+            self.kwargs,
+            self.vectorize,
+        ) = fns
+        self.a = a
+        self.rng = np.random.default_rng(seed)
+        self.coords = np.array(coords, dtype=float)
+        self.backend = Backend()
+        self.backend.reset(*self.coords.shape)
+        self.blobs = self._compute(self.coords)
+
+    def _compute(self, q):
+        """Return the ``(N, 2)`` blobs `[log_prior, log_like]` at the positions `q`.
+
+        The likelihood is only evaluated inside the prior.
+        """
+        if self.vectorize:
+            log_prior = self.log_prior_fn(q)
+        else:
+            log_prior = [self.log_prior_fn(_q) for _q in q]
+        log_prior = np.asarray(log_prior, dtype=float)
+        log_like = np.full(len(q), -np.inf)
+        inside = np.isfinite(log_prior)
+        if self.vectorize:
+            log_like[inside] = self.log_like_fn(q[inside], *self.args, **self.kwargs)
+        else:
+            log_like[inside] = [
+                self.log_like_fn(_q, *self.args, **self.kwargs) for _q in q[inside]
+            ]
+        if np.any(np.isnan(log_prior)) or np.any(np.isnan(log_like)):
+            raise ValueError("Probability function returned NaN")
+        return np.stack([log_prior, log_like], axis=-1)
+
+    def _log_prob(self, blobs):
+        log_prior, log_like = blobs.T
+        if self.beta == 0:
+            return log_prior
+        return log_prior + self.beta * log_like  # log_like = -inf outside the prior
+
+    def _compute_log_prob(self, q):
+        blobs = self._compute(q)
+        return self._log_prob(blobs), blobs
+
+    def grow(self, Nsteps):
+        """Make room for `Nsteps` more steps in the chain."""
+        self.backend.grow(Nsteps)
+
+    def sample(self, Nsteps, beta):
+        """Take `Nsteps` steps at `beta` and return the current log-likelihoods."""
+        self.beta = beta
+        log_prob = self._log_prob(self.blobs)
+        self.backend.grow(Nsteps)
+        for n in range(Nsteps):
+            self.coords, log_prob, accepted, self.blobs = stretch_move(
+                self.coords,
+                log_prob,
+                self._compute_log_prob,
+                a=self.a,
+                rng=self.rng,
+                blobs=self.blobs,
+            )
+            self.backend.save_step(self.coords, self.blobs[:, 1], accepted)
+        return self.blobs[:, 1]
+
+    def get(self, inds):
+        """Return the positions and blobs of the walkers `inds`."""
+        return self.coords[inds], self.blobs[inds]
+
+    def set(self, inds, coords, blobs):
+        """Replace the walkers `inds` (after a swap)."""
+        self.coords[inds], self.blobs[inds] = coords, blobs
+
+    def get_chain(self, discard, thin, flat):
+        return self.backend.get_chain(discard=discard, thin=thin, flat=flat)
+
+    def get_log_like(self, discard, thin, flat):
+        return self.backend.get_log_prob(discard=discard, thin=thin, flat=flat)
+
+    def mean_log_like(self, discard=0):
+        return self.backend.get_log_prob(discard=discard).mean()
+
+    def get_naccepted(self):
+        return self.backend.naccepted
+
+
+def _pt_worker(conn):  # pragma: no cover  (Runs in a subprocess)
+    """Worker loop for `PTSampler`: call methods of its rungs as requested."""
+    rungs = {}
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        k, method, args = msg
+        try:
+            if method == "init":
+                (rungs[k],) = args
+                res = None
+            else:
+                res = getattr(rungs[k], method)(*args)
+        except Exception as e:
+            res = e
+        conn.send(res)
+    conn.close()
+
+
+class PTSampler:
+    """Parallel-tempering ensemble sampler.
+
+    An ensemble of `Nwalkers` walkers samples ``log_prior + beta*log_like`` for each
+    inverse temperature in `betas` (with ``betas[0] = 1``) using stretch moves.  After
+    every `swap_every` steps, walkers are swapped between adjacent temperatures with
+    the usual Metropolis acceptance ``exp((beta_i - beta_j)*(log_like_j -
+    log_like_i))``, allowing the cold chain to move between separated modes.
+
+    If `n_jobs` is given, then the temperature rungs live in worker processes (rung `k`
+    in worker ``k % n_jobs``).  Each worker keeps the positions and chains of its
+    rungs: only the log-likelihoods needed for the swaps, and the positions of the
+    swapped walkers, are sent between the processes.
+
+    If `adapt` is `True`, then the temperatures ``T = 1/beta`` (except the first and
+    last) are adjusted to equalize the swap acceptance rates between all adjacent pairs
+    following Vousden, Farr, and Mandel, Mon. Not. R. Astron. Soc. 455, 1919 (2016).
+    The adjustments decay as ``adaptation_lag/(t + adaptation_lag)``.
+
+    Arguments
+    ---------
+    Nwalkers, Ndim : int
+        Number of walkers per temperature and dimension of the parameter space.
+    log_like_fn, log_prior_fn : function
+        Log-likelihood ``log_like_fn(q, *args, **kwargs)`` and log-prior
+        ``log_prior_fn(q)``.  If `vectorize`, then these take an ``(N, Ndim)`` array of
+        positions and return `N` values.  The likelihood is only evaluated where the
+        prior is finite.  Must be picklable (i.e. defined at module level) if `n_jobs`
+        is given.
+    betas : array-like, None
+        Inverse temperatures in decreasing order starting with 1.  If `None`, then
+        use `Ntemps` temperatures spaced geometrically between 1 and `Tmax`.
+    Ntemps : int
+        Number of temperatures if `betas` is not provided.
+    Tmax : float
+        Maximum temperature if `betas` is not provided.
+    args, kwargs : tuple, dict
+        Additional arguments for `log_like_fn`.
+    a, vectorize :
+        See `EnsembleSampler`.
+    swap_every : int
+        Number of steps between swaps.
+    adapt : bool
+        If `True`, then adapt the temperatures.
+    adaptation_lag, adaptation_time : float
+        Time scales for the decay and the rate of adaptation.
+    n_jobs : int, None
+        If not `None`, then run the rungs in this many processes (``-1`` means one per
+        CPU).  The results do not depend on `n_jobs`.
+    seed : int, array-like, None
+        Entropy for the `np.random.SeedSequence` from which the generators for the
+        swaps and for each rung are spawned.
+
+    Attributes
+    ----------
+    betas : array
+        Current inverse temperatures.
+    iteration : int
+        Number of steps taken.
+    nswaps : array of int
+        Number of accepted swaps between each pair of adjacent temperatures.
+    """
+
+    def __init__(
+        self,
+        Nwalkers,
+        Ndim,
+        log_like_fn,
+        log_prior_fn,
+        betas=None,
+        Ntemps=8,
+        Tmax=1e3,
+        args=(),
+        kwargs=None,
+        a=2.0,
+        vectorize=False,
+        swap_every=1,
+        adapt=True,
+        adaptation_lag=10000,
+        adaptation_time=100,
+        n_jobs=None,
+        seed=None,
+    ):
+        if Nwalkers < 2 * Ndim:
+            raise ValueError(f"Need at least 2*Ndim walkers, got {Nwalkers=}.")
+        if betas is None:
+            betas = np.geomspace(1, 1 / Tmax, Ntemps)
+        self.betas = np.array(betas, dtype=float)
+        if self.betas[0] != 1 or np.any(np.diff(self.betas) >= 0):
+            raise ValueError("betas must decrease from 1.")
+        if self.betas[-1] < 0:
+            raise ValueError("betas must be non-negative.")
+        self.Ntemps = len(self.betas)
+        self.Nwalkers = Nwalkers
+        self.Ndim = Ndim
+        kwargs = {} if kwargs is None else kwargs
+        self._fns = (log_like_fn, log_prior_fn, args, kwargs, vectorize)
+        self.a = a
+        self.swap_every = swap_every
+        self.adapt = adapt
+        self.adaptation_lag = adaptation_lag
+        self.adaptation_time = adaptation_time
+        if n_jobs is not None and n_jobs < 0:
+            n_jobs = os.cpu_count()
+        self.n_jobs = n_jobs
+        self.seed = seed
+        self._rungs = None  # Only used if n_jobs is None
+        self._workers = None
+        self._started = False
+        self.iteration = 0
+        self.nswaps = np.zeros(self.Ntemps - 1, dtype=int)
+        self.nrounds = 0
+
+    def _start(self, coords):
+        """Construct the rungs (in the workers if `n_jobs` is not `None`)."""
+        coords = np.array(coords, dtype=float)
+        if coords.shape == (self.Nwalkers, self.Ndim):
+            coords = np.broadcast_to(coords, (self.Ntemps,) + coords.shape)
+        if coords.shape != (self.Ntemps, self.Nwalkers, self.Ndim):
+            raise ValueError(
+                f"Expected coords.shape={(self.Ntemps, self.Nwalkers, self.Ndim)}."
+            )
+        seeds = np.random.SeedSequence(self.seed).spawn(self.Ntemps + 1)
+        self.rng = np.random.default_rng(seeds[0])
+        rungs = [
+            _Rung(_beta, _coords, self._fns, self.a, _seed)
+            for _beta, _coords, _seed in zip(self.betas, coords, seeds[1:])
+        ]
+        self.iteration = self.nrounds = 0
+        self.nswaps[...] = 0
+        self._started = True
+        if self.n_jobs is None:
+            self._rungs = rungs
+            return
+
+        if self._workers is None:
+            self._workers = []
+            for n in range(min(self.n_jobs, self.Ntemps)):
+                conn, child_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_pt_worker, args=(child_conn,), daemon=True
+                )
+                process.start()
+                child_conn.close()
+                self._workers.append((process, conn))
+        self._call([(_k, "init", (_rung,)) for _k, _rung in enumerate(rungs)])
+
+    def _call(self, calls):
+        """Call ``rung[k].method(*args)`` for each `(k, method, args)` in `calls`.
+
+        With workers, all the requests are sent before waiting for any of the results
+        so that the rungs in different workers run in parallel.
+        """
+        if self._workers is None:
+            return [getattr(self._rungs[_k], _m)(*_a) for _k, _m, _a in calls]
+        conns = [self._workers[_k % len(self._workers)][1] for _k, _m, _a in calls]
+        for conn, call in zip(conns, calls):
+            conn.send(call)
+        results = [_conn.recv() for _conn in conns]
+        for res in results:
+            if isinstance(res, Exception):
+                raise res
+        return results
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self._workers is not None:
+            for process, conn in self._workers:
+                conn.send(None)
+                process.join()
+                conn.close()
+        self._workers = None
+        self._rungs = None
+        self._started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _identity(self):
+        """Return the ``(Ntemps, Nwalkers, 2)`` array of indices `(k, w)`."""
+        return np.moveaxis(np.indices((self.Ntemps, self.Nwalkers)), 0, -1)
+
+    def _swap(self, log_like):
+        """Propose swaps between adjacent temperatures.
+
+        Returns
+        -------
+        origin : array
+            Indices `(k, w)` of the walker that should move to each slot.
+        fractions : array
+            Fraction of accepted swaps between each pair of adjacent temperatures.
+        """
+        log_like = np.array(log_like)
+        origin = self._identity()
+        fractions = np.zeros(self.Ntemps - 1)
+        for i in range(self.Ntemps - 1, 0, -1):
+            dbeta = self.betas[i - 1] - self.betas[i]
+            iperm = self.rng.permutation(self.Nwalkers)
+            i1perm = self.rng.permutation(self.Nwalkers)
+            raccept = np.log(self.rng.random(self.Nwalkers))
+            with np.errstate(invalid="ignore"):
+                paccept = dbeta * (log_like[i, iperm] - log_like[i - 1, i1perm])
+            asel = paccept > raccept
+            a, b = iperm[asel], i1perm[asel]
+            log_like[i, a], log_like[i - 1, b] = log_like[i - 1, b], log_like[i, a]
+            origin[i, a], origin[i - 1, b] = origin[i - 1, b], origin[i, a]
+            self.nswaps[i - 1] += asel.sum()
+            fractions[i - 1] = asel.mean()
+        return origin, fractions
+
+    def _move(self, origin):
+        """Move the walkers to the slots given by `origin` (see `_swap`).
+
+        Only the states of the walkers that moved are fetched and sent to the rungs.
+        """
+        moved = np.any(origin != self._identity(), axis=-1)
+        if not np.any(moved):
+            return
+        src_k, src_w = origin[moved].T
+        dst_k, dst_w = np.nonzero(moved)
+        ks = np.unique(src_k)
+        states = self._call([(_k, "get", (src_w[src_k == _k],)) for _k in ks])
+        coords = np.empty((len(src_k), self.Ndim))
+        blobs = np.empty((len(src_k), 2))
+        for k, (_coords, _blobs) in zip(ks, states):
+            coords[src_k == k], blobs[src_k == k] = _coords, _blobs
+        self._call(
+            [
+                (_k, "set", (dst_w[_m], coords[_m], blobs[_m]))
+                for _k in np.unique(dst_k)
+                for _m in [dst_k == _k]
+            ]
+        )
+
+    def _adapt(self, fractions):
+        """Adjust the temperatures to equalize the swap acceptance `fractions`."""
+        if self.Ntemps < 3:
+            return
+        kappa = (
+            self.adaptation_lag
+            / (self.nrounds + self.adaptation_lag)
+            / self.adaptation_time
+        )
+        dSs = kappa * (fractions[:-1] - fractions[1:])
+        deltaTs = np.diff(1 / self.betas[:-1]) * np.exp(dSs)
+        self.betas[1:-1] = 1 / (np.cumsum(deltaTs) + 1 / self.betas[0])
+
+    def sample(self, coords=None, Nsteps=1):
+        """Generator taking `Nsteps` steps and yielding after each round of swaps.
+
+        Arguments
+        ---------
+        coords : array-like, None
+            Initial ``(Ntemps, Nwalkers, Ndim)`` positions (or ``(Nwalkers, Ndim)`` to
+            use the same for all temperatures).  If `None`, then continue.
+        Nsteps : int
+            Number of steps to take.
+        """
+        if coords is not None:
+            self._start(coords)
+        elif not self._started:
+            raise ValueError("No previous positions: provide initial coords.")
+
+        # Allocate the whole run at once rather than once per round of swaps.
+        self._call([(_k, "grow", (Nsteps,)) for _k in range(self.Ntemps)])
+        Nremaining = Nsteps
+        while Nremaining > 0:
+            N = min(self.swap_every, Nremaining)
+            log_like = self._call(
+                [(_k, "sample", (N, _beta)) for _k, _beta in enumerate(self.betas)]
+            )
+            origin, fractions = self._swap(log_like)
+            self._move(origin)
+            if self.adapt:
+                self._adapt(fractions)
+            self.nrounds += 1
+            self.iteration += N
+            Nremaining -= N
+            yield self
+
+    def run_mcmc(self, coords, Nsteps):
+        """Take `Nsteps` steps starting from `coords` (or continuing if `None`)."""
+        for _ in self.sample(coords, Nsteps=Nsteps):
+            pass
+
+    @property
+    def swap_acceptance_fraction(self):
+        """Fraction of accepted swaps between each pair of adjacent temperatures."""
+        return self.nswaps / max(1, self.nrounds * self.Nwalkers)
+
+    @property
+    def acceptance_fraction(self):
+        """``(Ntemps, Nwalkers)`` fraction of accepted stretch moves."""
+        naccepted = self._call([(_k, "get_naccepted", ()) for _k in range(self.Ntemps)])
+        return np.asarray(naccepted) / max(1, self.iteration)
+
+    def get_chain(self, temp=0, discard=0, thin=1, flat=False):
+        """Return the chain at temperature index `temp` (see `EnsembleSampler`)."""
+        return self._call([(temp, "get_chain", (discard, thin, flat))])[0]
+
+    def get_log_like(self, temp=0, discard=0, thin=1, flat=False):
+        """Return the log-likelihoods at temperature index `temp`."""
+        return self._call([(temp, "get_log_like", (discard, thin, flat))])[0]
+
+    def log_evidence_estimate(self, discard=0):
+        """Return `(log_Z, dlog_Z)` from thermodynamic integration.
+
+        The evidence is ``log Z = int_0^1 <log_like>_beta dbeta`` where the averages
+        are over the chains at each temperature, after discarding `discard` steps.  If
+        the smallest `beta` is not zero, then the average at the highest temperature is
+        used for ``beta = 0``.  The error estimate `dlog_Z` is the difference from the
+        integral using only every other temperature.  The prior must be normalized, and
+        `adapt` should have been turned off (or decayed) for the steps used.
+        """
+        betas = self.betas
+        mean_log_like = np.array(
+            self._call([(_k, "mean_log_like", (discard,)) for _k in range(self.Ntemps)])
+        )
+        if betas[-1] != 0:
+            betas = np.append(betas, 0)
+            mean_log_like = np.append(mean_log_like, mean_log_like[-1])
+
+        def integrate(betas, y):
+            return -np.sum(np.diff(betas) * (y[1:] + y[:-1]) / 2)
+
+        log_Z = integrate(betas, mean_log_like)
+        inds = np.unique(np.append(np.arange(0, len(betas), 2), len(betas) - 1))
+        log_Z2 = integrate(betas[inds], mean_log_like[inds])
+        return log_Z, abs(log_Z - log_Z2)
@@ -1,8 +1,16 @@
 """Tools for plotting."""
+import collections
+import hashlib
+import multiprocessing
+import os
+
 import numpy as np
 
+import scipy.signal
 import scipy.stats
 
+import matplotlib.artist
+import matplotlib.figure
 from matplotlib import pyplot as plt
 
 import uncertainties
@@ -10,9 +18,297 @@ from uncertainties import unumpy as unp
 
 sp = scipy
 
+# Small LRU cache of the chi-square grids so that plots can be restyled cheaply.
+_DCHI2_CACHE = collections.OrderedDict()
+_DCHI2_CACHE_SIZE = 4
+
+# Number of grid points computed at a time in double precision by `dchi2_grids`.
+_DCHI2_BLOCK_SIZE = 2 ** 20
+
+# Number of (sample, pair) bin indices computed at a time by `PairHistograms`.
+_PAIR_BLOCK_SIZE = 2 ** 18
+
+
+def dchi2_grids(C, sigma_max, Nxy=(100, 101)):
+    """Return `(u, v, dchi2)`, the marginal chi-square grids for all pairs ``i > j``.
+
+    For the pair ``(i, j)`` with standard deviations `sigma_i`, `sigma_j` and
+    correlation `rho`, the marginal chi-square at the point ``(a_i + sigma_i*u, a_j +
+    sigma_j*v)`` is::
+
+        dchi2 = (u**2 - 2*rho*u*v + v**2) / (1 - rho**2)
+
+    Working in units of the standard deviations, all pairs share the 1D axes `u` and
+    `v`, so we compute the grids in one pass from the correlations.  The results are
+    cached (keyed on the contents of `C`) and shared by all callers, so they are
+    read-only: copy them before modifying.
+
+    Parameters
+    ----------
+    C : array-like
+        Covariance matrix.
+    sigma_max : float
+        Extent of the axes in units of the standard deviations.
+    Nxy : (int, int)
+        Size of the grids.
+
+    Returns
+    -------
+    u, v : array
+        Shared axes of lengths ``Nxy[0]`` and ``Nxy[1]``.
+    dchi2 : array
+        Single-precision grids of shape ``(Npairs, Nx, Ny)`` for the pairs in the order
+        of ``np.tril_indices(len(C), k=-1)``.
+    """
+    C = np.ascontiguousarray(C, dtype=float)
+    key = (hashlib.sha1(C.tobytes()).hexdigest(), C.shape, sigma_max, tuple(Nxy))
+    if key in _DCHI2_CACHE:
+        _DCHI2_CACHE.move_to_end(key)
+        return _DCHI2_CACHE[key]
+
+    sigmas = np.sqrt(np.diag(C))
+    i, j = np.tril_indices(len(C), k=-1)
+    rho = (C[i, j] / sigmas[i] / sigmas[j])[:, np.newaxis, np.newaxis]
+    u = np.linspace(-sigma_max, sigma_max, Nxy[0])
+    v = np.linspace(-sigma_max, sigma_max, Nxy[1])
+    uu_vv = u[:, np.newaxis] ** 2 + v[np.newaxis, :] ** 2
+    uv = np.outer(u, v)
+    # Single precision is plenty for contours and halves the memory for large fits.
+    # The pairs are computed in blocks to bound the double-precision temporaries.
+    dchi2 = np.empty((len(rho),) + uv.shape, dtype=np.float32)
+    block = max(1, _DCHI2_BLOCK_SIZE // uv.size)
+    for start in range(0, len(rho), block):
+        _rho = rho[start : start + block]
+        np.divide(uu_vv - 2 * _rho * uv, 1 - _rho ** 2, out=dchi2[start : start + block])
+
+    res = (u, v, dchi2)
+    for _a in res:
+        _a.flags.writeable = False
+    _DCHI2_CACHE[key] = res
+    while len(_DCHI2_CACHE) > _DCHI2_CACHE_SIZE:
+        _DCHI2_CACHE.popitem(last=False)
+    return res
+
+
+class PairHistograms:
+    """Accumulators for the 2D histograms of all pairs ``i > j`` of parameters.
+
+    The bin positions of each parameter are computed once per batch and shared by all
+    pairs, so adding `N` samples costs ``O(N)`` per pair, independent of the number of
+    samples already added.  The samples are binned in blocks of ``_PAIR_BLOCK_SIZE //
+    Npairs`` with one `np.bincount` for all pairs, so the temporary memory is bounded.
+
+    Parameters
+    ----------
+    ranges : array-like
+        Ranges ``[(min, max), ...]`` for each parameter.  Samples outside are ignored.
+    bins : int
+        Number of bins for each parameter.
+    kde : bool
+        If `True`, then each sample is linearly distributed between the four
+        neighbouring bins (linear binning), and the covariance is accumulated for the
+        kernel density estimate computed by `densities`.
+    """
+
+    def __init__(self, ranges, bins=50, kde=False):
+        self.ranges = np.asarray(ranges, dtype=float)
+        self.bins = bins
+        self.kde = kde
+        Na = len(self.ranges)
+        self.dx = (self.ranges[:, 1] - self.ranges[:, 0]) / bins
+        self.centers = [
+            _r[0] + (np.arange(bins) + 0.5) * _dx
+            for _r, _dx in zip(self.ranges, self.dx)
+        ]
+        self.pairs = np.tril_indices(Na, k=-1)
+        self.counts = np.zeros((len(self.pairs[0]), bins * bins))
+        self.N = 0
+        self.sum_x = np.zeros(Na)  # Sums in units of bins for the KDE covariance.
+        self.sum_xx = np.zeros((Na, Na))
+
+    def add(self, samples):
+        """Add the ``(N, Na)`` `samples` and return a mask of the changed pairs."""
+        x = (np.asarray(samples, dtype=float) - self.ranges[:, 0]) / self.dx
+        self.N += len(x)
+        if self.kde:
+            self.sum_x += x.sum(axis=0)
+            self.sum_xx += x.T @ x
+
+            # Linear binning: positions relative to the bin centers.
+            x -= 0.5
+
+        # Bin blocks of samples so that the (N, Npairs) indices and weights are bounded.
+        bins, Npairs = self.bins, len(self.counts)
+        counts = np.zeros((Npairs, bins + 1, bins + 1))
+        block = max(1, _PAIR_BLOCK_SIZE // Npairs)
+        for start in range(0, len(x), block):
+            counts += self._bincount(x[start : start + block]).reshape(counts.shape)
+        counts = counts[:, :bins, :bins]
+        self.counts += counts.reshape(Npairs, bins * bins)
+        return counts.any(axis=(1, 2))
+
+    def _bincount(self, x):
+        """Return the flat ``(Npairs, bins + 1, bins + 1)`` counts for the positions `x`.
+
+        The bin indices of each parameter are computed once, and those of all pairs are
+        combined into flat indices for a single `np.bincount`.  Samples outside the
+        range are counted in the extra last row or column of each pair.
+        """
+        bins = self.bins
+        i, j = self.pairs
+        offsets = np.arange(len(i)) * (bins + 1) ** 2
+        size = len(i) * (bins + 1) ** 2
+        n = np.floor(x)
+        if not self.kde:
+            n = self._index(n)
+            inds = offsets + n[:, i] * (bins + 1) + n[:, j]
+            return np.bincount(inds.ravel(), minlength=size)
+
+        f = x - n
+        ns, fs = [self._index(n), self._index(n + 1)], [1 - f, f]
+        counts = np.zeros(size)
+        for di, dj in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+            inds = offsets + ns[di][:, i] * (bins + 1) + ns[dj][:, j]
+            weights = fs[di][:, i] * fs[dj][:, j]
+            counts += np.bincount(inds.ravel(), weights=weights.ravel(), minlength=size)
+        return counts
+
+    def _index(self, n):
+        """Return the integer bin indices `n`, with ``bins`` for those out of range."""
+        return np.where((n >= 0) & (n < self.bins), n, self.bins).astype(np.intp)
+
+    def densities(self, pairs=None, bw_factor=1.0):
+        """Return the ``(Npairs, bins, bins)`` densities.
+
+        These are normalized so that they sum to the number of samples in range.  If
+        `kde`, then the counts are convolved (using the FFT) with a Gaussian kernel with
+        the covariance of the pair scaled by Scott's factor ``N**(-1/6)`` (times
+        `bw_factor`).
+
+        Parameters
+        ----------
+        pairs : array-like, None
+            Indices (or a mask) of the pairs to compute.  Default is all.
+        bw_factor : float
+            Additional factor for the KDE bandwidth.
+        """
+        inds = np.arange(len(self.counts))
+        if pairs is not None:
+            inds = inds[pairs]
+        bins = self.bins
+        densities = self.counts[inds].reshape(len(inds), bins, bins)
+        if self.kde:
+            N = self.N
+            mean = self.sum_x / N
+            C = (self.sum_xx - N * np.outer(mean, mean)) / (N - 1)
+            C *= (bw_factor * N ** (-1 / 6)) ** 2
+            densities = np.array(
+                [
+                    sp.signal.fftconvolve(
+                        density, _gaussian_kernel(C[np.ix_([_i, _j], [_i, _j])]), "same"
+                    )
+                    for density, _i, _j in zip(
+                        densities, self.pairs[0][inds], self.pairs[1][inds]
+                    )
+                ]
+            )
+        return densities
+
+
+def pair_densities(
+    samples, bins=50, ranges=None, kde=False, bw_factor=1.0, chunk_size=2 ** 16
+):
+    """Return `(centers, densities)`, the 2D densities for all pairs ``i > j``.
+
+    The histograms for all pairs are accumulated together with `PairHistograms` in a
+    single pass over the samples (in chunks of `chunk_size`, so `samples` may be a
+    memory map).  The cost is thus ``O(N)`` per pair, plus ``O(bins**2 log(bins))`` for
+    the kernel density estimate if `kde`.
+
+    Parameters
+    ----------
+    samples : array-like
+        Samples of shape ``(N, Na)``.
+    bins : int
+        Number of bins for each parameter.
+    ranges : array-like, None
+        Ranges ``[(min, max), ...]`` for each parameter.  Samples outside are ignored.
+        Default is the full range of the samples.
+    kde : bool
+        If `True`, then compute a kernel density estimate rather than histograms.
+    bw_factor : float
+        Additional factor for the KDE bandwidth.
+    chunk_size : int
+        Number of samples to process at a time.
+
+    Returns
+    -------
+    centers : [array]
+        Bin centers for each parameter.
+    densities : array
+        Densities of shape ``(Npairs, bins, bins)`` for the pairs in the order of
+        ``np.tril_indices(Na, k=-1)``.  These are normalized so that they sum to the
+        number of samples in range.
+    """
+    if ranges is None:
+        ranges = np.transpose([samples.min(axis=0), samples.max(axis=0)])
+    hists = PairHistograms(ranges, bins=bins, kde=kde)
+    for start in range(0, len(samples), chunk_size):
+        hists.add(samples[start : start + chunk_size])
+    return hists.centers, hists.densities(bw_factor=bw_factor)
+
+
+def _gaussian_kernel(C, width=4):
+    """Return a normalized Gaussian kernel with covariance `C` (in units of bins)."""
+    K = np.ceil(width * np.sqrt(np.diag(C))).astype(int)
+    x, y = np.ogrid[-K[0] : K[0] + 1, -K[1] : K[1] + 1]
+    Cinv = np.linalg.inv(C)
+    kernel = np.exp(
+        -(Cinv[0, 0] * x ** 2 + 2 * Cinv[0, 1] * x * y + Cinv[1, 1] * y ** 2) / 2
+    )
+    return kernel / kernel.sum()
+
+
+def hdr_levels(density, masses):
+    """Return the levels of the highest-density regions containing `masses`.
+
+    The region ``density >= level`` contains the fraction `mass` of the total.  The
+    levels are returned in increasing order (as needed by `contour`) for masses in
+    decreasing order.  (Repeated levels, which can occur with few samples, are
+    dropped.)
+    """
+    d = np.sort(density.ravel())[::-1]
+    cumsum = np.cumsum(d)
+    cumsum /= cumsum[-1]
+    inds = np.searchsorted(cumsum, masses)
+    return np.unique(d[np.minimum(inds, len(d) - 1)])
+
+
+def mean_cov(a, C=None):
+    """Return the mean and covariance `(a, C)` as arrays of floats.
+
+    Parameters
+    ----------
+    a : [float] or [uncertainties.ufloat]
+        Parameter values.  If these are plain numbers, they are returned directly as
+        an array (and `C` must be provided), otherwise the nominal values of the
+        `ufloat`s are extracted.
+    C : array-like, optional
+        Covariance matrix.  If not provided, then this is computed with
+        `uncertainties.covariance_matrix(a)`.
+    """
+    a_ = np.asarray(a)
+    if a_.dtype != object:
+        if C is None:
+            raise ValueError("Covariance C must be provided if `a` are not ufloats.")
+        return a_.astype(float), np.asarray(C, dtype=float)
+    if C is None:
+        C = uncertainties.covariance_matrix(a)
+    return unp.nominal_values(a_), np.asarray(C, dtype=float)
+
 
 def corner_plot(
-    a,
+    a=None,
     C=None,
     labels=None,
     levels=None,
@@ -21,9 +317,17 @@ def corner_plot(
     fig=None,
     Nxy=(100, 101),
     contour_kw=None,
+    samples=None,
+    bins=50,
+    kde=False,
+    ranges=None,
 ):  # pragma: no cover
     """Make a corner-plot of the variables `a`.
 
+    The fast path is to pass the mean `a` and covariance `C` as plain arrays (or just
+    `samples`): then no `ufloat` objects are touched.  Lists of `ufloat`s are converted
+    to these arrays by `mean_cov` first, which is slow for many parameters.
+
     Parameters
     ----------
     a : [float] or [uncertainties.ufloat]
@@ -32,6 +336,7 @@ def corner_plot(
     C : array-like, optional
         Covariance matrix.  If `a` is a list of `ufloat`s, then the correlation matrix
         will be computed with `C = uncertainties.covariance_matrix(a)` if not provided.
+        Required if `a` is an array of floats.
     labels : [str], optional
         Labels for plot.  If not provided, then if `a._fields` exists, these will be
         used, otherwise, they will be labelled `a_n`.
@@ -48,59 +353,320 @@ def corner_plot(
     contour_kw : dict, optional
         Additional arguments for :py:meth:`matplotlib.axes.Axes.contour` like
        `linestyles`, and `colors`.
+    samples : array-like, optional
+        If provided, then draw the highest-density regions containing the same
+        probabilities as `sigmas` for a Gaussian from these ``(N, Na)`` samples (e.g.
+        from MCMC) rather than the ellipses defined by `C`.  The densities are computed
+        with `pair_densities` over the range ``mean +- 1.5*max(sigmas)*std``.
+    bins : int
+        Number of bins if `samples` is provided.
+    kde : bool
+        If `True`, then use a kernel density estimate rather than histograms for
+        `samples`.
+    ranges : array-like, optional
+        Ranges ``[(min, max), ...]`` for the densities if `samples` is provided.
     """
+    if samples is not None:
+        if a is None:
+            a = np.mean(samples, axis=0)
+        if C is None:
+            C = np.cov(samples, rowvar=False)
     Na = len(a)
-    if C is None:
-        C = np.asarray(uncertainties.covariance_matrix(a))
     if labels is None:
         labels = getattr(a, "_fields", [f"$a_{_n}$" for _n in range(Na)])
 
-    a = unp.nominal_values(a)
+    a, C = mean_cov(a, C)
 
     sigmas = np.asarray(sigmas)
     sigma_max = 1.5 * max(sigmas)
     if levels is None:
         q = sp.stats.norm.cdf(sigmas) - sp.stats.norm.cdf(-sigmas)
         levels = sp.stats.chi2.ppf(q, df=2)
-    axs = axes
-    if axs is None:
-        if fig is None:
-            fig = plt.figure(figsize=(10, 10))
-        axs = fig.subplots(
-            Na,
-            Na,
-            sharex="col",
-            sharey="row",
-            gridspec_kw=dict(hspace=0, wspace=0),
-        )
-
     if contour_kw is None:
         contour_kw = {}
 
-    for i, ai in enumerate(a):
-        for j, aj in enumerate(a):
-            if i <= j:
-                if axes is None:  # Only toggle visibility if we generated axes
-                    axs[i, j].set(visible=False)
-                continue
-            ax = axs[i, j]
-            inds = np.array([[i, j]])
-            C2 = C[inds.T, inds]
-            sigma_i, sigma_j = np.sqrt([C[i, i], C[j, j]])
-            dai = np.linspace(-sigma_max * sigma_i, sigma_max * sigma_i, Nxy[0])
-            daj = np.linspace(-sigma_max * sigma_j, sigma_max * sigma_j, Nxy[1])
-            das = np.meshgrid(dai, daj, indexing="ij", sparse=False)
-            dchi2 = np.einsum("xij,yij,xy->ij", das, das, np.linalg.inv(C2))
-            ax.contour(
-                a[j] + daj,
-                a[i] + dai,
-                dchi2,
-                levels=levels,
-                **contour_kw,
+    fig, axs = _corner_axes(Na, fig=fig, axes=axes)
+    if samples is None:
+        grids = _gaussian_grids(a, C, levels, sigma_max=sigma_max, Nxy=Nxy)
+    else:
+        grids = _sample_grids(
+            a, C, samples, sigmas, sigma_max=sigma_max, bins=bins, kde=kde, ranges=ranges
+        )
+
+    for i, j, grid in zip(*np.tril_indices(Na, k=-1), grids):
+        # Only label the outer panels.
+        xlabel = labels[j] if i == Na - 1 else None
+        ylabel = labels[i] if j == 0 else None
+        _draw_panel(axs[i, j], *grid, xlabel, ylabel, contour_kw=contour_kw)
+    return fig, axs
+
+
+def _corner_axes(Na, fig, axes):  # pragma: no cover
+    """Return `(fig, axs)` for an ``(Na, Na)`` corner plot.
+
+    If `axes` is `None`, then these are generated (hiding the upper triangle) in `fig`,
+    or in a new figure.
+    """
+    if axes is not None:
+        return fig, axes
+    if fig is None:
+        fig = plt.figure(figsize=(10, 10))
+    axs = fig.subplots(
+        Na,
+        Na,
+        sharex="col",
+        sharey="row",
+        gridspec_kw=dict(hspace=0, wspace=0),
+    )
+    for i, j in zip(*np.triu_indices(Na)):
+        axs[i, j].set(visible=False)
+    return fig, axs
+
+
+def _gaussian_grids(a, C, levels, sigma_max, Nxy):
+    """Return the ``(x, y, dchi2, levels)`` contour data for each pair ``i > j``.
+
+    These are the chi-square grids for a Gaussian with mean `a` and covariance `C`.
+    """
+    stds = np.sqrt(np.diag(C))
+    u, v, dchi2s = dchi2_grids(C, sigma_max=sigma_max, Nxy=Nxy)
+    return [
+        (a[j] + stds[j] * v, a[i] + stds[i] * u, dchi2, levels)
+        for i, j, dchi2 in zip(*np.tril_indices(len(a), k=-1), dchi2s)
+    ]
+
+
+def _sample_grids(a, C, samples, sigmas, sigma_max, bins, kde, ranges):
+    """Return the ``(x, y, density, levels)`` contour data for each pair ``i > j``.
+
+    The densities are computed from the `samples` with `pair_densities`, and the
+    `levels` enclose the same probabilities as `sigmas` for a Gaussian.
+    """
+    if ranges is None:
+        stds = np.sqrt(np.diag(C))
+        ranges = np.transpose([a - sigma_max * stds, a + sigma_max * stds])
+    centers, densities = pair_densities(samples, bins=bins, ranges=ranges, kde=kde)
+    masses = sp.stats.norm.cdf(sigmas) - sp.stats.norm.cdf(-sigmas)
+    masses = np.sort(masses)[::-1]
+    return [
+        (centers[j], centers[i], density, hdr_levels(density, masses))
+        for i, j, density in zip(*np.tril_indices(len(a), k=-1), densities)
+    ]
+
+
+def _draw_panel(ax, x, y, z, levels, xlabel, ylabel, contour_kw):  # pragma: no cover
+    """Draw the contours `levels` of `z` on the grid `(x, y)` in the panel `ax`.
+
+    The axes are labelled with `xlabel` and `ylabel` unless these are `None`.
+    """
+    ax.contour(x, y, z, levels=levels, **contour_kw)
+    if ylabel is not None:
+        ax.set(ylabel=f"{ylabel}")
+    if xlabel is not None:
+        ax.set(xlabel=f"{xlabel}")
+
+
+class LiveCornerPlot:
+    """Corner plot of samples that can be updated while a sampler runs.
+
+    The figure is set up with `corner_plot` from an initial batch of samples, then
+    the histograms of all pairs are accumulated in a `PairHistograms` instance as new
+    batches are passed to :meth:`update`.  Only the contours of the pairs that changed
+    are recomputed, and these are drawn with blitting over a cached background, so the
+    cost of an update is independent of the total number of samples seen.
+
+    Parameters
+    ----------
+    samples : array-like
+        Initial ``(N, Na)`` batch of samples.  This determines the (fixed) `ranges` if
+        they are not provided.
+    labels, sigmas, bins, kde, fig, axes, contour_kw, ranges :
+        See `corner_plot`.
+    """
+
+    def __init__(
+        self,
+        samples,
+        labels=None,
+        sigmas=(1, 2, 3, 4),
+        bins=50,
+        kde=False,
+        ranges=None,
+        fig=None,
+        axes=None,
+        contour_kw=None,
+    ):  # pragma: no cover
+        samples = np.asarray(samples)
+        sigmas = np.asarray(sigmas)
+        if ranges is None:
+            a, stds = samples.mean(axis=0), samples.std(axis=0)
+            sigma_max = 1.5 * max(sigmas)
+            ranges = np.transpose([a - sigma_max * stds, a + sigma_max * stds])
+        if contour_kw is None:
+            contour_kw = {}
+        self.contour_kw = dict(contour_kw, animated=True)
+        masses = sp.stats.norm.cdf(sigmas) - sp.stats.norm.cdf(-sigmas)
+        self.masses = np.sort(masses)[::-1]
+
+        self.hists = PairHistograms(ranges, bins=bins, kde=kde)
+        self.hists.add(samples)
+
+        self.fig, self.axs = corner_plot(
+            labels=labels,
+            sigmas=sigmas,
+            fig=fig,
+            axes=axes,
+            contour_kw=self.contour_kw,
+            samples=samples,
+            bins=bins,
+            kde=kde,
+            ranges=ranges,
+        )
+        if self.fig is None:
+            self.fig = self.axs.flat[0].figure
+
+        # Fix the limits so the background does not change.
+        self.contours = []
+        for i, j in zip(*self.hists.pairs):
+            ax = self.axs[i, j]
+            ax.set(xlim=ranges[j], ylim=ranges[i], autoscale_on=False)
+            self.contours.append(list(ax.collections))
+
+        self.background = None
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+        self.fig.canvas.draw()
+
+    def _on_draw(self, event):  # pragma: no cover
+        """Cache the background (without the animated contours) and blit these."""
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_contours()
+
+    def _draw_contours(self):  # pragma: no cover
+        for p, artists in enumerate(self.contours):
+            ax = self.axs[self.hists.pairs[0][p], self.hists.pairs[1][p]]
+            for artist in artists:
+                ax.draw_artist(artist)
+
+    def update(self, samples):  # pragma: no cover
+        """Add the ``(N, Na)`` `samples` and redraw the changed contours."""
+        changed = self.hists.add(samples)
+        densities = self.hists.densities(pairs=changed)
+        centers = self.hists.centers
+        for p, density in zip(np.flatnonzero(changed), densities):
+            i, j = self.hists.pairs[0][p], self.hists.pairs[1][p]
+            for artist in self.contours[p]:
+                artist.remove()
+            cs = self.axs[i, j].contour(
+                centers[j],
+                centers[i],
+                density,
+                levels=hdr_levels(density, self.masses),
+                **self.contour_kw,
             )
+            self.contours[p] = _contour_artists(cs)
+
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        self._draw_contours()
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+        return changed
+
+
+def _contour_artists(cs):  # pragma: no cover
+    """Return the list of artists for the ContourSet `cs`.
+
+    Before Matplotlib 3.8, a ContourSet was not an artist, but a list of collections.
+    """
+    if isinstance(cs, matplotlib.artist.Artist):
+        return [cs]
+    return list(cs.collections)
+
+
+# Batch rendering: each worker keeps one figure per layout in `_FIGURES` and clears
+# and reuses its axes between jobs.  Figures are created directly (not through pyplot)
+# so they are never registered with the pyplot figure manager.
+_FIGURES = {}
+
+
+def _init_render_worker():  # pragma: no cover
+    plt.switch_backend("Agg")
 
-            if j == 0:
-                ax.set(ylabel=f"{labels[i]}")
-            if i == len(a) - 1:
-                ax.set(xlabel=f"{labels[j]}")
+
+def _corner_figure(Na, figsize):
+    """Return `(fig, axs)` for an `Na` corner plot, reusing the cached layout."""
+    key = (Na, tuple(figsize))
+    if key not in _FIGURES:
+        fig = matplotlib.figure.Figure(figsize=figsize)
+        axs = fig.subplots(
+            Na, Na, sharex="col", sharey="row", gridspec_kw=dict(hspace=0, wspace=0)
+        )
+        for i, j in zip(*np.triu_indices(Na)):
+            axs[i, j].set(visible=False)
+        _FIGURES[key] = (fig, axs)
+    fig, axs = _FIGURES[key]
+    for i, j in zip(*np.tril_indices(Na, k=-1)):
+        axs[i, j].cla()
     return fig, axs
+
+
+def _render_corner_plot(job):
+    """Render a single job (see `render_corner_plots`) and return the filename."""
+    job = dict(job)
+    filename = job.pop("filename")
+    figsize = job.pop("figsize", (10, 10))
+    savefig_kw = job.pop("savefig_kw", {})
+    if job.get("samples", None) is not None:
+        Na = np.shape(job["samples"])[1]
+    else:
+        Na = len(job["a"])
+    fig, axs = _corner_figure(Na, figsize)
+    corner_plot(axes=axs, fig=fig, **job)
+    for i, j in zip(*np.tril_indices(Na, k=-1)):
+        axs[i, j].label_outer()
+    fig.savefig(filename, **savefig_kw)
+    return filename
+
+
+def render_corner_plots(jobs, n_jobs=None, maxtasksperchild=100, chunksize=1):
+    """Render many corner plots to files, optionally in a process pool.
+
+    Returns an iterator over the filenames in the order of `jobs`, yielding each one
+    once its file has been written.  Jobs are sent to the workers lazily, so `jobs` can
+    be a generator.
+
+    Parameters
+    ----------
+    jobs : iterable of dict
+        Each job is a dictionary of keyword arguments for `corner_plot` (e.g. `a` and
+        `C`, or `samples`, `labels`, ...) with the additional keys:
+
+        filename : str
+            Output file.  The format (PNG, PDF, ...) is deduced from the extension.
+        figsize : (float, float), optional
+            Figure size.  Jobs with the same number of parameters and `figsize` reuse
+            the same figure and axes within a worker.
+        savefig_kw : dict, optional
+            Additional arguments for `Figure.savefig` like `dpi`.
+
+        All values must be picklable if `n_jobs` is not `None`.  Pass plain arrays for
+        the mean and covariance rather than `ufloat`s (see `mean_cov`).
+    n_jobs : int, None
+        If not `None`, then render in a pool with this many processes (``-1`` means one
+        per CPU), each using the Agg backend.
+    maxtasksperchild : int, None
+        Number of jobs after which each worker is replaced with a fresh process.  This
+        bounds the memory used by each worker (e.g. Matplotlib caches).
+    chunksize : int
+        Number of jobs sent to a worker at once.
+    """
+    if n_jobs is None:
+        yield from map(_render_corner_plot, jobs)
+        return
+
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    with multiprocessing.Pool(
+        n_jobs, initializer=_init_render_worker, maxtasksperchild=maxtasksperchild
+    ) as pool:
+        yield from pool.imap(_render_corner_plot, jobs, chunksize=chunksize)
@@ -4,6 +4,8 @@
 import gc  # Garbage collection
 import os
 import psutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
@@ -103,3 +105,233 @@ class TestEuler:
 
         res = assignment_2.solve_ivp_euler(fun, t_span=(t0, T), y0=y0, Nt=Nt)
         assert np.allclose(res.y, get_y_exact(res.t, y0=y0), rtol=1e-3)
+
+
+class TestABMAdaptive:
+    """Tests for the variable-step, variable-order abm solver."""
+
+    @pytest.mark.parametrize("rtol", [1e-4, 1e-8])
+    def test_accuracy(self, rtol):
+        """Check that the error is controlled by the tolerances."""
+        y0 = [1.0]
+        res = assignment_2.solve_ivp_abm_adaptive(
+            fun, t_span=(0.0, 5.0), y0=y0, rtol=rtol, atol=rtol * 1e-3
+        )
+        assert res.success
+        assert res.t[-1] == 5.0
+        assert np.allclose(res.y, get_y_exact(res.t, y0=y0), rtol=0, atol=10 * rtol)
+
+    def test_adaptivity(self):
+        """Smooth problems should use high orders and few steps."""
+        y0 = [1.0]
+        res = assignment_2.solve_ivp_abm_adaptive(
+            fun, t_span=(0.0, 5.0), y0=y0, rtol=1e-8, atol=1e-11, max_order=5
+        )
+        assert res.order.max() == 5
+        assert len(res.t) < 300
+        assert res.nfev < 2.5 * len(res.t)
+
+        # Steps should grow from the small starting step.
+        dts = np.diff(res.t)
+        assert dts.max() > 100 * dts.min()
+
+    def test_continue(self):
+        """Test continuing and backwards integration."""
+        y0 = [1.0]
+        res = assignment_2.solve_ivp_abm_adaptive(fun, t_span=(0.0, 2.0), y0=y0)
+        res = assignment_2.solve_ivp_abm_adaptive(
+            fun, t_span=(2.0, 4.0), y0=None, nordsieck=res.nordsieck
+        )
+        assert res.t[0] == 2.0
+        assert np.allclose(res.y, get_y_exact(res.t, y0=y0), rtol=0, atol=1e-5)
+
+        res = assignment_2.solve_ivp_abm_adaptive(
+            fun, t_span=(0.0, -3.0), y0=y0, first_step=0.01, max_step=0.1
+        )
+        assert np.diff(res.t).min() >= -0.1 - 1e-12
+        assert np.allclose(res.y, get_y_exact(res.t, y0=y0), rtol=0, atol=1e-5)
+
+
+class TestDtype:
+    """Tests of the reduced-precision working `dtype`."""
+
+    solvers = [
+        (assignment_2.solve_ivp_euler, dict(Nt=100)),
+        (assignment_2.solve_ivp_rk4, dict(Nt=100)),
+        (assignment_2.solve_ivp_abm, dict(Nt=100)),
+        (assignment_2.solve_ivp_abm_adaptive, dict(rtol=1e-5, atol=1e-7)),
+    ]
+
+    @pytest.mark.parametrize("solver, kw", solvers)
+    def test_accuracy(self, solver, kw):
+        """Single precision should agree with double precision to ~float32 eps."""
+        y0 = [1.0, 2.0]
+        res64 = solver(fun, t_span=(0.0, 1.0), y0=y0, **kw)
+        res32 = solver(fun, t_span=(0.0, 1.0), y0=y0, dtype=np.float32, **kw)
+        assert res32.y.dtype == np.float32
+        assert res32.t.dtype == np.float64
+        assert res32.t[-1] == res64.t[-1]
+        assert np.allclose(res32.y[:, -1], res64.y[:, -1], rtol=1e-5, atol=0)
+
+        res32 = solver(fun, t_span=(0.0, 1.0), y0=[1.0 + 1j], dtype=np.float32, **kw)
+        assert res32.y.dtype == np.complex64
+        assert np.allclose(res32.y[0, -1], res64.y[0, -1] * (1 + 1j), rtol=1e-5, atol=0)
+
+    @pytest.mark.bench
+    @pytest.mark.parametrize(
+        "solver, kw",
+        [
+            (assignment_2.solve_ivp_euler, dict(Nt=10)),
+            (assignment_2.solve_ivp_abm, dict(Nt=20, save_memory=True)),
+        ],
+    )
+    def test_speed(self, solver, kw):
+        """Single precision should be faster for large (bandwidth bound) states."""
+        y0 = np.ones(2 ** 22)
+        times = {}
+        for dtype in [np.float64, np.float32]:
+            tic = time.perf_counter()
+            solver(fun, t_span=(0.0, 1.0), y0=y0, dtype=dtype, **kw)
+            times[dtype] = time.perf_counter() - tic
+        assert times[np.float32] < times[np.float64]
+
+
+class TestEvents:
+    """Tests of event detection."""
+
+    solvers = [
+        (assignment_2.solve_ivp_euler, dict(Nt=400)),
+        (assignment_2.solve_ivp_rk4, dict(Nt=400)),
+        (assignment_2.solve_ivp_abm, dict(Nt=400)),
+        (assignment_2.solve_ivp_abm_adaptive, dict(rtol=1e-8, atol=1e-10)),
+    ]
+
+    @staticmethod
+    def osc(t, y):
+        """Harmonic oscillator."""
+        x, dx = y
+        return (dx, -x)
+
+    @pytest.mark.parametrize("solver, kw", solvers)
+    def test_terminal(self, solver, kw):
+        """Stop when the gaussian reaches y = 0.5."""
+
+        def half(t, y):
+            return y[0] - 0.5
+
+        half.terminal = True
+        y0 = [1.0]
+        res = solver(fun, t_span=(0.0, 3.0), y0=y0, events=half, **kw)
+        t_half = np.sqrt(2 * np.log(2))
+        assert res.status == 1
+        assert np.allclose(res.t[-1], t_half, rtol=0.01)
+        assert np.allclose(res.y[0, -1], 0.5)
+        assert np.allclose(res.t_events[0], [res.t[-1]])
+        assert np.allclose(res.y_events[0], [res.y[:, -1]])
+
+    @pytest.mark.parametrize("solver, kw", solvers)
+    def test_direction(self, solver, kw):
+        """Multiple non-terminal events with a direction."""
+
+        def down(t, y):
+            return y[0]
+
+        down.direction = -1
+
+        def turn(t, y):
+            return y[1]
+
+        if "Nt" in kw:
+            # Need more steps for the low-order fixed-step methods.
+            kw = dict(kw, Nt=10 * kw["Nt"])
+        y0 = [1.0, 0.0]
+        res = solver(self.osc, t_span=(0.0, 20.0), y0=y0, events=[down, turn], **kw)
+        assert res.status == 0
+        assert np.allclose(res.t[-1], 20.0)
+        t_down = np.array([1, 5, 9]) * np.pi / 2
+        assert np.allclose(res.t_events[0], t_down, rtol=1e-3)
+        assert np.allclose(res.t_events[1], np.pi * np.arange(1, 7), rtol=1e-3)
+        assert np.allclose(res.y_events[0][:, 0], 0, atol=1e-8)
+
+    def test_abm_start(self):
+        """Events during the start of the fixed-step ABM integration."""
+
+        def event(t, y):
+            return t - 0.01
+
+        event.terminal = True
+        res = assignment_2.solve_ivp_abm(
+            fun, t_span=(0.0, 1.0), y0=[1.0], Nt=50, events=event
+        )
+        assert res.status == 1
+        assert np.allclose(res.t, [0, 0.01])
+
+    def test_abm_adaptive_continue(self):
+        """Continue after a terminal event."""
+
+        def event(t, y):
+            return y[0] - 0.5
+
+        event.terminal = True
+        y0 = [1.0]
+        res = assignment_2.solve_ivp_abm_adaptive(
+            fun, t_span=(0.0, 3.0), y0=y0, events=event
+        )
+        res = assignment_2.solve_ivp_abm_adaptive(
+            fun, t_span=(res.t[-1], 3.0), y0=None, nordsieck=res.nordsieck
+        )
+        assert np.allclose(res.y, get_y_exact(res.t, y0=y0), rtol=0, atol=1e-5)
+
+
+class TestExecutor:
+    """Tests of the thread-parallel chunked evaluation."""
+
+    solvers = [
+        (assignment_2.solve_ivp_euler, dict(Nt=20)),
+        (assignment_2.solve_ivp_rk4, dict(Nt=20)),
+        (assignment_2.solve_ivp_abm, dict(Nt=20)),
+    ]
+
+    @pytest.mark.parametrize("solver, kw", solvers)
+    def test_chunks(self, solver, kw):
+        """Chunked evaluation should give identical results."""
+        y0 = np.linspace(0, 1, 1001)
+        res0 = solver(fun, t_span=(0.0, 1.0), y0=y0, **kw)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            res1 = solver(fun, t_span=(0.0, 1.0), y0=y0, executor=executor, **kw)
+            res2 = solver(
+                fun, t_span=(0.0, 1.0), y0=y0, executor=executor, chunks=7, **kw
+            )
+        assert np.array_equal(res0.y, res1.y)
+        assert np.array_equal(res0.y, res2.y)
+
+    def test_errors(self):
+        """Exceptions in the workers should propagate."""
+
+        def bad_fun(t, y):
+            raise ValueError("bad")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with pytest.raises(ValueError):
+                assignment_2.solve_ivp_euler(
+                    bad_fun, t_span=(0.0, 1.0), y0=np.ones(10), Nt=2, executor=executor
+                )
+
+    @pytest.mark.bench
+    @pytest.mark.skipif(os.cpu_count() < 2, reason="Needs multiple cores.")
+    def test_speed(self):
+        """Threads should speed up large states."""
+        y0 = np.ones(2 ** 23)
+
+        def heavy_fun(t, y):
+            return -t * np.sin(y) * np.exp(-(y ** 2))
+
+        kw = dict(t_span=(0.0, 1.0), y0=y0, Nt=4)
+        tic = time.perf_counter()
+        assignment_2.solve_ivp_euler(heavy_fun, **kw)
+        t_serial = time.perf_counter() - tic
+        with ThreadPoolExecutor() as executor:
+            tic = time.perf_counter()
+            assignment_2.solve_ivp_euler(heavy_fun, executor=executor, **kw)
+            t_threads = time.perf_counter() - tic
+        assert t_threads < t_serial
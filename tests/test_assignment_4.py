@@ -9,6 +9,8 @@ import numpy as np
 
 import pytest
 
+from scipy.integrate import solve_ivp
+
 from phys_581_2021 import assignment_4
 
 
@@ -49,6 +51,15 @@ class TestLyapunov:
         x, y, z = q
         return (sigma * (y - x), x * (rho - z) - y, x * y - beta * z)
 
+    @staticmethod
+    def jac(t, q):
+        sigma = 10.0
+        beta = 8.0 / 3
+        rho = 28.0
+
+        x, y, z = q
+        return np.array([[-sigma, sigma, 0], [rho - z, -1, -x], [y, x, -beta]])
+
     def test_min_norm(cls):
         """Check that dy's are normalized properly."""
         lams, ts, ys, dys = assignment_4.compute_lyapunov(**cls.args)
@@ -57,6 +68,24 @@ class TestLyapunov:
         norms = [np.linalg.norm(_dy[:, 0]) for _dy in dys]
         assert np.allclose(norms, cls.min_norm)
 
+    def test_t0(cls):
+        """The initial time is respected (needed for non-autonomous systems)."""
+        args = dict(cls.args, t0=5.0, Nsamples=2)
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(**args)
+        assert np.allclose([ts[0][0], ts[1][0]], [5.0, 15.0])
+
+    def test_burn(cls):
+        """A random `dy0` is aligned before sampling."""
+        args = dict(cls.args, Nsamples=2, dt=1.0)
+        args.pop("dy0")
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(**args)
+        assert len(lams) == 2
+        assert np.allclose(ts[0][0], 5.0)
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(
+            **args, chain_args=dict(Nburn=1)
+        )
+        assert np.allclose(ts[0][0], 1.0)
+
     def test_lorenz(cls):
         """Check that the code correctly calculates the exponent."""
         args = dict(cls.args)
@@ -72,10 +101,479 @@ class TestLyapunov:
         assert np.allclose(lam0, 0.872, atol=max(2 * dlam0, 0.005))
         assert dlam0 < 0.1
 
-    def test_coverage(cls):
-        """"Coverage test for NotImplementedError exceptions.
+    @pytest.mark.parametrize("use_jac", [True, False])
+    def test_tangent(cls, use_jac):
+        """Check the tangent-space (variational equation) mode."""
+        args = dict(cls.args, mode="tangent", jac=cls.jac if use_jac else None)
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(**args)
+        norms = [np.linalg.norm(_dy[:, 0]) for _dy in dys]
+        assert np.allclose(norms, cls.min_norm)
+
+        args.pop("debug")
+        args.pop("min_norm")  # Not needed in tangent mode
+        lams = np.array(assignment_4.compute_lyapunov(**args))
+        lam0 = lams.mean()
+        dlam0 = lams.std() / np.sqrt(len(lams))  # Error in the mean
+        assert np.allclose(lam0, 0.872, atol=max(2 * dlam0, 0.005))
+        assert dlam0 < 0.1
+
+    @pytest.mark.parametrize("mode", ["continuous", "continuous-tangent"])
+    def test_continuous(cls, mode):
+        """Check the continuous modes with a single integrator."""
+        args = dict(cls.args, mode=mode)
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(**args)
+        norms = [np.linalg.norm(_dy[:, 0]) for _dy in dys]
+        assert np.allclose(norms, cls.min_norm)
+
+        # Segments should join up continuously.
+        for t0, t1, y0, y1 in zip(ts[:-1], ts[1:], ys[:-1], ys[1:]):
+            assert t0[-1] == t1[0]
+            assert np.allclose(y0[:, -1], y1[:, 0])
+
+        # The loose default tolerances bias the exponent low, so we tighten them here
+        # and compare with the accepted value.
+        args.pop("debug")
+        args.update(Nsamples=40, solve_ivp_args=dict(atol=1e-6, rtol=1e-6))
+        lams = np.array(assignment_4.compute_lyapunov(**args))
+        lam0 = lams.mean()
+        dlam0 = lams.std() / np.sqrt(len(lams))  # Error in the mean
+        assert np.allclose(lam0, 0.9056, atol=max(2 * dlam0, 0.005))
+        assert dlam0 < 0.1
+
+        with pytest.raises(ValueError, match="continuous modes require"):
+            args["solve_ivp_args"] = dict(args["solve_ivp_args"], method="LSODA")
+            next(iter(assignment_4.compute_lyapunov(**args)))
+
+    @pytest.mark.parametrize(
+        "mode, continuous", [("pair", "continuous"), ("tangent", "continuous-tangent")]
+    )
+    def test_continuous_linear(cls, mode, continuous):
+        """Compare the continuous and restart modes for a linear spiral with exponent
+        0.5 along every direction in the plane."""
+        A = np.array([[0.5, 1.0, 0.0], [-1.0, 0.5, 0.0], [0.0, 0.0, -1.0]])
+        args = dict(
+            y0=(1.0, 0.0, 0.0),
+            dy0=(0.0, 1.0, 0.0),
+            dt=2.0,
+            min_norm=1e-6,
+            Nsamples=5,
+            solve_ivp_args=dict(rtol=1e-10, atol=1e-12),
+        )
+        lams = assignment_4.compute_lyapunov(lambda t, y: A @ y, mode=mode, **args)
+        lams_ = assignment_4.compute_lyapunov(
+            lambda t, y: A @ y, mode=continuous, **args
+        )
+        assert np.allclose(lams, 0.5, atol=1e-6)
+        assert np.allclose(lams_, lams, atol=1e-6)
+
+    def test_chains(cls):
+        """Check that chains are reproducible independent of the pool size."""
+        chain_args = dict(Nchains=4, seed=2)
+        args = dict(cls.args, Nsamples=12, chain_args=chain_args)
+        args.pop("debug")
+        lams = assignment_4.compute_lyapunov(**args)
+        assert len(lams) == 12
+        assert np.array_equal(
+            lams,
+            assignment_4.compute_lyapunov(
+                **dict(args, chain_args=dict(chain_args, n_jobs=2))
+            ),
+        )
+        assert not np.array_equal(
+            lams,
+            assignment_4.compute_lyapunov(
+                **dict(args, chain_args=dict(chain_args, seed=3))
+            ),
+        )
+
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(
+            **dict(args, chain_args=dict(chain_args, Nburn=0, n_jobs=-1)), debug=True
+        )
+        assert len(lams) == len(ts) == len(ys) == len(dys) == 12
+
+        # Each chain starts from a macroscopically different initial state.
+        y0 = cls.args["y0"]
+        y0s = np.array([ys[_n][:, 0] for _n in [0, 3, 6, 9]])
+        assert np.allclose(np.linalg.norm(y0s - y0, axis=-1), 0.1 * np.linalg.norm(y0))
+        for n, m in zip(*np.triu_indices(4, k=1)):
+            assert np.linalg.norm(y0s[n] - y0s[m]) > 0.01 * np.linalg.norm(y0)
+
+        # The chains are independent: their samples should not agree.
+        lams = np.reshape(assignment_4.compute_lyapunov(**args), (4, 3))
+        for n, m in zip(*np.triu_indices(4, k=1)):
+            assert np.all(abs(lams[n] - lams[m]) > 1e-3)
+
+        args.update(
+            Nsamples=40,
+            solve_ivp_args=dict(atol=1e-6, rtol=1e-6),
+            chain_args=dict(chain_args, n_jobs=-1),
+        )
+        lams = np.array(assignment_4.compute_lyapunov(**args))
+        lam0 = lams.mean()
+        dlam0 = lams.std() / np.sqrt(len(lams))  # Error in the mean
+        assert np.allclose(lam0, 0.9056, atol=max(2 * dlam0, 0.005))
+
+    @pytest.mark.parametrize("tangent", [True, False])
+    def test_auto(cls, tangent):
+        """Check automatic `dt` and `min_norm` with sequential stopping."""
+        tol = 0.02
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(
+            cls.compute_dy_dt,
+            y0=(1.0, 1.0, 1.0),
+            tol=tol,
+            debug=True,
+            mode="tangent" if tangent else "pair",
+            rng=np.random.default_rng(1),
+            solve_ivp_args=dict(atol=1e-6, rtol=1e-6),
+        )
+        lams = np.array(lams)
+        assert 10 <= len(lams) < 10000
+        dlam0 = lams.std(ddof=1) / np.sqrt(len(lams))
+        assert dlam0 < tol
+        assert np.allclose(lams.mean(), 0.9056, atol=max(2 * dlam0, 0.005))
+
+        # The separation should stay well away from saturation.
+        dt = np.diff(ts[0][[0, -1]])[0]
+        assert 0 < dt < 100
+        if not tangent:
+            growth = np.linalg.norm(dys[0][:, -1]) / np.linalg.norm(dys[0][:, 0])
+            assert growth < np.linalg.norm(ys[0][:, 0]) / np.linalg.norm(dys[0][:, 0])
+
+    def test_auto_nonchaotic(cls):
+        """A harmonic oscillator has zero exponent: we should fall back to 10*tau."""
+        lams = assignment_4.compute_lyapunov(
+            lambda t, y: (y[1], -y[0]),
+            y0=(1.0, 0.0),
+            Nsamples=20,
+            solve_ivp_args=dict(atol=1e-10, rtol=1e-10),
+        )
+        assert len(lams) == 20
+        assert abs(np.mean(lams)) < 0.05
+
+    def test_debug_every(cls):
+        args = dict(cls.args, debug_args=dict(every=3))
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(**args)
+        assert len(lams) == 10
+        assert len(ts) == len(ys) == len(dys) == 4
+
+    @pytest.mark.parametrize("Nchains", [1, 2])
+    def test_debug_file(cls, Nchains, tmp_path):
+        filename = tmp_path / "debug.npy"
+        stats = assignment_4.RunningStats()
+        args = dict(
+            cls.args,
+            debug_args=dict(every=2, file=filename),
+            stats=stats,
+            chain_args=dict(Nchains=Nchains),
+        )
+        lams, records = assignment_4.compute_lyapunov(**args)
+        assert stats.n == len(lams) == 10
+        assert np.allclose(stats.mean, np.mean(lams))
+        assert records.shape == (10,)
+
+        # Only every other sample in each chain is written.
+        kept = ~np.isnan(records["lam"])
+        assert kept.sum() == (6 if Nchains == 2 else 5)
+        assert np.allclose(records["lam"][kept], np.array(lams)[kept])
+        assert np.allclose(
+            np.linalg.norm(records["dy"][kept, 0], axis=-1), cls.args["min_norm"]
+        )
+
+        records = np.load(filename, mmap_mode="r")
+        assert np.array_equal(np.isnan(records["lam"]), ~kept)
+
+    def test_nonlinear(cls):
+        """Segments that are too long saturate and should be detected."""
+        args = dict(cls.args, dt=40.0, Nsamples=5)
+        args.pop("debug")
+        with pytest.warns(UserWarning, match="5 segments did not grow exponentially"):
+            lams = assignment_4.compute_lyapunov(
+                **args, nonlinear_args=dict(action="flag")
+            )
+        assert len(lams) == 5
+        with pytest.warns(UserWarning):
+            lams = assignment_4.compute_lyapunov(
+                **args, nonlinear_args=dict(action="discard")
+            )
+        assert len(lams) == 0
+
+        # No saturation in tangent mode, but a poor fit can still be flagged.
+        args.update(mode="tangent", nonlinear_args=dict(action="discard", min_r2=0.9999))
+        with pytest.warns(UserWarning):
+            lams = assignment_4.compute_lyapunov(**args)
+        assert len(lams) < 5
+
+        with pytest.raises(ValueError, match="Unknown nonlinear"):
+            assignment_4.compute_lyapunov(
+                **dict(args, nonlinear_args=dict(action="ignore"))
+            )
+        with pytest.raises(ValueError, match=r"Unknown keys \['nonlinear'\]"):
+            assignment_4.compute_lyapunov(
+                **dict(args, nonlinear_args=dict(nonlinear="flag"))
+            )
+        with pytest.raises(ValueError, match="Unknown mode"):
+            assignment_4.compute_lyapunov(**dict(args, mode="qr"))
+
+    @pytest.mark.filterwarnings("error")
+    def test_linear(cls):
+        """Check that nothing is flagged with a reasonable `dt`."""
+        args = dict(cls.args, nonlinear_args=dict(action="flag", min_r2=0.1))
+        lams, ts, ys, dys = assignment_4.compute_lyapunov(**args)
+        assert len(lams) == 10
+
+
+class TestFitGrowth:
+    def test_fit(self):
+        rng = np.random.default_rng(2)
+        t = np.cumsum(rng.random(20))
+        log_norms = 2.0 + np.array([[0.5], [-1.0], [0.0]]) * t
+        lam, r2 = assignment_4._fit_growth(t, log_norms)
+        assert np.allclose(lam, [0.5, -1.0, 0.0])
+        assert np.allclose(r2, 1)
+
+        log_norms = log_norms + 0.1 * rng.normal(size=log_norms.shape)
+        lam, r2 = assignment_4._fit_growth(t, log_norms)
+        assert np.allclose(lam, [0.5, -1.0, 0.0], atol=0.02)
+        assert np.all(r2[:2] < 1) and np.all(r2[:2] > 0.9)
+
+        # With uniform steps, the trapezoidal weights are 1 except at the ends.  Note
+        # that polyfit weights the residuals, not their squares.
+        t = np.linspace(0, 1, 21)
+        y = rng.normal(size=21)
+        w = [0.5] + [1] * 19 + [0.5]
+        lam, r2 = assignment_4._fit_growth(t, y)
+        assert np.allclose(lam, np.polyfit(t, y, deg=1, w=np.sqrt(w))[0])
+        C = np.cov(t, y, aweights=w)
+        assert np.allclose(r2, C[0, 1] ** 2 / C[0, 0] / C[1, 1])
+
+    def test_segments(self):
+        """Segments with different times are fitted together."""
+        rng = np.random.default_rng(3)
+        ts = [np.cumsum(rng.random(_n)) for _n in [5, 20, 2, 11]]
+        log_norms = [rng.normal(size=(2, len(_t))) for _t in ts]
+        starts = np.cumsum([0] + [len(_t) for _t in ts[:-1]])
+        lams, r2s = assignment_4._fit_growth(
+            np.concatenate(ts), np.concatenate(log_norms, axis=1), starts=starts
+        )
+        assert lams.shape == r2s.shape == (2, 4)
+        for t, y, lam, r2 in zip(ts, log_norms, lams.T, r2s.T):
+            lam_, r2_ = assignment_4._fit_growth(t, y)
+            assert np.allclose(lam, lam_)
+            assert np.allclose(r2, r2_)
+
+
+class TestRunningStats:
+    def test_stats(self):
+        rng = np.random.default_rng(1)
+
+        # AR(1) process with autocorrelation 0.5 at lag 1 and 0.25 at lag 2.
+        x = 1e6 + rng.normal(size=10000)
+        for n in range(1, len(x)):
+            x[n] = 1e6 + 0.5 * (x[n - 1] - 1e6) + rng.normal()
+
+        stats = assignment_4.RunningStats(maxlag=2)
+        for _x in x:
+            stats.add(_x)
+
+        dx = x - x.mean()
+        assert stats.n == len(x)
+        assert np.allclose(stats.mean, x.mean())
+        assert np.allclose(stats.var, x.var(ddof=1))
+        assert np.allclose(stats.sem, x.std(ddof=1) / np.sqrt(len(x)))
+        for k in [1, 2]:
+            r_k = (dx[:-k] * dx[k:]).sum() / (dx ** 2).sum()
+            assert np.allclose(stats.autocorr(k), r_k)
+        assert abs(stats.autocorr(1) - 0.5) < 0.05
+        assert abs(stats.autocorr(2) - 0.25) < 0.05
+
+        with pytest.raises(ValueError):
+            stats.autocorr(3)
+
+        stats = assignment_4.RunningStats()
+        assert np.isnan(stats.sem)
+        stats.add(1.0)
+        assert np.isnan(stats.var)
+        assert np.isnan(stats.autocorr())
+
+
+def lorenz_rho(t, q, rho):
+    """Vectorized Lorenz system with parameter `rho` (module level for pickling)."""
+    x, y, z = q
+    return (10.0 * (y - x), x * (rho - z) - y, x * y - 8.0 / 3 * z)
+
+
+class TestLyapunovMap:
+    def test_lorenz(self):
+        # For rho = 10 the fixed points are stable, and for rho = 28 we have chaos.
+        rhos = np.array([10.0, 28.0, 28.0, 28.0, 28.0])
+        args = dict(
+            y0=(1.0, 1.0, 20.0),
+            dt=5.0,
+            Nsamples=40,
+            Nburn=2,
+            chunk_size=2,
+            solve_ivp_args=dict(rtol=1e-6, atol=1e-6),
+        )
+        lams, dlams = assignment_4.compute_lyapunov_map(
+            lorenz_rho, rhos, rng=np.random.default_rng(1), **args
+        )
+        assert lams.shape == dlams.shape == rhos.shape
+        assert lams[0] < -0.1
+        assert np.all(abs(lams[1:] - 0.9056) < 3 * dlams[1:] + 0.01)
+
+        # Independent of the number of jobs.
+        lams_, dlams_ = assignment_4.compute_lyapunov_map(
+            lorenz_rho, rhos, rng=np.random.default_rng(1), n_jobs=2, **args
+        )
+        assert np.array_equal(lams, lams_)
+        assert np.array_equal(dlams, dlams_)
+
+    def test_params(self):
+        """Vector parameters and per-member initial states."""
+
+        def lorenz(t, q, p):
+            sigma, rho = p
+            x, y, z = q
+            return (sigma * (y - x), x * (rho - z) - y, x * y - 8.0 / 3 * z)
+
+        params = [[10.0, 10.0, 0.1], [28.0, 10.0, 28.0]]
+        y0 = np.array([[1.0, 1.0, 20.0]] * 3).T
+        lams, dlams = assignment_4.compute_lyapunov_map(
+            lorenz, params, y0=y0, dt=2.0, Nsamples=20, min_norm=1e-8
+        )
+        assert lams.shape == (3,)
+        assert lams[0] > 0.5
+        assert lams[1] < 0
+        assert lams[2] < 0  # The fixed points are stable if sigma < beta + 1
+
+
+def saddle(t, y):
+    """Linear saddle with FTLE 1 everywhere (module level for pickling)."""
+    return np.array([y[0], -y[1]])
+
+
+def double_gyre(t, q, A=0.1, epsilon=0.25, omega=2 * np.pi / 10):
+    """Time-dependent double gyre flow (module level for pickling)."""
+    x, y = q
+    a = epsilon * np.sin(omega * t)
+    b = 1 - 2 * a
+    f, df = a * x ** 2 + b * x, 2 * a * x + b
+    return np.array(
+        [
+            -np.pi * A * np.sin(np.pi * f) * np.cos(np.pi * y),
+            np.pi * A * np.cos(np.pi * f) * np.sin(np.pi * y) * df,
+        ]
+    )
+
+
+class TestFTLE:
+    axes = [np.linspace(-1, 1, 7), np.linspace(0, 1, 5)]
+    solve_ivp_args = dict(rtol=1e-10, atol=1e-10)
+
+    @staticmethod
+    def saddle_jac(t, y):
+        J = np.zeros((2, 2) + y.shape[1:])
+        J[0, 0], J[1, 1] = 1, -1
+        return J
+
+    @pytest.mark.parametrize(
+        "method, use_jac", [("fd", False), ("tangent", False), ("tangent", True)]
+    )
+    @pytest.mark.parametrize("T", [2.0, -2.0])
+    def test_saddle(self, method, use_jac, T):
+        ftle = assignment_4.compute_ftle(
+            saddle,
+            self.axes,
+            T=T,
+            method=method,
+            jac=self.saddle_jac if use_jac else None,
+            chunk_size=8,
+            solve_ivp_args=self.solve_ivp_args,
+        )
+        assert ftle.shape == (7, 5)
+        assert np.allclose(ftle, 1)
+
+    def test_double_gyre(self, tmp_path):
+        """Compare the methods and check streaming to disk with a process pool."""
+        axes = [np.linspace(0, 2, 41), np.linspace(0, 1, 21)]
+        args = dict(T=15.0, chunk_size=100, solve_ivp_args=dict(rtol=1e-8, atol=1e-8))
+        ftle = assignment_4.compute_ftle(double_gyre, axes, delta=1e-6, **args)
+        ftle_ = assignment_4.compute_ftle(double_gyre, axes, method="tangent", **args)
+        # The auxiliary points leave the domain on the boundaries.
+        assert np.allclose(ftle[1:-1, 1:-1], ftle_[1:-1, 1:-1], atol=1e-3)
+        assert 0.5 < ftle.max() < 1.5
+
+        filename = tmp_path / "ftle.npy"
+        ftle_ = assignment_4.compute_ftle(
+            double_gyre, axes, delta=1e-6, n_jobs=2, filename=filename, **args
+        )
+        assert np.array_equal(ftle, ftle_)
+        assert np.array_equal(ftle, np.load(filename))
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match="Unknown method"):
+            assignment_4.compute_ftle(saddle, self.axes, T=1.0, method="qr")
+
+
+class TestLyapunovSpectrum:
+    """Tests for `compute_lyapunov_spectrum` using the Lorenz system."""
+
+    # Known exponents for sigma=10, rho=28, beta=8/3.
+    lams = np.array([0.9056, 0, -14.5723])
+
+    compute_dy_dt = staticmethod(TestLyapunov.compute_dy_dt)
+    jac = staticmethod(TestLyapunov.jac)
+
+    @classmethod
+    def setup_class(cls):
+        # Evolve onto the attractor.
+        res = solve_ivp(cls.compute_dy_dt, (0, 20.0), (1.0, 1.0, 1.0))
+        cls.y0 = res.y[:, -1]
+
+    @pytest.mark.parametrize("use_jac", [True, False])
+    def test_lorenz(self, use_jac):
+        lams, dlams = assignment_4.compute_lyapunov_spectrum(
+            self.compute_dy_dt,
+            y0=self.y0,
+            Nsamples=100,
+            jac=self.jac if use_jac else None,
+            vectorized=not use_jac,
+            solve_ivp_args=dict(rtol=1e-6, atol=1e-6),
+        )
+        assert lams.shape == dlams.shape == (3,)
+        assert np.all(abs(lams - self.lams) < 4 * dlams + 0.05)
+
+        # The sum is the (constant) trace of the Jacobian.
+        assert np.allclose(lams.sum(), -(10.0 + 1.0 + 8.0 / 3), rtol=0.01)
+
+    def test_burn(self):
+        """The first `Nburn` intervals are not included in the average."""
+        args = dict(y0=self.y0, k=2, Q0=np.eye(3)[:, :2], dt=0.1, jac=self.jac)
+        lams2 = assignment_4.compute_lyapunov_spectrum(
+            self.compute_dy_dt, Nsamples=2, Nburn=0, **args
+        )[0]
+        lams4 = assignment_4.compute_lyapunov_spectrum(
+            self.compute_dy_dt, Nsamples=4, Nburn=0, **args
+        )[0]
+        lams = assignment_4.compute_lyapunov_spectrum(
+            self.compute_dy_dt, Nsamples=2, Nburn=2, **args
+        )[0]
+        assert np.allclose(2 * lams, 4 * lams4 - 2 * lams2)
+
+    def test_degenerate(self):
+        """Degenerate directions keep their orthonormal vectors."""
+        log_R = np.empty(3)
+        A = np.array([[1.0, 1.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, -2.0]])
+        with np.errstate(divide="ignore"):
+            Q = assignment_4._reorthonormalize(A, log_R=log_R)
+        assert np.allclose(Q.T @ Q, np.eye(3))
+        assert np.allclose(log_R, [0, -np.inf, np.log(2)])
+        assert np.allclose(Q[:, [0, 2]], [[1, 0], [0, 0], [0, -1]])
 
-        Please disable once you implement these.
-        """
-        with pytest.raises(NotImplementedError):
-            assignment_4.compute_lyapunov(cls.compute_dy_dt, y0=(1.0, 1.0, 1.0))
+    def test_maximal(self):
+        """Only compute the maximal exponent without vectorization."""
+        lams, dlams = assignment_4.compute_lyapunov_spectrum(
+            self.compute_dy_dt, y0=self.y0, k=1, Nsamples=50
+        )
+        assert lams.shape == (1,)
+        assert abs(lams[0] - self.lams[0]) < 4 * dlams[0] + 0.05
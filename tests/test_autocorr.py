@@ -0,0 +1,102 @@
+"""Tests for the autocorrelation times."""
+import numpy as np
+
+from phys_581_2021 import autocorr, mcmc
+
+
+def ar1(phi, N, Nwalkers=32, seed=1):
+    """Return an AR(1) chain with ``tau = (1 + phi)/(1 - phi)``."""
+    rng = np.random.default_rng(seed)
+    e = rng.normal(size=(N, Nwalkers))
+    x = np.empty((N, Nwalkers))
+    x[0] = e[0] / np.sqrt(1 - phi ** 2)
+    for n in range(1, N):
+        x[n] = phi * x[n - 1] + e[n]
+    return x
+
+
+class TestAutocorr:
+    def test_autocorr_function(self):
+        """Compare with the direct O(N^2) computation."""
+        x = np.random.default_rng(2).normal(size=(100, 3)).cumsum(axis=0)
+        acf = autocorr.autocorr_function(x)
+        dx = x - x.mean(axis=0)
+        N = len(x)
+        acf_ = np.array([(dx[: N - k] * dx[k:]).sum(axis=0) for k in range(N)])
+        assert np.allclose(acf, acf_ / acf_[0])
+
+        acf = autocorr.autocorr_function(x.T, axis=1)
+        assert np.allclose(acf.T, acf_ / acf_[0])
+
+    def test_integrated_time(self):
+        phi = 0.9
+        x = ar1(phi, N=20000)
+        tau = autocorr.integrated_time(x)
+        assert tau.shape == (1,)
+        assert np.allclose(tau, (1 + phi) / (1 - phi), rtol=0.1)
+
+        # Multiple dimensions
+        chain = np.stack([x, ar1(0.5, N=20000, seed=3)], axis=-1)
+        tau = autocorr.integrated_time(chain)
+        assert np.allclose(tau, [19, 3], rtol=0.1)
+
+        # Independent samples
+        assert np.allclose(autocorr.integrated_time(x[:, 0][::100]), 1, atol=0.3)
+
+
+class TestMonitor:
+    Nwalkers = 16
+    mean = np.array([1.0, -2.0])
+    icov = np.array([[1.0, 0.9], [0.9, 1.0]])
+
+    def sampler(self, **kw):
+        def log_prob(q):
+            dq = q - self.mean
+            return -np.einsum("...a,ab,...b->...", dq, self.icov, dq) / 2
+
+        return mcmc.EnsembleSampler(
+            self.Nwalkers, 2, log_prob, vectorize=True, rng=1, **kw
+        )
+
+    def pos(self):
+        return self.mean + 0.1 * np.random.default_rng(2).normal(size=(16, 2))
+
+    def test_checkpoints(self):
+        sampler = self.sampler()
+        monitor = autocorr.AutocorrMonitor(factor=1e6, Nmin=10, growth=1.5)
+        autocorr.run_until_converged(sampler, self.pos(), 200, monitor=monitor)
+        assert not monitor.converged
+        assert sampler.iteration == 200
+        assert monitor.iterations == [10, 15, 23, 35, 53, 80, 120, 180]
+        assert np.allclose(
+            monitor.tau, autocorr.integrated_time(sampler.get_chain()[:180])
+        )
+
+    def test_no_checkpoint(self):
+        """Stopping before the first checkpoint gives no burn-in or thinning."""
+        sampler = self.sampler()
+        monitor = autocorr.run_until_converged(sampler, self.pos(), 50)
+        assert monitor.tau is None
+        assert not monitor.converged
+        assert monitor.discard == 0
+        assert monitor.thin == 1
+        samples = sampler.get_chain(
+            discard=monitor.discard, thin=monitor.thin, flat=True
+        )
+        assert samples.shape == (50 * self.Nwalkers, 2)
+
+    def test_converge(self):
+        sampler = self.sampler()
+        monitor = autocorr.run_until_converged(sampler, self.pos(), 100000, factor=50)
+        assert monitor.converged
+        assert sampler.iteration == monitor.iterations[-1] < 100000
+        assert np.all(50 * monitor.tau < sampler.iteration)
+        assert np.allclose(monitor.tau, sampler.get_autocorr_time())
+        assert 0 < monitor.discard < sampler.iteration
+        assert monitor.thin >= 1
+
+        samples = sampler.get_chain(discard=monitor.discard, flat=True)
+        assert np.allclose(samples.mean(axis=0), self.mean, atol=0.1)
+
+        tau = sampler.get_autocorr_time(thin=2)
+        assert np.allclose(tau, monitor.tau, rtol=0.2)
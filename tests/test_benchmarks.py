@@ -0,0 +1,134 @@
+"""Tests for the work-precision benchmarks.
+
+"""
+import os
+
+import numpy as np
+
+import pytest
+
+from phys_581_2021 import benchmarks
+
+
+class TestWorkPrecision:
+    def test_quick(self, tmpdir):
+        """Quick run with a single parameter per solver."""
+        params = {_s: [1e-6] for _s in ["abm_adaptive", "RK45", "DOP853"]}
+        params.update({_s: [256] for _s in ["euler", "rk4", "abm"]})
+        results = benchmarks.work_precision(params=params)
+        assert set(results) == set(benchmarks.PROBLEMS)
+        for problem_results in results.values():
+            assert set(problem_results) == set(benchmarks.SOLVERS)
+            for records in problem_results.values():
+                (record,) = records
+                assert set(record) == {"param", "err", "nfev", "time"}
+                assert record["nfev"] > 0
+                assert np.isfinite(record["err"])
+
+        filename = os.path.join(tmpdir, "results.json")
+        benchmarks.save_results(results, filename)
+        assert benchmarks.load_results(filename) == results
+
+    @pytest.mark.parametrize("solver, order", [("euler", 1), ("rk4", 4), ("abm", 5)])
+    def test_order(self, solver, order):
+        """The fixed-step series converge at the expected order."""
+        params = {solver: [64, 128, 256]}
+        results = benchmarks.work_precision(
+            problems=["gaussian"], solvers=[solver], params=params
+        )
+        records = results["gaussian"][solver]
+        p = np.polyfit(
+            np.log([_r["param"] for _r in records]),
+            np.log([_r["err"] for _r in records]),
+            deg=1,
+        )[0]
+        assert -p > order - 0.3
+
+    def test_reference(self):
+        """The DOP853 reference should agree with the exact solution."""
+        problem = benchmarks.Gaussian()
+        assert np.allclose(
+            benchmarks.Problem.y(problem, 1.0), problem.y(1.0), rtol=1e-12
+        )
+
+    @pytest.mark.bench
+    def test_work_precision(self, tmpdir):
+        """Full work-precision run."""
+        results = benchmarks.work_precision(repeat=3)
+        benchmarks.save_results(results, os.path.join(tmpdir, "work_precision.json"))
+
+        benchmarks.plot_work_precision(results)
+
+        # The higher-order solvers should reach 1e-4 with fewer evaluations than Euler
+        # (which might not reach it at all).
+        for problem_results in results.values():
+
+            def nfev(solver, err=1e-4):
+                return min(
+                    (_r["nfev"] for _r in problem_results[solver] if _r["err"] < err),
+                    default=np.inf,
+                )
+
+            for solver in ["rk4", "abm", "abm_adaptive"]:
+                assert nfev(solver) < nfev("euler")
+
+
+class TestChaos:
+    configs = [dict(Nsamples=10, dt=5.0, rtol=1e-6)]
+
+    def test_quick(self, tmpdir):
+        results = benchmarks.chaos_benchmark(configs=self.configs)
+        assert set(results) == set(benchmarks.CHAOS_PROBLEMS)
+        assert set(results["lorenz"]) == set(benchmarks.CHAOS_METHODS)
+        assert set(results["henon_heiles"]) == {"spectrum"}
+        for problem_name, problem_results in results.items():
+            for records in problem_results.values():
+                (record,) = records
+                assert set(record) == {
+                    "Nsamples",
+                    "dt",
+                    "rtol",
+                    "lam",
+                    "dlam",
+                    "err",
+                    "nfev",
+                    "time",
+                }
+                assert record["nfev"] > 0
+                assert record["err"] < 4 * record["dlam"] + 0.05
+
+        # Hamiltonian: the spectrum sums to zero (up to the integration error).
+        assert results["henon_heiles"]["spectrum"][0]["err"] < 1e-5
+
+        filename = os.path.join(tmpdir, "chaos.json")
+        benchmarks.save_results(results, filename)
+        baseline = benchmarks.load_results(filename)
+        assert baseline == results
+        assert benchmarks.find_regressions(results, baseline) == []
+
+    def test_regressions(self):
+        record = dict(Nsamples=10, dt=5.0, rtol=1e-6, lam=0.9, dlam=0.01)
+        baseline = {"lorenz": {"pair": [dict(record, err=0.01, nfev=1000, time=1.0)]}}
+        results = {
+            "lorenz": {"pair": [dict(record, err=0.1, nfev=2000, time=2.0)]},
+            "rossler": {"pair": [dict(record, err=0.1, nfev=2000, time=2.0)]},
+        }
+        regressions = benchmarks.find_regressions(results, baseline)
+        assert len(regressions) == 3
+        assert all(_r.startswith("lorenz/pair") for _r in regressions)
+
+        results["lorenz"]["pair"][0].update(dt=1.0)  # No longer matches
+        assert benchmarks.find_regressions(results, baseline) == []
+
+    @pytest.mark.bench
+    def test_chaos_benchmark(self, tmpdir):
+        """Full chaos benchmark run."""
+        results = benchmarks.chaos_benchmark()
+        benchmarks.save_results(results, os.path.join(tmpdir, "chaos.json"))
+
+        # With enough samples and a tight tolerance, all methods should agree with the
+        # references.
+        for problem_results in results.values():
+            for records in problem_results.values():
+                record = records[-1]
+                assert record["err"] < 4 * record["dlam"] + 0.01
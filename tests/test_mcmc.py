@@ -0,0 +1,374 @@
+"""Tests for the MCMC samplers."""
+import os
+import time
+
+import numpy as np
+
+import pytest
+
+from phys_581_2021 import mcmc
+
+
+def log_gaussian(q, mean, icov):
+    """Vectorized log-probability of a Gaussian."""
+    dq = np.asarray(q) - mean
+    return -np.einsum("...a,ab,...b->...", dq, icov, dq) / 2
+
+
+def emcee_reference(coords, log_prob_fn, Nsteps, random, a=2.0):
+    """Direct transcription of emcee's loop over walkers for the stretch move."""
+    coords = np.array(coords)
+    Nwalkers, Ndim = coords.shape
+    log_prob = np.array([log_prob_fn(_q) for _q in coords])
+    chain = []
+    for step in range(Nsteps):
+        random.choice([None], p=[1.0])  # emcee's choice of move
+        inds = np.arange(Nwalkers) % 2
+        random.shuffle(inds)
+        for split in range(2):
+            S1 = inds == split
+            s, c = coords[S1], coords[inds == 1 - split]
+            Ns, Nc = len(s), len(c)
+            zz = ((a - 1.0) * random.rand(Ns) + 1) ** 2.0 / a
+            factors = (Ndim - 1.0) * np.log(zz)
+            rint = random.randint(Nc, size=(Ns,))
+            q = c[rint] - (c[rint] - s) * zz[:, None]
+            new_log_probs = [log_prob_fn(_q) for _q in q]
+            for i, (j, f, nlp) in enumerate(
+                zip(np.arange(Nwalkers)[S1], factors, new_log_probs)
+            ):
+                lnpdiff = f + nlp - log_prob[j]
+                if lnpdiff > np.log(random.rand()):
+                    coords[j] = q[i]
+                    log_prob[j] = nlp
+        chain.append(coords.copy())
+    return np.array(chain)
+
+
+class Gaussian:
+    Ndim = 3
+    Nwalkers = 10
+    mean = np.array([1.0, -2.0, 0.5])
+    cov = np.array([[1.0, 0.5, 0.0], [0.5, 2.0, -0.3], [0.0, -0.3, 0.5]])
+    icov = np.linalg.inv(cov)
+
+    def pos(self, seed=1):
+        rng = np.random.default_rng(seed)
+        return self.mean + 1e-2 * rng.normal(size=(self.Nwalkers, self.Ndim))
+
+    def sampler(self, rng=2, **kw):
+        args = dict(args=(self.mean, self.icov), vectorize=True, rng=rng)
+        args.update(kw)
+        return mcmc.EnsembleSampler(self.Nwalkers, self.Ndim, log_gaussian, **args)
+
+
+class TestEnsembleSampler(Gaussian):
+    def test_reference(self):
+        """Agree with emcee's algorithm for the same RandomState."""
+        Nsteps = 20
+        sampler = self.sampler(rng=np.random.RandomState(3))
+        sampler.run_mcmc(self.pos(), Nsteps)
+        chain = emcee_reference(
+            self.pos(),
+            lambda q: log_gaussian(q, self.mean, self.icov),
+            Nsteps,
+            random=np.random.RandomState(3),
+        )
+        assert np.allclose(sampler.get_chain(), chain)
+
+    def test_emcee(self):
+        emcee = pytest.importorskip("emcee")
+        Nsteps = 20
+        sampler = self.sampler(rng=np.random.RandomState(3))
+        sampler.run_mcmc(self.pos(), Nsteps)
+        es = emcee.EnsembleSampler(
+            self.Nwalkers,
+            self.Ndim,
+            log_gaussian,
+            args=(self.mean, self.icov),
+            vectorize=True,
+        )
+        es.random_state = np.random.RandomState(3).get_state()
+        es.run_mcmc(self.pos(), Nsteps)
+        assert np.allclose(sampler.get_chain(), es.get_chain())
+        assert np.allclose(sampler.get_log_prob(), es.get_log_prob())
+        assert np.allclose(sampler.acceptance_fraction, es.acceptance_fraction)
+
+    def test_vectorize(self):
+        """Vectorized and scalar log-probabilities give the same chains."""
+        s1 = self.sampler(vectorize=True)
+        s2 = self.sampler(vectorize=False)
+        s1.run_mcmc(self.pos(), 10)
+        s2.run_mcmc(self.pos(), 10)
+        assert np.allclose(s1.get_chain(), s2.get_chain())
+        assert np.allclose(s1.get_log_prob(), s2.get_log_prob())
+
+    def test_continue(self):
+        """Continuing a run gives the same chain as a single run."""
+        s1 = self.sampler()
+        s1.run_mcmc(self.pos(), 20)
+        s2 = self.sampler()
+        s2.run_mcmc(self.pos(), 5)
+        s2.run_mcmc(None, 15)
+        assert s2.iteration == 20
+        assert np.allclose(s1.get_chain(), s2.get_chain())
+        assert np.all(s1.naccepted == s2.naccepted)
+
+        chain = s1.get_chain()
+        assert np.allclose(s1.get_chain(discard=5, thin=3), chain[7::3])
+        assert s1.get_chain(flat=True).shape == (20 * self.Nwalkers, self.Ndim)
+        assert s1.get_log_prob(flat=True).shape == (20 * self.Nwalkers,)
+        assert np.allclose(
+            s1.get_log_prob(), log_gaussian(chain, self.mean, self.icov)
+        )
+
+    def test_gaussian(self):
+        sampler = self.sampler(rng=4)
+        sampler.run_mcmc(self.pos(), 3000)
+        assert np.all(
+            (sampler.acceptance_fraction > 0.2) & (sampler.acceptance_fraction < 0.9)
+        )
+        samples = sampler.get_chain(discard=500, flat=True)
+        assert np.allclose(samples.mean(axis=0), self.mean, atol=0.15)
+        assert np.allclose(np.cov(samples, rowvar=False), self.cov, atol=0.2)
+
+    def test_errors(self):
+        with pytest.raises(ValueError):
+            mcmc.EnsembleSampler(4, self.Ndim, log_gaussian)
+        sampler = self.sampler()
+        with pytest.raises(ValueError):
+            sampler.run_mcmc(None, 1)
+        with pytest.raises(ValueError):
+            sampler.run_mcmc(self.pos()[:, :2], 1)
+        sampler = self.sampler(args=(np.nan, self.icov))
+        with pytest.raises(ValueError, match="NaN"):
+            sampler.run_mcmc(self.pos(), 1)
+
+    @pytest.mark.bench
+    def test_speed(self):
+        """The vectorized sampler should be faster than looping over walkers."""
+        Nsteps = 2000
+        times = []
+        for vectorize in [True, False]:
+            sampler = self.sampler(vectorize=vectorize)
+            tic = time.perf_counter()
+            sampler.run_mcmc(self.pos(), Nsteps)
+            times.append(time.perf_counter() - tic)
+        assert times[0] < times[1]
+
+
+class TestMemmapBackend(Gaussian):
+    def backend(self, tmpdir, chunk_size=7):
+        filename = os.path.join(tmpdir, "chain.dat")
+        return mcmc.MemmapBackend(filename, chunk_size=chunk_size)
+
+    def test_chain(self, tmpdir):
+        """The chain on disk agrees with the in-memory chain."""
+        s1 = self.sampler()
+        s1.run_mcmc(self.pos(), 30)
+        s2 = self.sampler(backend=self.backend(tmpdir))
+        s2.run_mcmc(self.pos(), 30)
+        assert s2.iteration == 30
+        assert np.all(s1.naccepted == s2.naccepted)
+        for kw in [{}, dict(discard=5, thin=3), dict(flat=True)]:
+            assert np.allclose(s1.get_chain(**kw), s2.get_chain(**kw))
+            assert np.allclose(s1.get_log_prob(**kw), s2.get_log_prob(**kw))
+
+        # Lazy views of the file
+        chain = s2.get_chain(discard=10)
+        assert isinstance(chain.base, np.memmap) or isinstance(chain, np.memmap)
+
+    def test_resume(self, tmpdir):
+        """Resume from the last complete chunk after a crash."""
+        sampler = self.sampler(backend=self.backend(tmpdir))
+        steps = sampler.sample(self.pos(), Nsteps=30)
+        for n in range(17):
+            next(steps)
+        chain = np.array(sampler.get_chain())  # Flushes
+        for n in range(10):
+            next(steps)
+        # Crash: 27 steps, only 17 + 7 = 24 on disk.  Simulate a partial write too.
+        with open(sampler.backend.filename, "ab") as f:
+            f.write(b"garbage")
+        sampler.backend.flush = lambda: None  # No cleanup when the generator is deleted
+        del steps, sampler
+
+        backend = self.backend(tmpdir)
+        assert backend.iteration == 24
+        sampler = self.sampler(backend=backend)
+        assert np.allclose(sampler.get_chain()[:17], chain)
+        assert np.all(sampler.naccepted <= 24)
+        sampler.run_mcmc(None, 6)
+        assert sampler.iteration == 30
+        assert backend.iteration == 30
+        assert os.path.getsize(backend.filename) == (
+            backend._header_bytes + 30 * backend._record_bytes
+        )
+
+        # Continue from where we left off
+        coords, log_prob = backend.get_last()
+        assert np.allclose(coords, sampler.coords)
+        assert np.allclose(log_prob, sampler.log_prob)
+
+        with pytest.raises(ValueError):
+            mcmc.EnsembleSampler(12, self.Ndim, log_gaussian, backend=backend)
+
+    def test_reset(self, tmpdir):
+        backend = self.backend(tmpdir)
+        sampler = self.sampler(backend=backend)
+        sampler.run_mcmc(self.pos(), 10)
+        sampler.reset()
+        assert backend.iteration == 0
+        assert len(sampler.get_chain()) == 0
+        with pytest.raises(ValueError):
+            sampler.run_mcmc(None, 1)
+
+    def test_bad_file(self, tmpdir):
+        filename = os.path.join(tmpdir, "chain.dat")
+        with open(filename, "wb") as f:
+            f.write(b"not a chain")
+        with pytest.raises(ValueError):
+            mcmc.MemmapBackend(filename)
+
+
+# Module-level functions so they can be pickled for the worker processes.
+def log_prior_box(q, L=5.0):
+    """Normalized uniform prior on ``[-L, L]**Ndim``."""
+    q = np.asarray(q)
+    inside = np.all(abs(q) < L, axis=-1)
+    return np.where(inside, -q.shape[-1] * np.log(2 * L), -np.inf)
+
+
+def log_like_gaussian(q, sigma=0.5):
+    """Normalized Gaussian likelihood."""
+    q = np.asarray(q)
+    Ndim = q.shape[-1]
+    return -(q ** 2).sum(axis=-1) / 2 / sigma ** 2 - Ndim * np.log(
+        2 * np.pi * sigma ** 2
+    ) / 2
+
+
+def log_like_bimodal(q, x0=3.0, sigma=0.2):
+    """Two well separated modes at ``q[0] = +-x0``."""
+    q = np.asarray(q)
+    d2 = (q[..., 1:] ** 2).sum(axis=-1)
+    return np.logaddexp(
+        -((q[..., 0] - x0) ** 2) / 2 / sigma ** 2,
+        -((q[..., 0] + x0) ** 2) / 2 / sigma ** 2,
+    ) - d2 / 2 / sigma ** 2
+
+
+class TestPTSampler:
+    Nwalkers = 16
+    Ndim = 2
+
+    def sampler(self, log_like=log_like_gaussian, **kw):
+        args = dict(Ntemps=12, Tmax=1e4, vectorize=True, seed=1)
+        args.update(kw)
+        return mcmc.PTSampler(self.Nwalkers, self.Ndim, log_like, log_prior_box, **args)
+
+    def pos(self, x0=0.0):
+        rng = np.random.default_rng(2)
+        return np.array([x0, 0]) + 0.1 * rng.normal(size=(self.Nwalkers, self.Ndim))
+
+    def test_evidence(self):
+        sampler = self.sampler(adapt=False, Ntemps=24)
+        sampler.run_mcmc(self.pos(), 600)
+        assert sampler.iteration == 600
+        log_Z, dlog_Z = sampler.log_evidence_estimate(discard=100)
+        log_Z_exact = -self.Ndim * np.log(10)
+        assert abs(log_Z - log_Z_exact) < min(dlog_Z, 0.2)
+
+        chain = sampler.get_chain(discard=100, flat=True)
+        assert chain.shape == (500 * self.Nwalkers, self.Ndim)
+        assert np.allclose(chain.std(axis=0), 0.5, rtol=0.1)
+        log_like = sampler.get_log_like(discard=100, flat=True)
+        assert np.allclose(log_like, log_like_gaussian(chain))
+
+        assert np.all(sampler.swap_acceptance_fraction > 0)
+        assert sampler.acceptance_fraction.shape == (24, self.Nwalkers)
+
+    def test_bimodal(self):
+        """The cold chain finds both modes, while a single ensemble stays trapped."""
+        Nsteps = 1000
+        sampler = self.sampler(log_like=log_like_bimodal)
+        sampler.run_mcmc(self.pos(x0=3.0), Nsteps)
+        x = sampler.get_chain(discard=200, flat=True)[:, 0]
+        assert np.allclose(np.mean(x < 0), 0.5, atol=0.15)
+
+        def log_prob(q):
+            return log_prior_box(q) + log_like_bimodal(q)
+
+        es = mcmc.EnsembleSampler(
+            self.Nwalkers, self.Ndim, log_prob, vectorize=True, rng=1
+        )
+        es.run_mcmc(self.pos(x0=3.0), Nsteps)
+        assert np.all(es.get_chain()[..., 0] > 0)
+
+    def test_processes(self):
+        """The results do not depend on n_jobs."""
+        s1 = self.sampler(Ntemps=5, swap_every=3)
+        s1.run_mcmc(self.pos(), 21)
+        with self.sampler(Ntemps=5, swap_every=3, n_jobs=2) as s2:
+            s2.run_mcmc(self.pos(), 12)
+            s2.run_mcmc(None, 9)
+            assert s2.iteration == 21
+            assert np.allclose(s1.betas, s2.betas)
+            assert np.all(s1.nswaps == s2.nswaps)
+            for temp in range(5):
+                assert np.allclose(s1.get_chain(temp), s2.get_chain(temp))
+            assert np.allclose(
+                s1.log_evidence_estimate(), s2.log_evidence_estimate()
+            )
+
+    def test_adapt(self):
+        """Adapting the ladder equalizes the swap acceptance rates."""
+        spreads = []
+        for adapt in [False, True]:
+            sampler = self.sampler(
+                Ntemps=6, adapt=adapt, adaptation_lag=1000, adaptation_time=10
+            )
+            sampler.run_mcmc(self.pos(), 500)
+            assert np.all(np.diff(sampler.betas) < 0)
+            sampler.nswaps[...] = sampler.nrounds = 0
+            sampler.run_mcmc(None, 500)
+            spreads.append(np.ptp(sampler.swap_acceptance_fraction))
+        assert spreads[1] < spreads[0] / 2
+
+    def test_allocation(self):
+        """The chains are not reallocated every round, which would be O(Nsteps**2)."""
+        Nsteps = 200
+        sampler = self.sampler(Ntemps=2)
+        chains = set()
+        for _ in sampler.sample(self.pos(), Nsteps=Nsteps):
+            chains.add(id(sampler._rungs[0].backend._chain))
+        assert len(chains) == 1
+        sampler.run_mcmc(None, 10)
+        assert sampler.get_chain().shape == (Nsteps + 10, self.Nwalkers, self.Ndim)
+
+        # Many short runs reallocate the backend only O(log(Nsteps)) times.
+        backend = mcmc.Backend()
+        backend.reset(self.Nwalkers, self.Ndim)
+        sizes = set()
+        for n in range(Nsteps):
+            backend.grow(1)
+            backend.save_step(np.zeros((self.Nwalkers, self.Ndim)), 0, False)
+            sizes.add(len(backend._chain))
+        assert len(sizes) <= np.log2(Nsteps) + 2
+        assert backend.get_chain().shape == (Nsteps, self.Nwalkers, self.Ndim)
+
+    def test_errors(self):
+        with pytest.raises(ValueError):
+            self.sampler(betas=[0.5, 0.1])
+        with pytest.raises(ValueError):
+            self.sampler(betas=[1, -1])
+        with pytest.raises(ValueError):
+            mcmc.PTSampler(2, 2, log_like_gaussian, log_prior_box)
+        sampler = self.sampler()
+        with pytest.raises(ValueError):
+            sampler.run_mcmc(None, 1)
+        with pytest.raises(ValueError):
+            sampler.run_mcmc(np.zeros((3, 2, 2)), 1)
+        with self.sampler(Ntemps=3, n_jobs=1, args=(np.nan,)) as sampler:
+            with pytest.raises(ValueError, match="NaN"):
+                sampler.run_mcmc(self.pos(), 1)
@@ -0,0 +1,281 @@
+"""Tests for the plotting tools."""
+import os
+import tracemalloc
+
+import numpy as np
+
+import pytest
+
+import scipy.stats
+
+from uncertainties import correlated_values
+
+# Skip these tests if matplotlib is not installed.
+plt = pytest.importorskip("matplotlib.pyplot")
+plotting = pytest.importorskip("phys_581_2021.plotting")
+
+
+def random_cov(Na, seed=1):
+    """Return a random covariance matrix."""
+    rng = np.random.default_rng(seed)
+    A = rng.normal(size=(Na, Na))
+    return A @ A.T + 0.1 * np.eye(Na)
+
+
+class TestCornerPlot:
+    def test_dchi2_grids(self):
+        """Compare with the direct computation from the inverse 2x2 covariances."""
+        C = random_cov(5)
+        sigma_max, Nxy = 3.0, (10, 11)
+        u, v, dchi2s = plotting.dchi2_grids(C, sigma_max=sigma_max, Nxy=Nxy)
+        assert dchi2s.shape == (10,) + Nxy
+        for i, j, dchi2 in zip(*np.tril_indices(len(C), k=-1), dchi2s):
+            inds = np.array([[i, j]])
+            C2 = C[inds.T, inds]
+            sigma_i, sigma_j = np.sqrt([C[i, i], C[j, j]])
+            das = np.meshgrid(sigma_i * u, sigma_j * v, indexing="ij", sparse=False)
+            dchi2_ = np.einsum("xij,yij,xy->ij", das, das, np.linalg.inv(C2))
+            assert np.allclose(dchi2, dchi2_, rtol=1e-6)
+
+    def test_cache(self):
+        C = random_cov(4)
+        res = plotting.dchi2_grids(C, sigma_max=3.0)
+        assert plotting.dchi2_grids(C.copy(), sigma_max=3.0) is res
+        assert plotting.dchi2_grids(C, sigma_max=2.0) is not res
+        for n in range(plotting._DCHI2_CACHE_SIZE):
+            plotting.dchi2_grids(random_cov(4, seed=n + 2), sigma_max=3.0)
+        assert len(plotting._DCHI2_CACHE) == plotting._DCHI2_CACHE_SIZE
+        assert plotting.dchi2_grids(C, sigma_max=3.0) is not res
+
+        # The cached arrays are shared, so must not be modified.
+        u, v, dchi2 = res
+        with pytest.raises(ValueError):
+            dchi2[0] = 0
+        with pytest.raises(ValueError):
+            u *= 2
+
+    def test_dchi2_memory(self, monkeypatch):
+        """The grids for many parameters are computed with bounded temporaries."""
+        monkeypatch.setattr(plotting, "_DCHI2_CACHE", type(plotting._DCHI2_CACHE)())
+        C = random_cov(60, seed=7)
+        tracemalloc.start()
+        try:
+            u, v, dchi2s = plotting.dchi2_grids(C, sigma_max=3.0)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert dchi2s.dtype == np.float32
+        assert peak < dchi2s.nbytes + 4 * 8 * plotting._DCHI2_BLOCK_SIZE
+
+        # The blocks do not affect the results.
+        monkeypatch.setattr(plotting, "_DCHI2_BLOCK_SIZE", 1)
+        monkeypatch.setattr(plotting, "_DCHI2_CACHE", type(plotting._DCHI2_CACHE)())
+        assert np.array_equal(dchi2s, plotting.dchi2_grids(C, sigma_max=3.0)[2])
+
+    def test_corner_plot(self):
+        """Smoke test with uncertainties."""
+        a = correlated_values([1.0, 2.0, 3.0], random_cov(3))
+        fig, axs = plotting.corner_plot(a, labels=["x", "y", "z"])
+        assert axs.shape == (3, 3)
+        assert axs[2, 0].get_xlabel() == "x"
+        assert not axs[0, 1].get_visible()
+        plt.close(fig)
+
+
+class TestMeanCov:
+    mean = np.array([1.0, -2.0, 0.5])
+    C = random_cov(3, seed=3)
+
+    def test_ufloats(self):
+        a = correlated_values(self.mean, self.C)
+        mean, C = plotting.mean_cov(a)
+        assert np.allclose(mean, self.mean)
+        assert np.allclose(C, self.C)
+
+        mean, C = plotting.mean_cov(a, C=2 * self.C)
+        assert np.allclose(C, 2 * self.C)
+
+    def test_fast(self, monkeypatch):
+        """Plain arrays should never touch the uncertainties package."""
+
+        def fail(*v, **kw):
+            raise AssertionError("ufloat path used")
+
+        monkeypatch.setattr(plotting.uncertainties, "covariance_matrix", fail)
+        monkeypatch.setattr(plotting.unp, "nominal_values", fail)
+        mean, C = plotting.mean_cov(list(self.mean), self.C)
+        assert mean.dtype == float
+        assert np.allclose(mean, self.mean)
+
+        fig, axs = plotting.corner_plot(self.mean, self.C)
+        assert axs[1, 0].collections
+        plt.close(fig)
+
+        with pytest.raises(ValueError):
+            plotting.mean_cov(self.mean)
+
+
+class TestSamples:
+    @classmethod
+    def setup_class(cls):
+        cls.C = random_cov(3)
+        cls.mean = np.array([1.0, 2.0, 3.0])
+        rng = np.random.default_rng(2)
+        cls.samples = rng.multivariate_normal(cls.mean, cls.C, size=100000)
+
+    def test_histograms(self):
+        """Chunked histograms should agree with np.histogram2d."""
+        ranges = [(-5, 5), (-4, 8), (-3, 9)]
+        centers, hists = plotting.pair_densities(
+            self.samples, bins=20, ranges=ranges, chunk_size=1000
+        )
+        assert hists.shape == (3, 20, 20)
+        for (i, j), hist in zip(zip(*np.tril_indices(3, k=-1)), hists):
+            hist_, xedges, yedges = np.histogram2d(
+                self.samples[:, i],
+                self.samples[:, j],
+                bins=20,
+                range=[ranges[i], ranges[j]],
+            )
+            assert np.allclose(hist, hist_)
+            assert np.allclose(centers[i], (xedges[1:] + xedges[:-1]) / 2)
+
+    def test_kde(self):
+        stds = np.sqrt(np.diag(self.C))
+        ranges = np.transpose([self.mean - 6 * stds, self.mean + 6 * stds])
+        centers, densities = plotting.pair_densities(
+            self.samples, bins=64, ranges=ranges, kde=True
+        )
+
+        # Compare with the exact Gaussian.  The KDE smooths slightly.
+        for (i, j), density in zip(zip(*np.tril_indices(3, k=-1)), densities):
+            assert np.allclose(density.sum(), len(self.samples), rtol=1e-3)
+            inds = np.array([[i, j]])
+            rv = scipy.stats.multivariate_normal(self.mean[[i, j]], self.C[inds.T, inds])
+            x, y = np.meshgrid(centers[i], centers[j], indexing="ij")
+            p = rv.pdf(np.stack([x, y], axis=-1))
+            p *= len(self.samples) * np.diff(centers[i][:2]) * np.diff(centers[j][:2])
+            assert abs(density - p).max() < 0.1 * p.max()
+
+    @pytest.mark.parametrize("kde", [False, True])
+    def test_memory(self, kde):
+        """Binning many parameters should not need (N, Npairs) temporaries."""
+        rng = np.random.default_rng(3)
+        samples = rng.normal(size=(20000, 40))
+        hists = plotting.PairHistograms([(-6, 6)] * 40, bins=50, kde=kde)
+        tracemalloc.start()
+        try:
+            changed = hists.add(samples)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert changed.all()
+        assert peak < samples.nbytes + 5 * hists.counts.nbytes
+
+        # Samples are well inside the ranges, so all weights are kept.
+        assert np.allclose(hists.counts.sum(axis=1), len(samples))
+
+    def test_hdr_levels(self):
+        """The highest-density regions of a Gaussian are the ellipses."""
+        sigmas = np.array([2, 1])
+        masses = scipy.stats.norm.cdf(sigmas) - scipy.stats.norm.cdf(-sigmas)
+        x = np.linspace(-8, 8, 401)
+        dchi2 = x[:, None] ** 2 + x[None, :] ** 2
+        density = np.exp(-dchi2 / 2)
+        levels = plotting.hdr_levels(density, masses)
+        assert np.all(np.diff(levels) > 0)
+        dchi2_levels = scipy.stats.chi2.ppf(masses, df=2)
+        assert np.allclose(-2 * np.log(levels), dchi2_levels, rtol=0.01)
+
+    def test_corner_plot(self):
+        for kde in [False, True]:
+            fig, axs = plotting.corner_plot(samples=self.samples, kde=kde, bins=30)
+            assert axs.shape == (3, 3)
+            assert axs[1, 0].collections
+            plt.close(fig)
+
+
+class TestLiveCornerPlot:
+    mean = np.array([1.0, -2.0, 0.5])
+    C = random_cov(3, seed=5)
+
+    def batches(self, Nbatches, N=2000, seed=6):
+        rng = np.random.default_rng(seed)
+        return [
+            rng.multivariate_normal(self.mean, self.C, size=N) for _n in range(Nbatches)
+        ]
+
+    def test_update(self):
+        batches = self.batches(4)
+        live = plotting.LiveCornerPlot(batches[0], bins=30)
+        for batch in batches[1:]:
+            changed = live.update(batch)
+            assert np.all(changed)
+
+        # The accumulated histograms match those of all samples at once.
+        samples = np.concatenate(batches)
+        centers, densities = plotting.pair_densities(
+            samples, bins=30, ranges=live.hists.ranges
+        )
+        assert np.allclose(live.hists.densities(), densities)
+
+        for p, (i, j) in enumerate(zip(*live.hists.pairs)):
+            assert all(_a in live.axs[i, j].get_children() for _a in live.contours[p])
+        plt.close(live.fig)
+
+    def test_unchanged(self):
+        """Only pairs that receive in-range samples are redrawn."""
+        batches = self.batches(1)
+        live = plotting.LiveCornerPlot(batches[0], bins=30)
+        contours = [list(_c) for _c in live.contours]
+        counts = live.hists.counts.copy()
+
+        # a[0] is out of range, so only the pair (2, 1) is affected.
+        samples = self.batches(1, seed=7)[0]
+        samples[:, 0] = 100.0
+        changed = live.update(samples)
+        assert list(zip(*live.hists.pairs)) == [(1, 0), (2, 0), (2, 1)]
+        assert changed.tolist() == [False, False, True]
+        assert np.all(live.hists.counts[:2] == counts[:2])
+        assert live.contours[:2] == contours[:2]
+        assert live.contours[2] != contours[2]
+        plt.close(live.fig)
+
+
+class TestRender:
+    def jobs(self, tmpdir, Njobs=4, Na=3):
+        rng = np.random.default_rng(8)
+        for n in range(Njobs):
+            C = random_cov(Na, seed=n)
+            ext = ["png", "pdf"][n % 2]
+            yield dict(
+                a=rng.normal(size=Na),
+                C=C,
+                filename=os.path.join(tmpdir, f"corner_{n}.{ext}"),
+                savefig_kw=dict(dpi=20),
+            )
+
+    def test_serial(self, tmpdir):
+        filenames = list(plotting.render_corner_plots(self.jobs(tmpdir)))
+        assert len(filenames) == 4
+        assert all(os.path.getsize(_f) > 0 for _f in filenames)
+
+        # The layout is reused between jobs, and only the last plot is left.
+        fig, axs = plotting._FIGURES[3, (10, 10)]
+        assert len(axs[1, 0].collections) == 1
+        assert not axs[0, 1].get_visible()
+
+    def test_parallel(self, tmpdir):
+        jobs = list(self.jobs(tmpdir, Njobs=6))
+        jobs.append(
+            dict(
+                samples=np.random.default_rng(9).normal(size=(1000, 2)),
+                filename=os.path.join(tmpdir, "samples.png"),
+                savefig_kw=dict(dpi=20),
+            )
+        )
+        filenames = list(
+            plotting.render_corner_plots(jobs, n_jobs=2, maxtasksperchild=2)
+        )
+        assert filenames == [_job["filename"] for _job in jobs]
+        assert all(os.path.getsize(_f) > 0 for _f in filenames)